@@ -0,0 +1,146 @@
+"""Sayaç yazmaları için kabul kontrolü - IP/kullanıcı token bucket'ları ve tıklama birleştirme
+
+Token bucket'lar paylaşılan depoda (store.shared) tutulur, sınırlar tüm worker'larda geçerlidir.
+Aynı kullanıcıya aynı IP'den COALESCE_WINDOW_MS içinde gelen tıklamalar process içinde
+birleştirilir: ilk istek pencere boyunca bekler, sonra hepsi için tek +N güncelleme yapar.
+"""
+import math
+import os
+import threading
+import time
+
+import store
+import tenants
+
+# Saniyede eklenen token ve kova boyutu; hız 0 ise o sınır kapalı
+ADMISSION_IP_RATE = float(os.getenv('ADMISSION_IP_RATE', '5'))
+ADMISSION_IP_BURST = float(os.getenv('ADMISSION_IP_BURST', '20'))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '10'))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', '30'))
+# 0 ise her tıklama ayrı yazılır
+COALESCE_WINDOW_MS = float(os.getenv('COALESCE_WINDOW_MS', '150'))
+# Birleştirilen isteklerin, toplu yazmayı yapan isteği en fazla bekleme süresi
+COALESCE_WAIT_TIMEOUT = 30
+
+
+class Rejected(Exception):
+    """İstek token bucket sınırına takıldı"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Batch:
+    """Birleştirme penceresindeki tıklamalar ve toplu yazmanın sonucu"""
+
+    def __init__(self):
+        self.count = 1
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Admission:
+    """Token bucket kontrolü ve tıklama birleştirme; sayaçlar worker başına"""
+
+    def __init__(self, shared_store=None, window=COALESCE_WINDOW_MS / 1000):
+        self.store = shared_store or store.shared
+        self.window = window
+        self._batches = {}
+        self._lock = threading.Lock()
+        # Metrikler
+        self.admitted = 0
+        self.rejected_ip = 0
+        self.rejected_user = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.prefetch_refused = 0
+
+    def _take(self, key, rate, burst):
+        """Yeniden denemeden önce beklenecek saniye; token alındıysa 0"""
+        if rate <= 0:
+            return 0
+        try:
+            allowed, tokens = self.store.take(key, rate, burst)
+        except Exception as e:
+            # Depo erişilemezse istekler engellenmez
+            print(f"Error in admission token bucket: {e}")
+            return 0
+        return 0 if allowed else (1 - tokens) / rate
+
+    def is_prefetch(self, headers):
+        """Tarayıcı ön yüklemesi mi (Sec-Purpose/Purpose: prefetch); GET ile yazan route'lar bunları işlemez"""
+        purpose = headers.get('Sec-Purpose') or headers.get('Purpose') or headers.get('X-Moz') or ''
+        if 'prefetch' not in purpose.lower():
+            return False
+        self.prefetch_refused += 1
+        return True
+
+    def admit(self, ip_adresi, kullanici_id):
+        """IP ve kullanıcı kovalarından birer token alır; sınır aşıldıysa Rejected
+
+        IP kovası tüm gruplarda ortak, kullanıcı kovası grubun kullanıcısına ait.
+        """
+        retry_after = self._take(f'admission:ip:{ip_adresi}', ADMISSION_IP_RATE, ADMISSION_IP_BURST)
+        if retry_after:
+            self.rejected_ip += 1
+            raise Rejected('⏳ Çok hızlı tıklıyorsunuz, biraz bekleyin!', retry_after)
+        retry_after = self._take(f'admission:user:{tenants.current().key}:{kullanici_id}',
+                                 ADMISSION_USER_RATE, ADMISSION_USER_BURST)
+        if retry_after:
+            self.rejected_user += 1
+            raise Rejected('⏳ Bu kullanıcıya çok hızlı tıklanıyor, biraz bekleyin!', retry_after)
+        self.admitted += 1
+
+    def coalesce(self, key, apply):
+        """apply(count) sonucunu ve count'u döndürür; aynı key'le pencerede gelenler tek çağrıda birleşir"""
+        if self.window <= 0:
+            return apply(1), 1
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = _Batch()
+            else:
+                batch.count += 1
+                self.coalesced += 1
+
+        if not leader:
+            if not batch.done.wait(COALESCE_WAIT_TIMEOUT):
+                raise TimeoutError('Birleştirilen yazma zaman aşımına uğradı')
+            if batch.error is not None:
+                raise batch.error
+            return batch.result, batch.count
+
+        time.sleep(self.window)
+        with self._lock:
+            # Bundan sonra gelen tıklama yeni bir pencere açar
+            del self._batches[key]
+        self.batches += 1
+        try:
+            batch.result = apply(batch.count)
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            batch.done.set()
+        return batch.result, batch.count
+
+    def stats(self):
+        return {
+            'admitted': self.admitted,
+            'rejected_ip': self.rejected_ip,
+            'rejected_user': self.rejected_user,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'prefetch_refused': self.prefetch_refused,
+            'pending': len(self._batches),
+        }
+
+
+def retry_after_header(retry_after):
+    return str(max(1, math.ceil(retry_after)))
+
+
+gate = Admission()
@@ -0,0 +1,187 @@
+"""Asenkron veritabanı erişimi - bağımsız sorguları eşzamanlı çalıştırmak için
+
+ASGI modunda (asgi.py) event loop'a bağlı asyncpg/aiosqlite havuzu açılır; başka bir
+loop'tan (Flask async view'leri) gelen sorgular o loop'a aktarılır. Havuz açılmamışsa
+(gunicorn gthread) sorgular küçük bir thread havuzunda db bağlantılarıyla çalışır. fetchall
+sadece okuyan sorgular içindir, içinde bulunulan shard'a gider ve DATABASE_READ_URL tanımlıysa
+db.use_replica() kararına uyar.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+# PostgreSQL için asenkron sürücü (opsiyonel)
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    ASYNCPG_AVAILABLE = False
+
+# SQLite için asenkron sürücü (opsiyonel, geliştirme)
+try:
+    import aiosqlite
+    AIOSQLITE_AVAILABLE = True
+except ImportError:
+    AIOSQLITE_AVAILABLE = False
+
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', '10'))
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', '8'))
+
+
+def translate(query):
+    """'?' placeholder'larını asyncpg'nin $1, $2... biçimine çevirir"""
+    parts = query.split('?')
+    return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], 1))
+
+
+class AsyncpgPool:
+    """asyncpg bağlantı havuzu (PostgreSQL)"""
+
+    def __init__(self, params, max_size=ASYNC_DB_POOL_MAX_SIZE):
+        self.params = {key: value for key, value in params.items() if value is not None}
+        self.max_size = max_size
+        self._pool = None
+
+    async def open(self):
+        self._pool = await asyncpg.create_pool(min_size=1, max_size=self.max_size, **self.params)
+
+    async def fetchall(self, query, params):
+        async with self._pool.acquire() as conn:
+            return [tuple(row) for row in await conn.fetch(translate(query), *params)]
+
+    async def close(self):
+        await self._pool.close()
+
+
+class AiosqlitePool:
+    """aiosqlite bağlantıları (her biri kendi thread'inde) için sınırlı havuz"""
+
+    def __init__(self, path, max_size=ASYNC_DB_POOL_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._idle = []
+        self._available = None
+
+    async def open(self):
+        self._available = asyncio.Semaphore(self.max_size)
+
+    async def fetchall(self, query, params):
+        async with self._available:
+            conn = self._idle.pop() if self._idle else await aiosqlite.connect(self.path, timeout=db.POOL_TIMEOUT)
+            try:
+                async with conn.execute(query, params) as cursor:
+                    rows = await cursor.fetchall()
+            except Exception:
+                await conn.close()
+                raise
+            self._idle.append(conn)
+            return rows
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+
+def create_pool(target=None):
+    """Veritabanının (varsayılan: ana) dialect'ine uygun asenkron havuz; sürücü yoksa None"""
+    target = target or db.pool
+    if target.dialect == 'postgres' and ASYNCPG_AVAILABLE:
+        return AsyncpgPool(target.params)
+    if target.dialect == 'sqlite' and AIOSQLITE_AVAILABLE:
+        return AiosqlitePool(target.params['path'])
+    return None
+
+
+# (event loop, {shard: havuz}, replika havuzu veya None) - asgi.py başlangıcında açılır
+_native = None
+_executor = ThreadPoolExecutor(ASYNC_DB_THREADS, thread_name_prefix='aiodb')
+
+
+def native():
+    """Yerel async sürücü havuzu açık mı (sadece ASGI modunda, asyncpg/aiosqlite yüklüyse)"""
+    return _native is not None
+
+
+async def open_pool():
+    """Çalışan event loop'a bağlı yerel sürücü havuzunu açar (ASGI lifespan başlangıcı)"""
+    global _native
+    pools = {shard: create_pool(target) for shard, target in db.shards.items()}
+    if any(pool is None for pool in pools.values()):
+        print("Warning: asyncpg/aiosqlite not available, async queries run in threads")
+        return
+    for pool in pools.values():
+        await pool.open()
+    read_pool = create_pool(db.replica.pool) if db.replica.pool is not None else None
+    if read_pool is not None:
+        await read_pool.open()
+    _native = (asyncio.get_running_loop(), pools, read_pool)
+
+
+async def close_pool():
+    global _native
+    if _native is not None:
+        _, pools, read_pool = _native
+        _native = None
+        for pool in pools.values():
+            await pool.close()
+        if read_pool is not None:
+            await read_pool.close()
+
+
+async def _in_thread(func, *args):
+    """Sync işi çağıranın bağlamıyla (Flask g, sorgu istatistikleri) thread havuzunda çalıştırır"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args))
+
+
+def _fetchall_sync(query, params):
+    # Sadece okuyan sorgular: uygunsa replikadan
+    with db.read_connection() as conn:
+        # Ham cursor: süre fetchall() içinde bir kez kaydedilir
+        cursor = conn.raw.cursor()
+        cursor.execute(db.translate(query, conn.dialect), params)
+        return cursor.fetchall()
+
+
+async def _native_fetchall(pool, query, params):
+    loop = _native[0]
+    coroutine = pool.fetchall(query, params)
+    if loop is asyncio.get_running_loop():
+        return await coroutine
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+
+async def fetchall(query, params=()):
+    """Okuyan sorgunun satırları (uygunsa replikadan); '?' placeholder'lı, db.Cursor ile aynı sorgu metni"""
+    started = time.perf_counter()
+    try:
+        if _native is None:
+            return await _in_thread(_fetchall_sync, query, tuple(params))
+        _, pools, read_pool = _native
+        pool = pools[db.current_shard()]
+        if read_pool is not None and db.use_replica():
+            try:
+                rows = await _native_fetchall(read_pool, query, tuple(params))
+                db.note_replica_read()
+                return rows
+            except Exception as e:
+                db.replica.mark_failed(e)
+        return await _native_fetchall(pool, query, tuple(params))
+    finally:
+        db.record_query(query, time.perf_counter() - started)
+
+
+async def run_sync(func, *args):
+    """func(conn, *args) çağrısını kendi ana veritabanı bağlantısıyla thread'de çalıştırır (cache gibi sync kod)"""
+    def call():
+        with db.connection() as conn:
+            return func(conn, *args)
+    return await _in_thread(call)
+
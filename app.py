@@ -1,587 +1,834 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, Response, g, make_response, render_template, request, redirect, session, url_for, jsonify, flash
+import asyncio
+import click
 import os
-from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from datetime import datetime
 import hashlib
+import hmac
+import threading
 import time
 
-# PostgreSQL bağlantısı için psycopg2 import
-try:
-    import psycopg2
-    PSYCOPG2_AVAILABLE = True
-except ImportError:
-    PSYCOPG2_AVAILABLE = False
-    print("Warning: psycopg2 not available, using SQLite for development")
+import admission
+import aiodb
+import assets
+import counters
+import db
+import events
+import history
+import metrics
+import migrations
+import pagecache
+import profiles
+import retention
+import rollup
+import roster
+import rules
+import tenants
+import transfer
+import trends
+from cache import ROSTER_COLUMNS, leaderboard as leaderboard_cache
+from db import get_db, get_read_db
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # Flash mesajları için
+db.init_app(app)
+assets.init_app(app)
+metrics.init_app(app)
 
-def get_db_connection():
-    """Veritabanı bağlantısını alır - PostgreSQL veya SQLite"""
-    # Render'da DATABASE_URL environment variable'ı olacak
-    database_url = os.getenv('DATABASE_URL')
-    
-    if database_url and PSYCOPG2_AVAILABLE:
-        # PostgreSQL için (production)
-        result = urlparse(database_url)
-        conn = psycopg2.connect(
-            host=result.hostname,
-            database=result.path[1:],
-            user=result.username,
-            password=result.password,
-            port=result.port
-        )
-    else:
-        # SQLite için (local development veya psycopg2 yoksa)
-        import sqlite3
-        conn = sqlite3.connect('kufur_sayac.db')
-    
-    return conn
+# Küfür eklenip azaltılabilen saatler, 'SS:DD-SS:DD'
+OFFICE_HOURS = os.getenv('OFFICE_HOURS', '09:00-21:00')
+_office_start, _office_end = (datetime.strptime(part, '%H:%M').time() for part in OFFICE_HOURS.split('-'))
+app.jinja_env.globals['office_hours'] = OFFICE_HOURS
+
+# /export için erişim anahtarı; ayarlanmamışsa HTTP üzerinden dışa aktarım kapalı (IP adresleri içerir)
+EXPORT_TOKEN = os.getenv('EXPORT_TOKEN')
 
 def is_office_hours():
-    """Ofis saatlerinde mi kontrol eder (09:00-21:00)"""
+    """Ofis saatlerinde mi kontrol eder (varsayılan 09:00-21:00)"""
     now = datetime.now()
-    start_time = now.replace(hour=9, minute=0, second=0, microsecond=0)
-    end_time = now.replace(hour=21, minute=0, second=0, microsecond=0)
+    start_time = now.replace(hour=_office_start.hour, minute=_office_start.minute, second=0, microsecond=0)
+    end_time = now.replace(hour=_office_end.hour, minute=_office_end.minute, second=0, microsecond=0)
     return start_time <= now <= end_time
 
 def get_daily_challenges():
     """Günlük challenge'ları döndürür"""
-    challenges = [
-        {"id": "clean_day", "name": "Temiz Gün", "desc": "Bugün hiç küfür etme", "xp": 50, "icon": "🌸"},
-        {"id": "first_blood", "name": "İlk Kan", "desc": "Günün ilk küfrünü et", "xp": 10, "icon": "⚡"},
-        {"id": "social", "name": "Sosyal", "desc": "3 farklı kişiye küfür ekle", "xp": 30, "icon": "👥"},
-        {"id": "streak", "name": "Streak", "desc": "3 gün üst üste aktif ol", "xp": 40, "icon": "🔥"}
-    ]
-    return challenges
-
-def check_and_update_challenges(kullanici_id):
-    """Kullanıcının challenge'larını kontrol eder ve günceller"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        today = datetime.now().date()
-        
-        # Bugünkü challenge'ları kontrol et
-        challenges = get_daily_challenges()
-        completed_challenges = []
-        
-        for challenge in challenges:
-            # Bu challenge bugün tamamlandı mı?
-            if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                cursor.execute('''
-                    SELECT * FROM challenges 
-                    WHERE kullanici_id = %s AND challenge_type = %s AND date = %s
-                ''', (kullanici_id, challenge["id"], today))
-            else:
-                cursor.execute('''
-                    SELECT * FROM challenges 
-                    WHERE kullanici_id = ? AND challenge_type = ? AND date = ?
-                ''', (kullanici_id, challenge["id"], today))
-            
-            if not cursor.fetchone():
-                # Challenge henüz eklenmemiş, ekle
-                if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                    cursor.execute('''
-                        INSERT INTO challenges (kullanici_id, challenge_type, date, reward_xp)
-                        VALUES (%s, %s, %s, %s)
-                    ''', (kullanici_id, challenge["id"], today, challenge["xp"]))
-                else:
-                    cursor.execute('''
-                        INSERT INTO challenges (kullanici_id, challenge_type, date, reward_xp)
-                        VALUES (?, ?, ?, ?)
-                    ''', (kullanici_id, challenge["id"], today, challenge["xp"]))
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        print(f"Error in check_and_update_challenges: {e}")
-        return False
+    return list(rules.DAILY_CHALLENGES)
 
-def get_user_stats():
-    """Kullanıcı istatistiklerini hesaplar"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Haftalık istatistikler - kufur_gecmisi tablosu yoksa boş liste döndür
-        try:
-            week_ago = datetime.now() - timedelta(days=7)
-            if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                cursor.execute('''
-                    SELECT kullanici_id, COUNT(*) as haftalik_kufur 
-                    FROM kufur_gecmisi 
-                    WHERE tarih >= %s 
-                    GROUP BY kullanici_id
-                ''', (week_ago,))
-            else:
-                cursor.execute('''
-                    SELECT kullanici_id, COUNT(*) as haftalik_kufur 
-                    FROM kufur_gecmisi 
-                    WHERE tarih >= ? 
-                    GROUP BY kullanici_id
-                ''', (week_ago,))
-            haftalik_stats = cursor.fetchall()
-        except:
-            haftalik_stats = []
-        
-        # Leaderboard - XP'ye göre sıralama
-        cursor.execute('''
-            SELECT k.isim, k.kufur_sayisi, k.toplam_para, k.xp, k.level, k.avatar
-            FROM kullanicilar k 
-            ORDER BY k.xp DESC, k.kufur_sayisi DESC
-            LIMIT 10
-        ''')
-        leaderboard = cursor.fetchall()
-        
-        conn.close()
-        return haftalik_stats, leaderboard
-    except Exception as e:
-        print(f"Error in get_user_stats: {e}")
-        return [], []
-
-def get_level_info(xp):
-    """XP'ye göre seviye bilgilerini döndürür"""
-    levels = [
-        {"level": 1, "name": "Masum", "icon": "😇", "min_xp": 0, "max_xp": 100},
-        {"level": 2, "name": "Acemi", "icon": "🌱", "min_xp": 100, "max_xp": 250},
-        {"level": 3, "name": "Orta", "icon": "🎯", "min_xp": 250, "max_xp": 500},
-        {"level": 4, "name": "Usta", "icon": "⚔️", "min_xp": 500, "max_xp": 1000},
-        {"level": 5, "name": "Efsane", "icon": "🔥", "min_xp": 1000, "max_xp": 999999}
-    ]
-    
-    for level_info in levels:
-        if level_info["min_xp"] <= xp < level_info["max_xp"]:
-            progress = ((xp - level_info["min_xp"]) / (level_info["max_xp"] - level_info["min_xp"])) * 100
-            return {**level_info, "progress": min(progress, 100)}
-    
-    return levels[-1]  # Max level
+# Shard başına günlük challenge satırlarının bu process'te en son oluşturulduğu gün
+_challenges_materialized_on = {}
+_challenges_lock = threading.Lock()
 
-def calculate_badges(kufur_sayisi, toplam_para, streak):
-    """Başarı rozetlerini hesaplar"""
-    badges = []
-    
-    # Küfür rozetleri
-    if kufur_sayisi >= 50:
-        badges.append({"name": "Küfür Kralı", "icon": "👑", "color": "#FFD700"})
-    elif kufur_sayisi >= 30:
-        badges.append({"name": "Küfür Ustası", "icon": "⚔️", "color": "#C0C0C0"})
-    elif kufur_sayisi >= 10:
-        badges.append({"name": "Küfür Çırağı", "icon": "🔨", "color": "#CD7F32"})
+def materialize_daily_challenges(conn, today=None):
+    """Shard'daki tüm kullanıcıların bugünkü eksik challenge satırlarını tek sorguda oluşturur"""
+    today = today or rollup.today()
+    challenges = get_daily_challenges()
     
-    # Temiz dil rozetleri
-    if kufur_sayisi == 0:
-        badges.append({"name": "Temiz Dil", "icon": "🌸", "color": "#90EE90"})
-    elif kufur_sayisi <= 3:
-        badges.append({"name": "Nazik", "icon": "🌺", "color": "#FFB6C1"})
+    # (challenge_type, reward_xp) satırlarından oluşan sabit tablo
+    challenge_rows = ' UNION ALL '.join(['SELECT ? AS challenge_type, ? AS reward_xp'] * len(challenges))
+    params = [today]
+    for challenge in challenges:
+        params.extend([challenge["id"], challenge["xp"]])
     
-    # Borç rozetleri
-    if toplam_para >= 500:
-        badges.append({"name": "Borç Kralı", "icon": "💰", "color": "#FFD700"})
-    elif toplam_para >= 200:
-        badges.append({"name": "Borçlu", "icon": "💸", "color": "#FF6B6B"})
-    
-    # Streak rozetleri
-    if streak >= 7:
-        badges.append({"name": "Haftalık Streak", "icon": "🔥", "color": "#FF4500"})
-    elif streak >= 3:
-        badges.append({"name": "Streak Master", "icon": "⭐", "color": "#FFA500"})
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        INSERT INTO challenges (grup_id, kullanici_id, challenge_type, date, reward_xp)
+        SELECT k.grup_id, k.id, c.challenge_type, ?, c.reward_xp
+        FROM kullanicilar k CROSS JOIN ({challenge_rows}) c
+        WHERE true
+        ON CONFLICT (kullanici_id, challenge_type, date) DO NOTHING
+    ''', params)
+    conn.commit()
+
+def ensure_daily_challenges():
+    """Günlük challenge'ları process ve shard başına günde bir kez oluşturur, biten günleri kapatır"""
+    # Gün sınırı kural motoru ve günlük özetle aynı (UTC)
+    today = rollup.today()
+    shard = db.current_shard()
+    if _challenges_materialized_on.get(shard) == today:
+        return True
     
-    return badges
+    with _challenges_lock:
+        if _challenges_materialized_on.get(shard) == today:
+            return True
+        conn = get_db()
+        try:
+            materialize_daily_challenges(conn, today)
+            # Dünün Temiz Gün ödülleri ve kırılan streak'ler; başka worker yaptıysa boş geçer
+            rules.close_pending_days(conn, today)
+            _challenges_materialized_on[shard] = today
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error in ensure_daily_challenges: {e}")
+            return False
+
+def index_totals(conn):
+    """Toplam borç, kullanıcı sayısı ve leaderboard - hepsi cache'ten, tek bağlantıyla"""
+    return leaderboard_cache.total_para(conn), leaderboard_cache.count(conn), leaderboard_cache.top(conn, 10)
+
+async def get_weekly_stats():
+    """Haftalık istatistikler - günlük özet tablosundan"""
+    try:
+        return await aiodb.fetchall(*rollup.weekly_counts_query(tenants.current().id, days=7))
+    except Exception as e:
+        print(f"Error in get_weekly_stats: {e}")
+        return []
 
 def update_user_xp(kullanici_id, xp_change):
     """Kullanıcının XP'sini günceller ve seviye kontrolü yapar"""
+    conn = get_db()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Mevcut XP ve level'ı al
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('SELECT xp, level FROM kullanicilar WHERE id = %s', (kullanici_id,))
-        else:
-            cursor.execute('SELECT xp, level FROM kullanicilar WHERE id = ?', (kullanici_id,))
-        
-        result = cursor.fetchone()
-        if not result:
-            return False
-            
-        current_xp, current_level = result
-        new_xp = max(0, current_xp + xp_change)
-        
-        # Yeni seviye hesapla
-        level_info = get_level_info(new_xp)
-        new_level = level_info["level"]
-        
-        # Güncelle
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('UPDATE kullanicilar SET xp = %s, level = %s WHERE id = %s', 
-                         (new_xp, new_level, kullanici_id))
-        else:
-            cursor.execute('UPDATE kullanicilar SET xp = ?, level = ? WHERE id = ?', 
-                         (new_xp, new_level, kullanici_id))
-        
-        conn.commit()
-        conn.close()
-        
-        # Seviye atladı mı?
-        level_up = new_level > current_level
-        return {"level_up": level_up, "new_level": new_level, "new_xp": new_xp}
-        
+        result = counters.apply_xp(conn, kullanici_id, xp_change)
+        if result:
+            pagecache.bump()
+        return result or False
     except Exception as e:
         print(f"Error updating XP: {e}")
         return False
 
 def init_db():
-    """Veritabanını başlatır"""
+    """Veritabanını başlatır - bekleyen şema migration'larını uygular"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # PostgreSQL için tablo oluşturma
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS kullanicilar (
-                    id SERIAL PRIMARY KEY,
-                    isim TEXT NOT NULL,
-                    kufur_sayisi INTEGER DEFAULT 0,
-                    toplam_para REAL DEFAULT 0,
-                    xp INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    avatar TEXT DEFAULT '😊',
-                    streak INTEGER DEFAULT 0,
-                    last_activity DATE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS kufur_gecmisi (
-                    id SERIAL PRIMARY KEY,
-                    kullanici_id INTEGER REFERENCES kullanicilar(id),
-                    tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ip_adresi TEXT
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS challenges (
-                    id SERIAL PRIMARY KEY,
-                    kullanici_id INTEGER REFERENCES kullanicilar(id),
-                    challenge_type TEXT NOT NULL,
-                    completed BOOLEAN DEFAULT FALSE,
-                    date DATE DEFAULT CURRENT_DATE,
-                    reward_xp INTEGER DEFAULT 0
-                )
-            ''')
-        else:
-            # SQLite için tablo oluşturma
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS kullanicilar (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    isim TEXT NOT NULL,
-                    kufur_sayisi INTEGER DEFAULT 0,
-                    toplam_para REAL DEFAULT 0,
-                    xp INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    avatar TEXT DEFAULT '😊',
-                    streak INTEGER DEFAULT 0,
-                    last_activity DATE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS kufur_gecmisi (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    kullanici_id INTEGER,
-                    tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ip_adresi TEXT,
-                    FOREIGN KEY (kullanici_id) REFERENCES kullanicilar (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS challenges (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    kullanici_id INTEGER,
-                    challenge_type TEXT NOT NULL,
-                    completed BOOLEAN DEFAULT FALSE,
-                    date DATE DEFAULT CURRENT_DATE,
-                    reward_xp INTEGER DEFAULT 0,
-                    FOREIGN KEY (kullanici_id) REFERENCES kullanicilar (id)
-                )
-            ''')
-        
-        conn.commit()
-        conn.close()
+        applied = migrations.run()
+        if applied:
+            print(f"Database migrated: {applied}")
         print("Database initialized successfully!")
     except Exception as e:
         print(f"Database initialization error: {e}")
 
+@app.cli.command('flush-history')
+def flush_history_command():
+    """Tamponda bekleyen ve journal'da kalan küfür geçmişini yazar"""
+    print(f"Replayed {history.replay_journals()} journal events")
+    print(f"Flushed {history.buffer.flush()} buffered events")
+
+@app.cli.command('backfill-rollup')
+def backfill_rollup_command():
+    """kufur_gunluk özetini her shard'da küfür geçmişinden yeniden hesaplar"""
+    history.buffer.flush()
+    for shard in db.shard_names():
+        with db.connection(shard) as conn:
+            print(f"Rollup rebuilt on {shard}: {rollup.backfill(conn)} rows")
+        pagecache.bump_shard(shard)
+
+@app.cli.command('retention')
+@click.option('--days', default=retention.HISTORY_RETENTION_DAYS, help='Ham olay saklama süresi (gün)')
+@click.option('--chunk-size', default=retention.RETENTION_DELETE_CHUNK, help='Transaction başına silinen satır')
+def retention_command(days, chunk_size):
+    """Eski küfür geçmişini günlük özete sıkıştırıp siler"""
+    if days <= 0:
+        raise click.ClickException("Retention is disabled, set HISTORY_RETENTION_DAYS or --days")
+    result = retention.run(days, chunk_size)
+    print(f"Compacted before {result['sinir']} ({result['rollup_rows']} rollup rows)")
+    if result['dropped_partitions']:
+        print(f"Dropped partitions: {', '.join(result['dropped_partitions'])}")
+    print(f"Deleted {result['deleted']} history events")
+
+@app.cli.command('partition-history')
+def partition_history_command():
+    """Her shard'da kufur_gecmisi'ni aylık bölümlü tabloya taşır (PostgreSQL, tablo kilitlenir)"""
+    history.buffer.flush()
+    for shard in db.shard_names():
+        try:
+            with db.connection(shard) as conn:
+                moved = retention.partition_history(conn)
+        except retention.RetentionError as e:
+            raise click.ClickException(f"{shard}: {e}")
+        print(f"Moved {moved} history events into monthly partitions on {shard}")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """CSS/JS dosyalarını static/dist/ altına parmak izli, gzip/brotli sıkıştırılmış yazar"""
+    for name, entry in sorted(assets.build().items()):
+        print(f"{name} -> {entry['path']} ({entry['size']} bytes, {', '.join(entry['encodings']) or 'uncompressed'})")
+
+@app.cli.command('sync-replica')
+def sync_replica_command():
+    """SQLite ana veritabanını DATABASE_READ_URL dosyasına kopyalar (replikayı yerelde denemek için)"""
+    history.buffer.flush()
+    try:
+        pages = db.copy_to_replica()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Copied {pages} pages to {db.replica.pool.params['path']}")
+
+@app.cli.command('close-days')
+def close_days_command():
+    """Her shard'da biten günleri kapatır: Temiz Gün ödülleri ve kırılan streak'ler"""
+    for shard in db.shard_names():
+        with db.connection(shard) as conn:
+            days, awarded = rules.close_pending_days(conn)
+        print(f"Closed {days} days on {shard}, {awarded} clean day rewards")
+
+@app.cli.command('rebuild-rules')
+@click.option('--apply', is_flag=True, help='Farkları düzelt (verilen/geri alınan XP dahil)')
+def rebuild_rules_command(apply):
+    """Her shard'da streak ve challenge durumunu geçmişten baştan hesaplayıp artımlı durumla karşılaştırır"""
+    history.buffer.flush()
+    differs = False
+    for shard in db.shard_names():
+        with db.connection(shard) as conn:
+            report = rules.rebuild(conn, apply=apply)
+        print(f"Checked {report['users']} users on {shard}: {len(report['user_mismatches'])} streak mismatches, "
+              f"{len(report['missing'])} missing and {len(report['extra'])} extra challenge completions")
+        for kullanici_id, actual, expected in report['user_mismatches'][:10]:
+            print(f"  user {kullanici_id}: streak/last_activity {actual[0]}/{actual[1]} != {expected[0]}/{expected[1]}")
+        for label in ('missing', 'extra'):
+            for kullanici_id, challenge_type, gun in report[label][:10]:
+                print(f"  {label}: user {kullanici_id} {challenge_type} {gun}")
+        if apply:
+            print(f"Applied, XP updated for {report['xp_changed_users']} users")
+        differs = differs or bool(report['user_mismatches'] or report['missing'] or report['extra'])
+    if differs and not apply:
+        raise click.ClickException("Incremental state differs from history (use --apply to fix)")
+
+@app.cli.command('bench-profiles')
+@click.option('--users', default=10000, help='Sentetik kullanıcı sayısı')
+@click.option('--repeat', default=20, help='Tekrar sayısı')
+def bench_profiles_command(users, repeat):
+    """Seviye/rozet hesabının kullanıcı başına ve toplu hallerini karşılaştırır"""
+    result = profiles.benchmark(users, repeat)
+    print(f"{result['users']} kullanıcı, numpy={result['numpy']}, "
+          f"{result['distinct_profiles']} farklı profil")
+    print(f"  kullanıcı başına : {result['per_user_ms']:.2f} ms/istek")
+    print(f"  toplu (soğuk)    : {result['batch_cold_ms']:.2f} ms/istek")
+    print(f"  toplu (memo)     : {result['batch_warm_ms']:.2f} ms/istek")
+
+def cli_tenant(slug):
+    """CLI --grup seçeneğinin grubu; yoksa hata"""
+    tenant = tenants.lookup(slug)
+    if tenant is None:
+        raise click.ClickException(f"Unknown group: {slug}")
+    return tenant
+
+@app.cli.command('create-group')
+@click.argument('slug')
+@click.option('--isim', help='Görünen ad (varsayılan: slug)')
+@click.option('--shard', type=click.Choice(db.shard_names()), help='Varsayılan: SHARD_ROUTER seçer')
+def create_group_command(slug, isim, shard):
+    """Yeni grup oluşturur; adresleri /g/<slug>/ altında"""
+    try:
+        tenant = tenants.create(slug, isim, shard)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Created group {tenant.slug} (id {tenant.id}) on shard {tenant.shard}: {tenant.prefix}/")
+
+@app.cli.command('list-groups')
+def list_groups_command():
+    """Grupları, shard'larını ve kullanıcı sayılarını listeler"""
+    for tenant in tenants.all_tenants():
+        try:
+            with db.connection(tenant.shard) as conn:
+                cursor = conn.execute('SELECT COUNT(*) FROM kullanicilar WHERE grup_id = ?', (tenant.id,))
+                users = cursor.fetchone()[0]
+        except ValueError as e:
+            users = f'? ({e})'
+        print(f"{tenant.id:>5}  {tenant.slug:<20} {tenant.shard:<12} {users} users  {tenant.isim}")
+
+@app.cli.command('export-data')
+@click.argument('tablo', type=click.Choice(list(transfer.COLUMNS)))
+@click.argument('dosya', type=click.File('wb'), default='-')
+@click.option('--format', 'bicim', type=click.Choice(list(transfer.FORMATS)), default='csv', help='Çıktı biçimi')
+@click.option('--grup', default=tenants.DEFAULT_SLUG, help='Grup (slug)')
+def export_data_command(tablo, dosya, bicim, grup):
+    """Grubun tablosunu CSV/NDJSON olarak dosyaya (varsayılan stdout) yazar"""
+    with tenants.use(cli_tenant(grup)):
+        for chunk in transfer.export(tablo, bicim):
+            dosya.write(chunk)
+
+@app.cli.command('import-data')
+@click.argument('tablo', type=click.Choice(list(transfer.COLUMNS)))
+@click.argument('dosya', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'bicim', type=click.Choice(list(transfer.FORMATS)), help='Varsayılan: dosya uzantısından')
+@click.option('--chunk-size', default=transfer.IMPORT_CHUNK_SIZE, help='Transaction başına satır')
+@click.option('--grup', default=tenants.DEFAULT_SLUG, help='Grup (slug)')
+def import_data_command(tablo, dosya, bicim, chunk_size, grup):
+    """CSV/NDJSON dosyasını gruba parça parça transaction'larla içe aktarır"""
+    def progress(result):
+        print(f"  {result['read']} rows read, {result['inserted']} inserted")
+    try:
+        with tenants.use(cli_tenant(grup)):
+            result = transfer.import_file(tablo, dosya, bicim, chunk_size, progress)
+    except click.ClickException:
+        raise
+    except Exception as e:
+        raise click.ClickException(f"Import stopped (earlier chunks are committed): {e}")
+    print(f"Imported {result['inserted']} of {result['read']} {tablo} rows "
+          f"({result['skipped']} skipped, {result['chunks']} chunks)")
+    if 'rollup_rows' in result:
+        print(f"Rollup rebuilt: {result['rollup_rows']} rows")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Şema migration'larını uygular"""
+    init_db()
+
+# Şema kurulumu istek yolunda değil, worker açılışında bir kez yapılır
+if os.getenv('AUTO_MIGRATE', '1') == '1':
+    init_db()
+
+# Çökmüş worker'lardan kalan geçmiş olaylarını yaz
+if history.HISTORY_WRITE_MODE == 'buffered':
+    try:
+        replayed = history.replay_journals()
+        if replayed:
+            print(f"Replayed {replayed} history events from journal")
+    except Exception as e:
+        print(f"History journal replay error: {e}")
+
+@app.before_request
+def start_background_jobs():
+    # Sadece istek alan web sunucusu worker'ında; import (CLI, migration, benchmark) başlatmaz.
+    # Eski geçmişi sıkıştırıp silen iş her worker'da çalışır, kiralamayı alan tek worker yapar
+    retention.schedule()
+
+def render_cached(page, variant, render):
+    """Veri sürümü değişmediyse 304 ya da hazır HTML döner; değiştiyse render edip saklar"""
+    if session.get('_flashes'):
+        # Flash mesajları tek seferlik, bu cevap cache'lenmez
+        return render()
+    
+    # Sürüm render'dan önce okunur: render sırasında gelen yazma yeni bir sürüm açar
+    version = pagecache.data_version()
+    etag = pagecache.etag(page, tenants.current().key, version, assets.version, *variant)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        html = pagecache.pages.get(etag)
+        if html is None:
+            html = render()
+            if g.get('db_replica_read') and pagecache.version_age(version) < db.REPLICA_MAX_LAG:
+                # Replika bu sürüme henüz yetişmemiş olabilir: sayfa bu sürüm adına saklanmaz
+                response = make_response(html)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            pagecache.pages.set(etag, html)
+        response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Her seferinde ETag ile doğrulansın
+    return response
+
+async def load_index_async(after, before, arama, limit):
+    # Birbirinden bağımsız işler eşzamanlı: bu sayfanın kullanıcıları (keyset sayfalama),
+    # haftalık özet ve cache'ten toplamlar/leaderboard
+    rows, haftalik_stats, totals = await asyncio.gather(
+        aiodb.fetchall(*roster.page_query(tenants.current().id, after=after, before=before, search=arama,
+                                          limit=limit)),
+        get_weekly_stats(),
+        aiodb.run_sync(index_totals))
+    return roster.page_from_rows(rows, after=after, before=before, limit=limit), haftalik_stats, totals
+
+def load_index(after, before, arama, limit):
+    # Aynı işler sırayla, isteğin tek bağlantısıyla (gthread: ek event loop ve havuz bağlantısı yok)
+    conn = get_db()
+    grup_id = tenants.current().id
+    sayfa = roster.page(conn, grup_id, after=after, before=before, search=arama, limit=limit)
+    try:
+        haftalik_stats = rollup.weekly_counts(conn, grup_id, days=7)
+    except Exception as e:
+        print(f"Error in get_weekly_stats: {e}")
+        haftalik_stats = []
+    return sayfa, haftalik_stats, index_totals(conn)
+
+def render_index(after=None, before=None, arama='', limit=roster.ROSTER_PAGE_SIZE):
+    # Sorgular sadece ASGI modunda yerel async sürücü havuzu açıkken eşzamanlı çalışır
+    if aiodb.native():
+        sayfa, haftalik_stats, totals = app.async_to_sync(load_index_async)(after, before, arama, limit)
+    else:
+        sayfa, haftalik_stats, totals = load_index(after, before, arama, limit)
+    toplam_para, kullanici_sayisi, leaderboard = totals
+    
+    # Günlük challenge'lar
+    daily_challenges = get_daily_challenges()
+    
+    # Her kullanıcı için detaylı bilgiler (seviye ve rozetler) - sayfa tek geçişte
+    kullanicilar_with_details = profiles.roster_details(sayfa.rows)
+    
+    return render_template('index.html', 
+                        kullanicilar=kullanicilar_with_details, 
+                        kullanici_sayisi=kullanici_sayisi,
+                        sayfa=sayfa,
+                        arama=arama,
+                        toplam_para=toplam_para,
+                        is_office_hours=is_office_hours(),
+                        leaderboard=leaderboard,
+                        daily_challenges=daily_challenges,
+                        haftalik_stats=haftalik_stats)
+
 @app.route('/')
 def index():
-    # Her request'te tablo var mı kontrol et
-    init_db()
+    """Ana sayfa (?q=isim&after=imleç|before=imleç&limit=N)"""
+    after, before = request.args.get('after'), request.args.get('before')
+    arama = request.args.get('q', '').strip()
+    try:
+        limit = roster.page_size(request.args.get('limit'))
+        for value in (after, before):
+            if value:
+                roster.decode_cursor(value)
+    except roster.CursorError as e:
+        flash(f'{e}, ilk sayfa gösteriliyor', 'error')
+        after = before = None
+        limit = roster.ROSTER_PAGE_SIZE
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Kullanıcıları getir (yeni alanlarla birlikte)
-        cursor.execute('''
-            SELECT id, isim, kufur_sayisi, toplam_para, xp, level, avatar, streak, created_at 
-            FROM kullanicilar 
-            ORDER BY xp DESC, kufur_sayisi DESC
-        ''')
-        kullanicilar = cursor.fetchall()
-        
-        # Toplam para hesaplama
-        cursor.execute('SELECT SUM(toplam_para) FROM kullanicilar')
-        toplam_para = cursor.fetchone()[0] or 0
-        
-        # İstatistikler ve leaderboard
-        haftalik_stats, leaderboard = get_user_stats()
-        
-        # Günlük challenge'lar
-        daily_challenges = get_daily_challenges()
-        
-        # Her kullanıcı için detaylı bilgiler
-        kullanicilar_with_details = []
-        for kullanici in kullanicilar:
-            # Challenge'ları kontrol et
-            check_and_update_challenges(kullanici[0])
-            
-            # Seviye bilgisi
-            level_info = get_level_info(kullanici[4])  # xp
-            
-            # Rozetler
-            badges = calculate_badges(kullanici[2], kullanici[3], kullanici[7])  # kufur, para, streak
-            
-            kullanicilar_with_details.append({
-                'data': kullanici,
-                'level_info': level_info,
-                'badges': badges
-            })
-        
-        conn.close()
-        
-        return render_template('index.html', 
-                            kullanicilar=kullanicilar_with_details, 
-                            toplam_para=toplam_para,
-                            is_office_hours=is_office_hours(),
-                            leaderboard=leaderboard,
-                            daily_challenges=daily_challenges,
-                            haftalik_stats=haftalik_stats)
+        ensure_daily_challenges()
+        # Sayfa veri dışında ofis saatine, haftalık özetin gününe ve sayfa parametrelerine bağlı
+        return render_cached('index', (is_office_hours(), rollup.today(), after, before, arama, limit),
+                             lambda: render_index(after, before, arama, limit))
     except Exception as e:
         print(f"Error in index: {e}")
         return render_template('index.html', 
                             kullanicilar=[], 
+                            kullanici_sayisi=0,
+                            sayfa=None,
+                            arama=arama,
                             toplam_para=0,
                             is_office_hours=is_office_hours(),
                             leaderboard=[],
                             daily_challenges=[],
                             haftalik_stats=[])
 
-@app.route('/kullanici_ekle', methods=['POST'])
-def kullanici_ekle():
-    isim = request.form['isim']
+SAFE_AVATARS = ['😊', '😎', '🤓', '😇', '🤔', '😴', '🤯', '🥳', '🤠', '🤖', '👻', '🎭', '🦄', '🐱', '🐶', '🦊']
+
+def user_details(row):
+    """Kullanıcı satırına seviye ve rozet bilgilerini ekler (şablonların beklediği yapı)"""
+    return profiles.details(row)
+
+def user_payload(row):
+    """API cevaplarında dönen kullanıcı bilgisi"""
+    details = user_details(row)
+    return {
+        'id': row[0],
+        'isim': row[1],
+        'kufur_sayisi': row[2],
+        'toplam_para': row[3],
+        'xp': row[4],
+        'level': row[5],
+        'avatar': row[6],
+        'streak': row[7],
+        # Paylaşılan salt okunur tablolardan JSON'a yazılabilir kopyalar
+        'level_info': dict(details['level_info']),
+        'badges': [dict(badge) for badge in details['badges']],
+    }
+
+def publish_user_change(olay, row, xp_result=None):
+    """Değişikliği duyurur: sayfa sürümünü artırır, açık panolara yeni durumu ve toplam borcu yayınlar"""
+    pagecache.bump()
+    events.publish('kullanici', {'olay': olay, 'user': user_payload(row)}, key=f'kullanici:{row[0]}')
+    if xp_result and xp_result.get('level_up'):
+        # Seviye atlama bildirimi birleştirilmez, her biri ayrı gösterilir
+        events.publish('level_up', {'id': row[0], 'isim': row[1], 'level': xp_result['new_level']})
+    publish_totals()
+
+def publish_totals():
+    conn = get_db()
+    events.publish('toplam', {'toplam_para': leaderboard_cache.total_para(conn),
+                              'kullanici_sayisi': leaderboard_cache.count(conn)}, key='toplam')
+
+def publish_user_deleted(kullanici_id):
+    pagecache.bump()
+    events.publish('kullanici_silindi', {'id': kullanici_id}, key=f'kullanici:{kullanici_id}')
+    publish_totals()
+
+def add_user(isim):
+    """Kullanıcı ekler; (kategori, mesaj, satır) döndürür"""
     print(f"Kullanıcı ekleme isteği: {isim}")
+    if not isim.strip():
+        return 'error', 'Kullanıcı adı boş olamaz!', None
     
-    if isim.strip():
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Kullanıcıyı ekle
-            if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                cursor.execute('INSERT INTO kullanicilar (isim) VALUES (%s)', (isim,))
-            else:
-                cursor.execute('INSERT INTO kullanicilar (isim) VALUES (?)', (isim,))
-            
-            conn.commit()
-            
-            # Eklenen kullanıcıyı kontrol et
-            if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                cursor.execute('SELECT * FROM kullanicilar WHERE isim = %s', (isim,))
-            else:
-                cursor.execute('SELECT * FROM kullanicilar WHERE isim = ?', (isim,))
-            
-            eklenen_kullanici = cursor.fetchone()
-            print(f"Eklenen kullanıcı: {eklenen_kullanici}")
-            
-            conn.close()
-            flash(f'Kullanıcı "{isim}" başarıyla eklendi!', 'success')
-        except Exception as e:
-            print(f"Error adding user: {e}")
-            flash(f'Kullanıcı eklenirken hata oluştu: {e}', 'error')
-    else:
-        flash('Kullanıcı adı boş olamaz!', 'error')
-    
-    return redirect(url_for('index'))
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'INSERT INTO kullanicilar (grup_id, isim, isim_arama) VALUES (?, ?, ?) '
+                       f'RETURNING {ROSTER_COLUMNS}', (tenants.current().id, isim, roster.search_key(isim)))
+        eklenen_kullanici = cursor.fetchone()
+        conn.commit()
+        leaderboard_cache.touch(eklenen_kullanici[0])
+        print(f"Eklenen kullanıcı: {eklenen_kullanici}")
+        
+        # Yeni kullanıcının bugünkü challenge'larını oluştur
+        materialize_daily_challenges(conn)
+        publish_user_change('eklendi', eklenen_kullanici)
+        return 'success', f'Kullanıcı "{isim}" başarıyla eklendi!', eklenen_kullanici
+    except Exception as e:
+        conn.rollback()
+        print(f"Error adding user: {e}")
+        return 'error', f'Kullanıcı eklenirken hata oluştu: {e}', None
 
-@app.route('/kullanici_sil/<int:kullanici_id>')
-def kullanici_sil(kullanici_id):
+def delete_user(kullanici_id):
+    """Kullanıcıyı ve bağlı satırlarını siler; (kategori, mesaj, None) döndürür"""
+    conn = get_db()
+    scope = (kullanici_id, tenants.current().id)
+    # Tamponda bekleyen olaylar silinen kullanıcıya yazılmaya çalışılmasın
+    history.buffer.discard(tenants.current().id, kullanici_id)
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('DELETE FROM kullanicilar WHERE id = %s', (kullanici_id,))
-        else:
-            cursor.execute('DELETE FROM kullanicilar WHERE id = ?', (kullanici_id,))
+        # Önce bağlı satırlar (PostgreSQL foreign key'leri silmeyi engellemesin); sadece bu grubun kullanıcısı
+        cursor.execute('DELETE FROM challenges WHERE kullanici_id = ? AND grup_id = ?', scope)
+        cursor.execute('DELETE FROM kufur_gecmisi WHERE kullanici_id = ? AND grup_id = ?', scope)
+        cursor.execute('DELETE FROM kufur_gunluk WHERE kullanici_id = ? AND grup_id = ?', scope)
+        cursor.execute('DELETE FROM azaltma_gunluk WHERE kullanici_id IN '
+                       '(SELECT id FROM kullanicilar WHERE id = ? AND grup_id = ?)', scope)
+        cursor.execute('DELETE FROM kullanicilar WHERE id = ? AND grup_id = ?', scope)
         conn.commit()
-        conn.close()
-        flash('Kullanıcı silindi!', 'success')
+        leaderboard_cache.touch(kullanici_id)
+        publish_user_deleted(kullanici_id)
+        return 'success', 'Kullanıcı silindi!', None
     except Exception as e:
+        conn.rollback()
         print(f"Error deleting user: {e}")
-        flash('Kullanıcı silinirken hata oluştu!', 'error')
-    return redirect(url_for('index'))
+        return 'error', 'Kullanıcı silinirken hata oluştu!', None
 
-@app.route('/kufur_ekle/<int:kullanici_id>')
-def kufur_ekle(kullanici_id):
+def challenge_message(xp_result):
+    """Olayla tamamlanan challenge'lar için mesaj eki"""
+    return ''.join(f' 🎯 {rules.CHALLENGES[challenge_type]["name"]} +{xp} XP'
+                   for challenge_type, xp in xp_result.get('challenges', ()))
+
+def add_curse(kullanici_id):
+    """Küfür ekler; (kategori, mesaj, güncel satır) döndürür"""
     # Ofis saatleri kontrolü
     if not is_office_hours():
-        flash('❌ Sadece 09:00-21:00 saatleri arasında küfür eklenebilir!', 'error')
-        return redirect(url_for('index'))
+        return 'error', f'❌ Sadece {OFFICE_HOURS} saatleri arasında küfür eklenebilir!', None
+    
+    admission.gate.admit(request.remote_addr, kullanici_id)
+    
+    def apply(count):
+        # Sayaç, borç, XP ve geçmiş tek transaction'da; birleştirilen tıklamalar tek +N güncelleme
+        xp_result = counters.apply_curse(get_db(), kullanici_id, count, ip_adresi=request.remote_addr)
+        if xp_result is not None:
+            publish_user_change('kufur', xp_result['row'], xp_result)
+        return xp_result
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Küfür geçmişine ekle
-        ip_adresi = request.remote_addr
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('INSERT INTO kufur_gecmisi (kullanici_id, ip_adresi) VALUES (%s, %s)', 
-                         (kullanici_id, ip_adresi))
-            cursor.execute('UPDATE kullanicilar SET kufur_sayisi = kufur_sayisi + 1, toplam_para = toplam_para + 10 WHERE id = %s', (kullanici_id,))
-        else:
-            cursor.execute('INSERT INTO kufur_gecmisi (kullanici_id, ip_adresi) VALUES (?, ?)', 
-                         (kullanici_id, ip_adresi))
-            cursor.execute('UPDATE kullanicilar SET kufur_sayisi = kufur_sayisi + 1, toplam_para = toplam_para + 10 WHERE id = ?', (kullanici_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        # XP güncelle (küfür için -5 XP)
-        xp_result = update_user_xp(kullanici_id, -5)
-        
-        message = '🤬 Küfür eklendi! +10 TL, -5 XP'
-        if xp_result and xp_result.get('level_up'):
+        xp_result, count = admission.gate.coalesce(
+            ('kufur', tenants.current().key, kullanici_id, request.remote_addr), apply)
+        if xp_result is None:
+            return 'error', 'Kullanıcı bulunamadı!', None
+        
+        message = f'🤬 {count} küfür eklendi!' if count > 1 else '🤬 Küfür eklendi!'
+        message += f' +{counters.KUFUR_PARA * count} TL, {counters.KUFUR_XP * count:+d} XP'
+        message += challenge_message(xp_result)
+        if xp_result.get('level_up'):
             message += f' 🎉 Seviye {xp_result["new_level"]}!'
-        
-        flash(message, 'success')
+        return 'success', message, xp_result['row']
     except Exception as e:
         print(f"Error adding curse: {e}")
-        flash('Küfür eklenirken hata oluştu!', 'error')
-    return redirect(url_for('index'))
+        return 'error', 'Küfür eklenirken hata oluştu!', None
 
-@app.route('/kufur_azalt/<int:kullanici_id>')
-def kufur_azalt(kullanici_id):
+def remove_curse(kullanici_id):
+    """Küfür azaltır; (kategori, mesaj, güncel satır) döndürür"""
     # Ofis saatleri kontrolü
     if not is_office_hours():
-        flash('❌ Sadece 09:00-21:00 saatleri arasında küfür azaltılabilir!', 'error')
-        return redirect(url_for('index'))
+        return 'error', f'❌ Sadece {OFFICE_HOURS} saatleri arasında küfür azaltılabilir!', None
+    
+    admission.gate.admit(request.remote_addr, kullanici_id)
+    
+    def apply(count):
+        # Sayaç, borç ve XP tek atomik sorguda; birleştirilen tıklamalar tek -N güncelleme
+        xp_result = counters.apply_uncurse(get_db(), kullanici_id, count)
+        if xp_result is not None:
+            publish_user_change('xp', xp_result['row'], xp_result)
+        return xp_result
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('UPDATE kullanicilar SET kufur_sayisi = kufur_sayisi - 1, toplam_para = toplam_para - 10 WHERE id = %s AND kufur_sayisi > 0', (kullanici_id,))
-        else:
-            cursor.execute('UPDATE kullanicilar SET kufur_sayisi = kufur_sayisi - 1, toplam_para = toplam_para - 10 WHERE id = ? AND kufur_sayisi > 0', (kullanici_id,))
-        conn.commit()
-        conn.close()
-        
-        # XP güncelle (küfür azaltma için +10 XP)
-        xp_result = update_user_xp(kullanici_id, 10)
-        
-        message = '😇 Küfür azaltıldı! -10 TL, +10 XP'
-        if xp_result and xp_result.get('level_up'):
+        xp_result, count = admission.gate.coalesce(
+            ('azalt', tenants.current().key, kullanici_id, request.remote_addr), apply)
+        if xp_result is None:
+            return 'error', 'Kullanıcı bulunamadı!', None
+        
+        message = f'😇 {count} küfür azaltıldı!' if count > 1 else '😇 Küfür azaltıldı!'
+        message += f' -{counters.KUFUR_PARA * count} TL, {counters.AZALT_XP * count:+d} XP'
+        message += challenge_message(xp_result)
+        if xp_result.get('level_up'):
             message += f' 🎉 Seviye {xp_result["new_level"]}!'
-            
-        flash(message, 'success')
+        return 'success', message, xp_result['row']
     except Exception as e:
         print(f"Error reducing curse: {e}")
-        flash('Küfür azaltılırken hata oluştu!', 'error')
-    return redirect(url_for('index'))
+        return 'error', 'Küfür azaltılırken hata oluştu!', None
 
-@app.route('/change_avatar/<int:kullanici_id>/<avatar>')
-def change_avatar(kullanici_id, avatar):
-    """Avatar değiştirme"""
+def set_avatar(kullanici_id, avatar):
+    """Avatar değiştirir; (kategori, mesaj, güncel satır) döndürür"""
+    if avatar not in SAFE_AVATARS:
+        return 'error', 'Geçersiz avatar!', None
+    
+    conn = get_db()
     try:
-        # Güvenli avatar listesi
-        safe_avatars = ['😊', '😎', '🤓', '😇', '🤔', '😴', '🤯', '🥳', '🤠', '🤖', '👻', '🎭', '🦄', '🐱', '🐶', '🦊']
-        
-        if avatar not in safe_avatars:
-            flash('Geçersiz avatar!', 'error')
-            return redirect(url_for('index'))
-        
-        conn = get_db_connection()
         cursor = conn.cursor()
-        
-        if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-            cursor.execute('UPDATE kullanicilar SET avatar = %s WHERE id = %s', (avatar, kullanici_id))
-        else:
-            cursor.execute('UPDATE kullanicilar SET avatar = ? WHERE id = ?', (avatar, kullanici_id))
-        
+        cursor.execute(f'UPDATE kullanicilar SET avatar = ? WHERE id = ? AND grup_id = ? RETURNING {ROSTER_COLUMNS}',
+                       (avatar, kullanici_id, tenants.current().id))
+        row = cursor.fetchone()
         conn.commit()
-        conn.close()
-        
-        flash(f'Avatar değiştirildi! {avatar}', 'success')
+        if row is None:
+            return 'error', 'Kullanıcı bulunamadı!', None
+        leaderboard_cache.touch(kullanici_id)
+        publish_user_change('avatar', row)
+        return 'success', f'Avatar değiştirildi! {avatar}', row
     except Exception as e:
+        conn.rollback()
         print(f"Error changing avatar: {e}")
-        flash('Avatar değiştirilemedi!', 'error')
-    
+        return 'error', 'Avatar değiştirilemedi!', None
+
+@app.route('/kullanici_ekle', methods=['POST'])
+def kullanici_ekle():
+    category, message, _ = add_user(request.form['isim'])
+    flash(message, category)
+    return redirect(url_for('index'))
+
+@app.route('/kullanici_sil/<int:kullanici_id>')
+def kullanici_sil(kullanici_id):
+    category, message, _ = delete_user(kullanici_id)
+    flash(message, category)
+    return redirect(url_for('index'))
+
+@app.errorhandler(admission.Rejected)
+def admission_rejected(e):
+    """Token bucket sınırı: API'de 429, sayfa route'larında flash mesajıyla ana sayfa"""
+    if tenants.split_path(request.path)[1].startswith('/api/'):
+        return (jsonify({'ok': False, 'message': str(e)}), 429,
+                {'Retry-After': admission.retry_after_header(e.retry_after)})
+    flash(str(e), 'error')
+    return redirect(url_for('index'))
+
+def refuse_prefetch():
+    # Ön yükleme 2xx almazsa tarayıcı tıklamada isteği gerçekten gönderir
+    return '', 503, {'Cache-Control': 'no-store'}
+
+@app.route('/kufur_ekle/<int:kullanici_id>')
+def kufur_ekle(kullanici_id):
+    if admission.gate.is_prefetch(request.headers):
+        return refuse_prefetch()
+    category, message, _ = add_curse(kullanici_id)
+    flash(message, category)
     return redirect(url_for('index'))
 
+@app.route('/kufur_azalt/<int:kullanici_id>')
+def kufur_azalt(kullanici_id):
+    if admission.gate.is_prefetch(request.headers):
+        return refuse_prefetch()
+    category, message, _ = remove_curse(kullanici_id)
+    flash(message, category)
+    return redirect(url_for('index'))
+
+@app.route('/change_avatar/<int:kullanici_id>/<avatar>')
+def change_avatar(kullanici_id, avatar):
+    """Avatar değiştirme"""
+    category, message, _ = set_avatar(kullanici_id, avatar)
+    flash(message, category)
+    return redirect(url_for('index'))
+
+def render_user_card(row):
+    """Tek kullanıcı kartının HTML parçası"""
+    return render_template('_user_card.html',
+                           kullanici=user_details(row),
+                           is_office_hours=is_office_hours())
+
+def api_response(category, message, row, **extra):
+    """Yazma işlemlerinin JSON cevabı: sadece değişen kullanıcı ve toplamlar"""
+    body = {'ok': category == 'success', 'message': message, **extra}
+    if row is not None:
+        body['user'] = user_payload(row)
+        body['html'] = render_user_card(row)
+    if category == 'success':
+        body['toplam_para'] = leaderboard_cache.total_para(get_db())
+        body['kullanici_sayisi'] = leaderboard_cache.count(get_db())
+    return jsonify(body), (200 if category == 'success' else 400)
+
+@app.route('/api/kullanicilar', methods=['POST'])
+def api_kullanici_ekle():
+    data = request.get_json(silent=True) or request.form
+    return api_response(*add_user(data.get('isim', '')))
+
+@app.route('/api/kullanicilar/<int:kullanici_id>', methods=['DELETE'])
+def api_kullanici_sil(kullanici_id):
+    category, message, row = delete_user(kullanici_id)
+    return api_response(category, message, row, deleted=category == 'success', id=kullanici_id)
+
+@app.route('/api/kullanicilar/<int:kullanici_id>/kufur_ekle', methods=['POST'])
+def api_kufur_ekle(kullanici_id):
+    return api_response(*add_curse(kullanici_id))
+
+@app.route('/api/kullanicilar/<int:kullanici_id>/kufur_azalt', methods=['POST'])
+def api_kufur_azalt(kullanici_id):
+    return api_response(*remove_curse(kullanici_id))
+
+@app.route('/api/kullanicilar/<int:kullanici_id>/avatar', methods=['POST'])
+def api_change_avatar(kullanici_id):
+    data = request.get_json(silent=True) or request.form
+    return api_response(*set_avatar(kullanici_id, data.get('avatar', '')))
+
+@app.route('/api/kullanicilar', methods=['GET'])
+def api_kullanicilar():
+    """Sayfalı kullanıcı listesi (?q=isim&after=imleç|before=imleç&limit=N)"""
+    try:
+        sayfa = roster.page(get_read_db(), tenants.current().id,
+                            after=request.args.get('after'),
+                            before=request.args.get('before'),
+                            search=request.args.get('q', '').strip(),
+                            limit=roster.page_size(request.args.get('limit')))
+    except roster.CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'users': [user_payload(row) for row in sayfa.rows],
+        'next': sayfa.next_cursor,
+        'prev': sayfa.prev_cursor,
+    })
+
+@app.route('/api/kullanicilar/<int:kullanici_id>', methods=['GET'])
+def api_kullanici(kullanici_id):
+    """Tek kullanıcının güncel bilgisi, sırası ve haftalık küfür sayısı"""
+    conn = get_read_db()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {ROSTER_COLUMNS} FROM kullanicilar WHERE id = ? AND grup_id = ?',
+                   (kullanici_id, tenants.current().id))
+    row = cursor.fetchone()
+    if row is None:
+        return jsonify({'error': 'Kullanıcı bulunamadı'}), 404
+    
+    payload = user_payload(row)
+    payload['created_at'] = row[8]
+    # Leaderboard cache'i her zaman ana veritabanından doldurulur (gecikmiş sıra saklanmasın)
+    payload['sira'] = leaderboard_cache.rank(get_db(), kullanici_id)
+    payload['haftalik_kufur'] = rollup.user_weekly_count(conn, kullanici_id)
+    return jsonify(payload)
+
+@app.route('/events')
+def event_stream():
+    """Sayaç değişikliklerinin canlı yayını (Server-Sent Events)"""
+    try:
+        # Bağlantı boyunca bu istek thread'i meşgul; çok sayıda ekran için asgi.py kullanılmalı
+        subscriber = events.broker.subscribe(holds_thread=True)
+    except events.TooManySubscribers:
+        return 'Çok fazla açık bağlantı', 503, {'Retry-After': '30'}
+    return Response(events.broker.stream(subscriber), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/fragment/kullanici/<int:kullanici_id>')
+def user_card_fragment(kullanici_id):
+    """Tek kullanıcı kartı HTML parçası (sayfayı yenilemeden güncellemek için)"""
+    cursor = get_db().cursor()
+    cursor.execute(f'SELECT {ROSTER_COLUMNS} FROM kullanicilar WHERE id = ? AND grup_id = ?',
+                   (kullanici_id, tenants.current().id))
+    row = cursor.fetchone()
+    if row is None:
+        return '', 404
+    return render_user_card(row)
+
 @app.route('/stats')
 def stats():
-    """İstatistik sayfası"""
+    """İstatistik sayfası (?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|hour|week)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Haftalık trend - kufur_gecmisi tablosu yoksa boş liste döndür
+        start, end, bucket = trends.parse_range(request.args.get('from'),
+                                                request.args.get('to'),
+                                                request.args.get('bucket'))
+    except trends.TrendRangeError as e:
+        flash(f'Geçersiz aralık: {e}', 'error')
+        start, end, bucket = trends.parse_range()
+    
+    def render_stats():
+        # Küfür trendi - gün/hafta özet tablosundan, saat ham geçmişten (uygunsa replikadan)
+        conn = get_read_db()
         try:
-            if os.getenv('DATABASE_URL') and PSYCOPG2_AVAILABLE:
-                cursor.execute('''
-                    SELECT DATE(tarih) as gun, COUNT(*) as kufur_sayisi
-                    FROM kufur_gecmisi 
-                    WHERE tarih >= DATE('now', '-7 days')
-                    GROUP BY DATE(tarih)
-                    ORDER BY gun
-                ''')
-            else:
-                cursor.execute('''
-                    SELECT DATE(tarih) as gun, COUNT(*) as kufur_sayisi
-                    FROM kufur_gecmisi 
-                    WHERE tarih >= DATE('now', '-7 days')
-                    GROUP BY DATE(tarih)
-                    ORDER BY gun
-                ''')
-            haftalik_trend = cursor.fetchall()
-        except:
+            haftalik_trend = trends.trend(conn, tenants.current().id, start, end, bucket)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error in trend query: {e}")
             haftalik_trend = []
         
-        # En çok küfür edenler
-        cursor.execute('''
-            SELECT k.isim, k.kufur_sayisi, k.toplam_para
-            FROM kullanicilar k
-            ORDER BY k.kufur_sayisi DESC
-        ''')
-        siralama = cursor.fetchall()
-        
-        conn.close()
+        # En çok küfür edenler (cache'ten, sadece ilk sayfa kadarı render edilir)
+        siralama = leaderboard_cache.by_kufur(get_db())[:roster.ROSTER_PAGE_SIZE]
         
         return render_template('stats.html', 
                             haftalik_trend=haftalik_trend,
-                            siralama=siralama)
+                            siralama=siralama,
+                            trend_from=start,
+                            trend_to=end,
+                            trend_bucket=bucket)
+    
+    try:
+        return render_cached('stats', (start, end, bucket), render_stats)
     except Exception as e:
         print(f"Error in stats: {e}")
         return render_template('stats.html', 
                             haftalik_trend=[],
-                            siralama=[])
+                            siralama=[],
+                            trend_from=start,
+                            trend_to=end,
+                            trend_bucket=bucket)
+
+@app.route('/api/trend')
+def api_trend():
+    """Küfür trendi JSON olarak (/stats ile aynı parametreler)"""
+    try:
+        start, end, bucket = trends.parse_range(request.args.get('from'),
+                                                request.args.get('to'),
+                                                request.args.get('bucket'))
+    except trends.TrendRangeError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    trend = trends.trend(get_read_db(), tenants.current().id, start, end, bucket)
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'trend': trend,
+    })
+
+@app.route('/export/<any(kullanicilar, kufur_gecmisi):tablo>.<any(csv, ndjson):bicim>')
+def export_table(tablo, bicim):
+    """Grubun tablosu akış halinde; bellek kullanımı tablo boyutundan bağımsız"""
+    if not EXPORT_TOKEN:
+        return 'Dışa aktarım kapalı (EXPORT_TOKEN ayarlanmamış)', 404
+    auth = request.headers.get('Authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.args.get('token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), EXPORT_TOKEN.encode('utf-8')):
+        return 'Yetkisiz', 401, {'WWW-Authenticate': 'Bearer'}
+    return Response(transfer.export(tablo, bicim), mimetype=transfer.FORMATS[bicim],
+                    headers={'Content-Disposition': f'attachment; filename={tablo}.{bicim}',
+                             'X-Accel-Buffering': 'no'})
+
+# Tüm route'lar tanımlandıktan sonra: /g/<grup>/ önekli kopyaları ve grup bağlamı
+tenants.init_app(app)
 
 if __name__ == '__main__':
-    init_db()
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""ASGI giriş noktası - SSE ve asenkron veritabanı havuzu event loop'ta, diğer route'lar thread havuzunda
+
+Tek worker binlerce açık /events bağlantısını thread tutmadan taşır; Flask route'ları
+ASGI_THREADS boyutlu havuzda çalışır, async view'lerin sorguları (aiodb) event loop'a aktarılır.
+
+    uvicorn asgi:app --workers 4
+    gunicorn asgi:app --worker-class uvicorn.workers.UvicornWorker --workers 4
+"""
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import aiodb
+import db
+import events
+import tenants
+from app import app as flask_app
+
+# Veritabanı havuzu WEB_THREADS'e göre boyutlanır; varsayılan aynı sayı
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', str(db.WEB_THREADS)))
+
+_executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix='wsgi')
+
+
+def wsgi_environ(scope, body):
+    """ASGI scope'undan WSGI environ (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            # Tekrarlanan başlıklar virgülle, çerezler '; ' ile birleşir (virgül çerez ayırıcısı değil)
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            environ[key] = f'{environ[key]}{separator}{value}' if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, loop, send):
+    """Flask'ı thread'de çağırır; cevap parçaları geldikçe event loop üzerinden gönderilir (akışlı dışa aktarım)"""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [{
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }]
+
+    def emit(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    result = flask_app(environ, start_response)
+    try:
+        for chunk in result:
+            if chunk:
+                if started:
+                    emit(started.pop())
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if started:
+            emit(started.pop())
+        emit({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def wsgi(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, run_wsgi, wsgi_environ(scope, body), loop, send)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send, tenant):
+    """/events ve /g/<grup>/events - app.event_stream ile aynı akış, bağlantı başına thread olmadan"""
+    try:
+        subscriber = events.broker.subscribe(tenant.key)
+    except events.TooManySubscribers:
+        await send({'type': 'http.response.start', 'status': 503,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'retry-after', b'30')]})
+        await send({'type': 'http.response.body', 'body': 'Çok fazla açık bağlantı'.encode('utf-8')})
+        return
+
+    async def stream():
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                                (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+        async for chunk in events.broker.astream(subscriber):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    # İstemci bağlantıyı kapatınca akış iptal edilir, abonelik silinir
+    tasks = [asyncio.ensure_future(stream()), asyncio.ensure_future(_wait_disconnect(receive))]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        events.broker.unsubscribe(subscriber)
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await aiodb.open_pool()
+            except Exception as e:
+                print(f"Error opening async database pool: {e}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await aiodb.close_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+    if scope['type'] != 'http':
+        return
+    slug, path = tenants.split_path(scope['path'])
+    if path == '/events' and scope['method'] == 'GET':
+        tenant = tenants.DEFAULT
+        if slug is not None:
+            # Grup dizini ilk seferde veritabanından okunur, sonra process içinde cache'lenir
+            tenant = await asyncio.get_running_loop().run_in_executor(_executor, tenants.lookup, slug)
+        if tenant is not None:
+            return await event_stream(scope, receive, send, tenant)
+        # Bilinmeyen grup: Flask 404 döner
+    return await wsgi(scope, receive, send)
@@ -0,0 +1,187 @@
+"""Statik dosya hattı - parmak izli kopyalar, gzip/brotli ön sıkıştırma ve değişmez cache başlıkları
+
+static/ altındaki kaynaklar (css/, js/) build() ile static/dist/ altına içerik hash'li
+adlarla yazılır; şablonlar asset_url() ile bu adları kullanır. Dosya adı içerikle değiştiği için
+tarayıcı dosyayı bir yıl boyunca tekrar sormaz, HTML cevabı sadece dinamik veriyi taşır.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from flask import abort, request, send_from_directory, url_for
+
+# Brotli opsiyonel; yoksa sadece gzip kopyaları üretilir
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    print("Warning: brotli not available, static assets are precompressed with gzip only")
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+ASSETS_AUTO_BUILD = os.getenv('ASSETS_AUTO_BUILD', '1') == '1'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Bundan küçük dosyalar sıkıştırılmaz (kazanç başlık maliyetinden az)
+COMPRESS_MIN_SIZE = 1024
+
+# Sadece depodaki birinci parti dosyalar; üçüncü parti kod (CDN ya da indirilen) sayfaya girmez
+SOURCES = ('css/index.css', 'js/index.js', 'css/stats.css', 'js/stats.js')
+
+# Accept-Encoding tercih sırası ve dosya uzantıları
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# static/ adı -> {'path': parmak izli ad, 'encodings': [...]}; load() ile doldurulur
+manifest = {}
+_by_path = {}
+version = ''
+
+
+def _write(path, data):
+    # Geçici dosya + rename: aynı anda build eden worker'lar yarım dosya görmez
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def fingerprint(name, data):
+    """css/index.css -> css/index.<içerik hash'i>.css"""
+    base, ext = os.path.splitext(name)
+    return f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _compressed(data):
+    """(encoding, uzantı, veri) - sadece boyutu gerçekten küçülenler"""
+    if len(data) < COMPRESS_MIN_SIZE:
+        return []
+    variants = []
+    if BROTLI_AVAILABLE:
+        variants.append(('br', '.br', brotli.compress(data, quality=11)))
+    # mtime=0: aynı içerik her build'de aynı bayt dizisi
+    variants.append(('gzip', '.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+    return [variant for variant in variants if len(variant[2]) < len(data)]
+
+
+def build(prune=True):
+    """Kaynakları static/dist/ altına parmak izli ve ön sıkıştırılmış yazar; yeni manifest"""
+    entries = {}
+    for name in SOURCES:
+        source = os.path.join(STATIC_DIR, name)
+        if not os.path.exists(source):
+            print(f"Warning: static asset {name} not found, skipped")
+            continue
+        with open(source, 'rb') as f:
+            data = f.read()
+        path = fingerprint(name, data)
+        target = os.path.join(DIST_DIR, path)
+        _write(target, data)
+        encodings = []
+        for encoding, suffix, compressed in _compressed(data):
+            _write(target + suffix, compressed)
+            encodings.append(encoding)
+        entries[name] = {'path': path, 'size': len(data), 'encodings': encodings}
+
+    # Manifest en son yazılır: okuyan worker ya eski ya yeni tam kümeyi görür
+    _write(MANIFEST_PATH, json.dumps(entries, indent=2, sort_keys=True).encode('utf-8'))
+    if prune:
+        _prune(entries)
+    load()
+    return entries
+
+
+def _prune(entries):
+    """Manifest'te olmayan eski parmak izli dosyaları siler"""
+    keep = {MANIFEST_PATH}
+    for entry in entries.values():
+        target = os.path.join(DIST_DIR, entry['path'])
+        keep.add(target)
+        keep.update(target + suffix for _, suffix in ENCODINGS)
+    for root, _, files in os.walk(DIST_DIR):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if path not in keep and not filename.endswith('.tmp'):
+                os.remove(path)
+
+
+def load():
+    """Manifest'i okur; yoksa boş (şablonlar parmak izsiz kaynaklara düşer)"""
+    global manifest, _by_path, version
+    try:
+        with open(MANIFEST_PATH, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        manifest, _by_path, version = {}, {}, ''
+        return False
+    manifest = json.loads(data)
+    _by_path = {entry['path']: entry for entry in manifest.values()}
+    # Sayfa ETag'lerine katılır: yeni build eski HTML'in 304 ile dönmesini engeller
+    version = hashlib.sha256(data).hexdigest()[:12]
+    return True
+
+
+def stale():
+    """Manifest yok ya da bir kaynak manifest'ten sonra değişmiş mi"""
+    try:
+        built_at = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return True
+    return any(os.path.getmtime(os.path.join(STATIC_DIR, name)) > built_at
+               for name in SOURCES if os.path.exists(os.path.join(STATIC_DIR, name)))
+
+
+def asset_url(name):
+    """Şablonlar için dosya adresi: parmak izli kopya, yoksa static/ kaynağı, o da yoksa None"""
+    entry = manifest.get(name)
+    if entry is not None:
+        return url_for('asset', filename=entry['path'])
+    if os.path.exists(os.path.join(STATIC_DIR, name)):
+        return url_for('static', filename=name)
+    return None
+
+
+def _encoded_path(filename):
+    """İstemcinin kabul ettiği en iyi ön sıkıştırılmış kopya: (encoding, dosya adı)"""
+    entry = _by_path.get(filename)
+    if entry is None:
+        abort(404)
+    for encoding, suffix in ENCODINGS:
+        if encoding in entry['encodings'] and request.accept_encodings[encoding]:
+            return encoding, filename + suffix
+    return None, filename
+
+
+def serve(filename):
+    """/assets/<parmak izli ad> - değişmez, bir yıl cache'lenebilir"""
+    encoding, path = _encoded_path(filename)
+    response = send_from_directory(DIST_DIR, path, mimetype=_mimetype(filename),
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _mimetype(filename):
+    if filename.endswith('.css'):
+        return 'text/css'
+    if filename.endswith('.js'):
+        return 'text/javascript'
+    return None
+
+
+def init_app(app):
+    """Manifest'i yükler (eksik/eskiyse build eder), /assets route'unu ve şablon fonksiyonlarını bağlar"""
+    load()
+    if ASSETS_AUTO_BUILD and stale():
+        try:
+            build()
+        except OSError as e:
+            print(f"Error building static assets: {e}")
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve)
+    app.jinja_env.globals['asset_url'] = asset_url
@@ -0,0 +1,52 @@
+"""Başarı rozetleri tablosu - her grup için eşik aralıkları"""
+from bisect import bisect_right
+from types import MappingProxyType
+
+_INF = float('inf')
+
+
+def _badge(name, icon, color):
+    # Salt okunur: aynı rozet tüm kullanıcıların listelerinde paylaşılır
+    return MappingProxyType({"name": name, "icon": icon, "color": color})
+
+
+# (değer sütunu, aralık alt sınırları, her aralığın rozeti) - sıra kartta görünen sıradır
+BADGE_GROUPS = (
+    # Küfür rozetleri
+    ('kufur_sayisi', (-_INF, 10, 30, 50), (
+        None,
+        _badge("Küfür Çırağı", "🔨", "#CD7F32"),
+        _badge("Küfür Ustası", "⚔️", "#C0C0C0"),
+        _badge("Küfür Kralı", "👑", "#FFD700"),
+    )),
+    # Temiz dil rozetleri (kufur_sayisi == 0 ve <= 3)
+    ('kufur_sayisi', (-_INF, 0, 1, 4), (
+        _badge("Nazik", "🌺", "#FFB6C1"),
+        _badge("Temiz Dil", "🌸", "#90EE90"),
+        _badge("Nazik", "🌺", "#FFB6C1"),
+        None,
+    )),
+    # Borç rozetleri
+    ('toplam_para', (-_INF, 200, 500), (
+        None,
+        _badge("Borçlu", "💸", "#FF6B6B"),
+        _badge("Borç Kralı", "💰", "#FFD700"),
+    )),
+    # Streak rozetleri
+    ('streak', (-_INF, 3, 7), (
+        None,
+        _badge("Streak Master", "⭐", "#FFA500"),
+        _badge("Haftalık Streak", "🔥", "#FF4500"),
+    )),
+)
+
+
+def calculate_badges(kufur_sayisi, toplam_para, streak):
+    """Başarı rozetlerini hesaplar"""
+    values = {'kufur_sayisi': kufur_sayisi, 'toplam_para': toplam_para, 'streak': streak}
+    badges = []
+    for column, bounds, group in BADGE_GROUPS:
+        badge = group[bisect_right(bounds, values[column]) - 1]
+        if badge is not None:
+            badges.append(badge)
+    return badges
@@ -0,0 +1,250 @@
+"""Bellek içi leaderboard ve toplam cache'i - grup başına, yazma işlemleriyle birlikte güncellenir"""
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from werkzeug.local import LocalProxy
+
+import store
+import tenants
+
+# Sıralı yapı için sortedcontainers (opsiyonel) - yoksa bisect ile sıralı liste
+try:
+    from sortedcontainers import SortedList
+    SORTEDCONTAINERS_AVAILABLE = True
+except ImportError:
+    SORTEDCONTAINERS_AVAILABLE = False
+
+ROSTER_COLUMNS = 'id, isim, kufur_sayisi, toplam_para, xp, level, avatar, streak, created_at'
+VERSION_KEY = 'leaderboard:version'
+# Bellekte leaderboard'u tutulan en fazla grup (process başına)
+TENANT_CACHE_SIZE = int(os.getenv('TENANT_CACHE_SIZE', '128'))
+
+
+def sort_key(row):
+    """xp DESC, kufur_sayisi DESC, id ASC sıralaması için anahtar"""
+    return (-row[4], -row[2], row[0])
+
+
+class _BisectList:
+    """SortedList yokken kullanılan bisect tabanlı sıralı liste"""
+
+    def __init__(self, items=()):
+        self._items = sorted(items)
+
+    def add(self, item):
+        insort(self._items, item)
+
+    def remove(self, item):
+        index = bisect_left(self._items, item)
+        if index < len(self._items) and self._items[index] == item:
+            del self._items[index]
+
+    def index(self, item):
+        index = bisect_left(self._items, item)
+        if index < len(self._items) and self._items[index] == item:
+            return index
+        raise ValueError(item)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def version_key(tenant):
+    return f'{VERSION_KEY}:{tenant.key}'
+
+
+class LeaderboardCache:
+    """Bir grubun kullanıcı listesini XP sıralı tutar; top-K ve sıra sorguları O(log n)"""
+
+    def __init__(self, shared_store=None, tenant=tenants.DEFAULT):
+        self.store = shared_store or store.shared
+        self.grup_id = tenant.id
+        self.version_key = version_key(tenant)
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._order = None
+        self._total_para = 0
+        self._version = None
+        self._by_kufur = None
+        self._dirty = set()
+        self.hits = 0
+        self.reloads = 0
+
+    def _shared_version(self):
+        return int(self.store.get(self.version_key) or 0)
+
+    def _load(self, conn, version):
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {ROSTER_COLUMNS} FROM kullanicilar WHERE grup_id = ?', (self.grup_id,))
+        rows = cursor.fetchall()
+        self._rows = {row[0]: tuple(row) for row in rows}
+        keys = [sort_key(row) for row in self._rows.values()]
+        self._order = SortedList(keys) if SORTEDCONTAINERS_AVAILABLE else _BisectList(keys)
+        self._total_para = sum(row[3] or 0 for row in self._rows.values())
+        self._by_kufur = None
+        self._dirty = set()
+        self._version = version
+        self.reloads += 1
+
+    def _ensure_fresh(self, conn):
+        version = self._shared_version()
+        if self._version != version or self._order is None:
+            self._load(conn, version)
+        else:
+            if self._dirty:
+                self._refresh_dirty(conn)
+            self.hits += 1
+
+    def roster(self, conn):
+        """Tüm kullanıcıları xp DESC, kufur_sayisi DESC sırasıyla döndürür"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            return [self._rows[key[2]] for key in self._order]
+
+    def count(self, conn):
+        """Kullanıcı sayısı"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            return len(self._rows)
+
+    def total_para(self, conn):
+        """Toplam borç"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            return self._total_para
+
+    def top(self, conn, k=10):
+        """Leaderboard: ilk k kullanıcı (isim, kufur_sayisi, toplam_para, xp, level, avatar)"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            result = []
+            for key in self._order[:k]:
+                row = self._rows[key[2]]
+                result.append((row[1], row[2], row[3], row[4], row[5], row[6]))
+            return result
+
+    def rank(self, conn, kullanici_id):
+        """Kullanıcının 1'den başlayan sırası, yoksa None"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            row = self._rows.get(kullanici_id)
+            if row is None:
+                return None
+            return self._order.index(sort_key(row)) + 1
+
+    def by_kufur(self, conn):
+        """İstatistik sayfası sıralaması: (isim, kufur_sayisi, toplam_para), kufur_sayisi DESC"""
+        with self._lock:
+            self._ensure_fresh(conn)
+            if self._by_kufur is None:
+                rows = sorted(self._rows.values(), key=lambda row: (-row[2], row[0]))
+                self._by_kufur = [(row[1], row[2], row[3]) for row in rows]
+            return self._by_kufur
+
+    def _apply(self, kullanici_id, row):
+        old = self._rows.pop(kullanici_id, None)
+        if old is not None:
+            self._order.remove(sort_key(old))
+            self._total_para -= old[3] or 0
+        if row is not None:
+            row = tuple(row)
+            self._rows[kullanici_id] = row
+            self._order.add(sort_key(row))
+            self._total_para += row[3] or 0
+        self._by_kufur = None
+
+    def _refresh_dirty(self, conn):
+        """Değişen kullanıcıların güncel satırlarını tek sorguda okur"""
+        dirty, self._dirty = self._dirty, set()
+        placeholders = ', '.join('?' * len(dirty))
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {ROSTER_COLUMNS} FROM kullanicilar WHERE grup_id = ? AND id IN ({placeholders})',
+                       (self.grup_id, *dirty))
+        rows = {row[0]: row for row in cursor.fetchall()}
+        for kullanici_id in dirty:
+            self._apply(kullanici_id, rows.get(kullanici_id))
+
+    def touch(self, kullanici_id):
+        """Yazma sonrası çağrılır: kullanıcıyı yenilenecek olarak işaretler ve
+        diğer worker'lar için sürümü artırır"""
+        with self._lock:
+            in_sync = self._order is not None and self._version == self._shared_version()
+            new_version = self.store.incr(self.version_key)
+            if in_sync and new_version == self._version + 1:
+                # Satırı burada değil okumada tazeleriz: eşzamanlı commit'ler
+                # farklı sırayla bildirilse bile en güncel hali okunur
+                self._dirty.add(kullanici_id)
+                self._version = new_version
+            else:
+                # Başka bir worker araya girdi: bir sonraki okumada yeniden yükle
+                self._version = None
+
+    def invalidate(self):
+        """Tüm worker'larda bir sonraki okumada yeniden yüklemeyi zorlar"""
+        with self._lock:
+            self.store.incr(self.version_key)
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._rows),
+                'version': self._version,
+                'hits': self.hits,
+                'reloads': self.reloads,
+            }
+
+
+class TenantCaches:
+    """Grup başına LeaderboardCache; en uzun süredir kullanılmayan grubun cache'i bellekten atılır (LRU)"""
+
+    def __init__(self, max_size=TENANT_CACHE_SIZE, shared_store=None):
+        self.max_size = max_size
+        self.store = shared_store or store.shared
+        self._caches = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, tenant):
+        with self._lock:
+            cache = self._caches.get(tenant.key)
+            if cache is None:
+                cache = self._caches[tenant.key] = LeaderboardCache(self.store, tenant)
+                while len(self._caches) > self.max_size:
+                    self._caches.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._caches.move_to_end(tenant.key)
+            return cache
+
+    def invalidate_shard(self, shard, conn=None):
+        """Shard genelindeki işlerden (gün sonu, rebuild) sonra shard'daki grupların cache'lerini geçersiz kılar"""
+        for tenant in tenants.in_shard(shard, conn):
+            self.store.incr(version_key(tenant))
+            with self._lock:
+                self._caches.pop(tenant.key, None)
+
+    def stats(self):
+        with self._lock:
+            caches = list(self._caches.values())
+        totals = [cache.stats() for cache in caches]
+        return {
+            'tenants': len(caches),
+            'size': sum(item['size'] for item in totals),
+            'hits': sum(item['hits'] for item in totals),
+            'reloads': sum(item['reloads'] for item in totals),
+            'evictions': self.evictions,
+        }
+
+
+leaderboards = TenantCaches()
+# İçinde bulunulan isteğin grubunun cache'i
+leaderboard = LocalProxy(lambda: leaderboards.get(tenants.current()))
@@ -0,0 +1,115 @@
+"""Sayaç yazma yolu - küfür sayısı, borç, XP ve seviye tek atomik sorguda güncellenir
+
+Güncellemeler içinde bulunulan grubun kullanıcılarıyla sınırlıdır (tenants.current()).
+"""
+import history
+import rollup
+import rules
+import tenants
+from cache import ROSTER_COLUMNS, leaderboard as leaderboard_cache
+from levels import get_level_info, xp_assignments
+
+KUFUR_PARA = 10   # Her küfür için borç (TL)
+KUFUR_XP = -5     # Küfür başına XP
+AZALT_XP = 10     # Küfür azaltma başına XP
+
+
+def _result(row, xp_change):
+    """RETURNING satırından route'ların kullandığı sonuç sözlüğünü üretir"""
+    new_xp, new_level = row[4], row[5]
+    # XP artışında sınırlama olmadığından eski XP = yeni XP - artış
+    level_up = xp_change > 0 and new_level > get_level_info(new_xp - xp_change)["level"]
+    return {"level_up": level_up, "new_level": new_level, "new_xp": new_xp, "row": row}
+
+
+def _update_returning(conn, set_clause, params):
+    # Başka grubun kullanıcısı bulunamamış sayılır
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        UPDATE kullanicilar SET {set_clause}
+        WHERE id = ? AND grup_id = ?
+        RETURNING {ROSTER_COLUMNS}
+    ''', (*params, tenants.current().id))
+    return cursor, cursor.fetchone()
+
+
+def _award(conn, kullanici_id, row, xp_change, completed):
+    """Tamamlanan challenge'ların XP'sini ekler; (güncel satır, toplam XP değişimi)"""
+    reward = sum(xp for _, xp in completed)
+    if not reward:
+        return row, xp_change
+    _, row = _update_returning(conn, xp_assignments(reward), (kullanici_id,))
+    return row, xp_change + reward
+
+
+def apply_curse(conn, kullanici_id, count=1, ip_adresi=None):
+    """Küfür ekler: sayaç, borç, XP/seviye, streak, challenge'lar, geçmiş ve günlük özet aynı
+    transaction'da yazılır. Buffered modda geçmiş commit sonrası tampona eklenir, sayaçlar yine hemen güncellenir."""
+    xp_change = KUFUR_XP * count
+    gun = rollup.today()
+    try:
+        _, row = _update_returning(conn, f'''
+            kufur_sayisi = kufur_sayisi + ?,
+            toplam_para = toplam_para + ?,
+            {xp_assignments(xp_change)},
+            {rules.ACTIVITY_SQL}
+        ''', (count, KUFUR_PARA * count, *rules.activity_params(gun), kullanici_id))
+        if row is None:
+            conn.rollback()
+            return None
+
+        grup_id = tenants.current().id
+        buffered_events = history.record(conn, grup_id, kullanici_id, ip_adresi, count)
+        rollup.record(conn, grup_id, kullanici_id, count, gun)
+        completed = rules.evaluate(conn, kullanici_id, row[7], gun, curse=True)
+        row, xp_change = _award(conn, kullanici_id, row, xp_change, completed)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    history.enqueue(buffered_events)
+    leaderboard_cache.touch(kullanici_id)
+    return {**_result(row, xp_change), "challenges": completed}
+
+
+def apply_uncurse(conn, kullanici_id, count=1):
+    """Küfür azaltır (sayaç sıfırın altına inmez); XP ödülü her tıklamada verilir, gün aktif sayılır"""
+    xp_change = AZALT_XP * count
+    gun = rollup.today()
+    try:
+        _, row = _update_returning(conn, f'''
+            toplam_para = toplam_para - ? * (CASE WHEN kufur_sayisi > ? THEN ? ELSE kufur_sayisi END),
+            kufur_sayisi = CASE WHEN kufur_sayisi > ? THEN kufur_sayisi - ? ELSE 0 END,
+            {xp_assignments(xp_change)},
+            {rules.ACTIVITY_SQL}
+        ''', (KUFUR_PARA, count, count, count, count, *rules.activity_params(gun), kullanici_id))
+        if row is None:
+            conn.rollback()
+            return None
+        rules.record_uncurse(conn, kullanici_id, count, gun)
+        completed = rules.evaluate(conn, kullanici_id, row[7], gun, curse=False)
+        row, xp_change = _award(conn, kullanici_id, row, xp_change, completed)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    leaderboard_cache.touch(kullanici_id)
+    return {**_result(row, xp_change), "challenges": completed}
+
+
+def apply_xp(conn, kullanici_id, xp_change):
+    """Sadece XP (ve seviye) günceller"""
+    try:
+        _, row = _update_returning(conn, xp_assignments(xp_change), (kullanici_id,))
+        if row is None:
+            conn.rollback()
+            return None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    leaderboard_cache.touch(kullanici_id)
+    return _result(row, xp_change)
@@ -0,0 +1,615 @@
+"""Veritabanı erişim katmanı - bağlantı havuzu, istek bazlı bağlantı, okuma replikası, shard'lar ve placeholder
+çevirisi"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from flask import g, has_app_context, request
+
+# PostgreSQL bağlantısı için psycopg2 import
+try:
+    import psycopg2
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+    print("Warning: psycopg2 not available, using SQLite for development")
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'kufur_sayac.db')
+# Worker başına istek thread'i (gunicorn --threads, bkz. Procfile); havuz ve SSE sınırı buna göre
+WEB_THREADS = int(os.getenv('WEB_THREADS', '32'))
+# Her istek thread'i en fazla bir bağlantı tutar; +2 arka plan işleri (geçmiş flush'ı, saklama işi)
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', str(WEB_THREADS + 2)))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+SLOWEST_KEPT = 5
+
+# Okuma replikası (opsiyonel): sadece okuyan sorgular buraya, yazmalar her zaman DATABASE_URL'e
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', '5'))
+WRITE_COOKIE = 'son_yazma'
+
+# Grupların dağıtıldığı ek veritabanları (opsiyonel): 'ad=url,ad2=url2'; DATABASE_URL varsayılan shard
+DATABASE_SHARDS = os.getenv('DATABASE_SHARDS', '')
+DEFAULT_SHARD = 'varsayilan'
+
+
+class PoolTimeout(Exception):
+    """Havuzda belirtilen süre içinde boş bağlantı bulunamadı"""
+
+
+def parse_database_url(database_url):
+    """DATABASE_URL'i (dialect, bağlantı parametreleri) ikilisine çevirir"""
+    if database_url and database_url.startswith('sqlite:///'):
+        return 'sqlite', {'path': database_url[len('sqlite:///'):]}
+
+    if database_url and PSYCOPG2_AVAILABLE:
+        result = urlparse(database_url)
+        return 'postgres', {
+            'host': result.hostname,
+            'database': result.path[1:],
+            'user': result.username,
+            'password': result.password,
+            'port': result.port,
+        }
+
+    # SQLite için (local development veya psycopg2 yoksa)
+    return 'sqlite', {'path': SQLITE_PATH}
+
+
+def translate(query, dialect):
+    """'?' placeholder'larını dialect'e göre çevirir (PostgreSQL için %s)"""
+    if dialect == 'postgres':
+        return query.replace('%', '%%').replace('?', '%s')
+    return query
+
+
+class QueryStats:
+    """Bir istek boyunca (veya process genelinde) çalışan sorguların özeti"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.checkouts = 0
+        self.connects = 0
+        self.slow = 0
+        self.slowest = []  # [(süre, sorgu), ...] en yavaştan başlayarak
+        self._lock = threading.Lock()  # aiodb ile bir isteğin sorguları birden çok thread'de çalışabilir
+
+    def record(self, query, elapsed):
+        with self._lock:
+            self._record(query, elapsed)
+
+    def _record(self, query, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self.slow += 1
+        if len(self.slowest) < SLOWEST_KEPT or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, ' '.join(query.split())))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+
+# Process genelindeki toplamlar (arka plan thread'leri dahil)
+totals = QueryStats()
+_totals_lock = threading.Lock()
+
+
+def current_stats():
+    """İçinde bulunulan isteğin sorgu istatistikleri; istek dışında None"""
+    if has_app_context():
+        return g.get('query_stats')
+    return None
+
+
+def record_query(query, elapsed):
+    """Sorgu süresini isteğin ve process'in istatistiklerine yazar, yavaşsa loglar"""
+    stats = current_stats()
+    if stats is not None:
+        stats.record(query, elapsed)
+    with _totals_lock:
+        totals.record(query, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(query.split())[:300]}")
+
+
+class Cursor:
+    """Sorguları dialect'e göre çeviren ve süresini ölçen cursor sarmalayıcısı"""
+
+    def __init__(self, raw, dialect):
+        self._raw = raw
+        self.dialect = dialect
+
+    def execute(self, query, params=()):
+        started = time.perf_counter()
+        try:
+            self._raw.execute(translate(query, self.dialect), params)
+        finally:
+            record_query(query, time.perf_counter() - started)
+        return self
+
+    def executemany(self, query, seq_of_params):
+        started = time.perf_counter()
+        try:
+            self._raw.executemany(translate(query, self.dialect), seq_of_params)
+        finally:
+            record_query(query, time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    def fetchmany(self, size):
+        return self._raw.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    def close(self):
+        self._raw.close()
+
+
+class Connection:
+    """Havuzdan alınmış bağlantı; close() bağlantıyı kapatmak yerine havuza iade eder"""
+
+    def __init__(self, raw, pool):
+        self.raw = raw
+        self.pool = pool
+        self.dialect = pool.dialect
+
+    @property
+    def is_postgres(self):
+        return self.dialect == 'postgres'
+
+    def cursor(self):
+        return Cursor(self.raw.cursor(), self.dialect)
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def commit(self):
+        self.raw.commit()
+        if not self.pool.readonly and has_app_context():
+            # Bu isteği yapan istemci bir süre ana veritabanından okusun (read-your-writes)
+            g.db_wrote = True
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.pool.release(self)
+
+
+class ConnectionPool:
+    """Sınırlı boyutlu, thread-safe bağlantı havuzu (PostgreSQL ve SQLite)"""
+
+    def __init__(self, database_url=None, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT, readonly=False,
+                 name=DEFAULT_SHARD):
+        self.dialect, self.params = parse_database_url(database_url)
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        # Metrikler
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _connect(self):
+        if self.dialect == 'postgres':
+            if self.readonly:
+                return psycopg2.connect(**self.params, options='-c default_transaction_read_only=on')
+            return psycopg2.connect(**self.params)
+        # Aynı bağlantı farklı thread'lerde (sırayla) kullanılabilsin
+        if self.readonly:
+            # Dosya yoksa boş veritabanı oluşturulmasın, yanlışlıkla yazılmasın
+            return sqlite3.connect(f"file:{self.params['path']}?mode=ro", uri=True, timeout=self.timeout,
+                                   check_same_thread=False)
+        return sqlite3.connect(self.params['path'], timeout=self.timeout,
+                               check_same_thread=False)
+
+    def _is_broken(self, raw):
+        return self.dialect == 'postgres' and raw.closed
+
+    def _reset_after_fork(self):
+        # gunicorn worker'ları fork edildiğinde ebeveynin bağlantıları paylaşılmasın
+        if self._pid != os.getpid():
+            self._idle = []
+            self._size = 0
+            self._pid = os.getpid()
+
+    def acquire(self):
+        """Havuzdan bir bağlantı alır, gerekirse yenisini açar ya da bekler"""
+        started = time.perf_counter()
+        with self._cond:
+            self._reset_after_fork()
+            while True:
+                while self._idle:
+                    raw = self._idle.pop()
+                    if not self._is_broken(raw):
+                        break
+                    self._size -= 1
+                else:
+                    raw = None
+
+                if raw is not None:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'{self.max_size} bağlantının hepsi kullanımda')
+                self._cond.wait(remaining)
+
+            self.checkouts += 1
+            self.wait_time += time.perf_counter() - started
+
+        stats = current_stats()
+        if stats is not None:
+            stats.checkouts += 1
+
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self.connects += 1
+            if stats is not None:
+                stats.connects += 1
+        return Connection(raw, self)
+
+    def release(self, conn):
+        """Bağlantıyı havuza iade eder; yarım kalan transaction geri alınır"""
+        raw = conn.raw
+        if raw is None:
+            return
+        conn.raw = None
+        try:
+            raw.rollback()
+            broken = self._is_broken(raw)
+        except Exception:
+            broken = True
+
+        with self._cond:
+            if broken or self._pid != os.getpid():
+                self._size -= 1
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+            else:
+                self._idle.append(raw)
+            self._cond.notify()
+
+    def stats(self):
+        """Havuz metriklerini döndürür"""
+        with self._cond:
+            return {
+                'dialect': self.dialect,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'wait_time_total': self.wait_time,
+                'wait_time_avg': self.wait_time / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+def parse_shards(value):
+    """DATABASE_SHARDS değerini {ad: url} sözlüğüne çevirir"""
+    result = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        name, sep, url = part.partition('=')
+        name = name.strip()
+        if not sep or not name or not url.strip():
+            raise ValueError(f"DATABASE_SHARDS girdisi 'ad=url' biçiminde olmalı: {part}")
+        if name == DEFAULT_SHARD or name in result:
+            raise ValueError(f'Shard adı tekrar kullanılamaz: {name}')
+        result[name] = url.strip()
+    return result
+
+
+pool = ConnectionPool(os.getenv('DATABASE_URL'))
+# Shard adı -> havuz; gruplar bu veritabanlarına dağıtılır (tenants.py)
+shards = {DEFAULT_SHARD: pool}
+shards.update((name, ConnectionPool(url, name=name)) for name, url in parse_shards(DATABASE_SHARDS).items())
+
+# İçinde bulunulan isteğin (veya işin) shard'ı; tenants.use() ile ayarlanır
+_shard = contextvars.ContextVar('db_shard', default=DEFAULT_SHARD)
+
+
+def current_shard():
+    return _shard.get()
+
+
+def shard_names():
+    """Varsayılan shard başta olmak üzere tüm shard adları"""
+    return list(shards)
+
+
+def pool_for(shard=None):
+    """Shard'ın bağlantı havuzu (varsayılan: içinde bulunulan shard)"""
+    name = shard or current_shard()
+    try:
+        return shards[name]
+    except KeyError:
+        raise ValueError(f'Bilinmeyen shard: {name}')
+
+
+@contextmanager
+def use_shard(shard):
+    """Bu bağlam içindeki get_db()/connection() çağrıları verilen shard'a gider"""
+    pool_for(shard)
+    token = _shard.set(shard)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+class Replica:
+    """Okuma replikası: bağlantı havuzu ve periyodik sağlık/gecikme kontrolü"""
+
+    # Replay edilecek WAL yoksa gecikme 0; yoksa son uygulanan transaction'ın yaşı
+    PG_LAG_SQL = '''
+        SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+    '''
+
+    def __init__(self, database_url=None, max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_CHECK_INTERVAL):
+        self.pool = ConnectionPool(database_url, readonly=True) if database_url else None
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = None
+        # Metrikler
+        self.lag = None
+        self.checks = 0
+        self.failures = 0
+        self.reads = 0
+
+    def _check(self):
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            if conn.is_postgres:
+                cursor.execute(self.PG_LAG_SQL)
+            else:
+                # Şeması olmayan (boş ya da eksik kopyalanmış) SQLite dosyası sağlıklı sayılmasın
+                cursor.execute('SELECT 0 FROM schema_version LIMIT 1')
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        return float(row[0] or 0) if row else 0.0
+
+    def healthy(self):
+        """Replika kullanılabilir mi; sonuç check_interval boyunca tekrar kullanılır"""
+        if self.pool is None:
+            return False
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return self._healthy
+        # Kontrolü tek thread yapar, diğerleri son bilinen durumla devam eder
+        if not self._lock.acquire(blocking=False):
+            return self._healthy
+        try:
+            self.checks += 1
+            try:
+                self.lag = self._check()
+                healthy = self.lag <= self.max_lag
+                if not healthy:
+                    print(f"Replica lag {self.lag:.1f}s exceeds {self.max_lag:.1f}s, reading from primary")
+            except Exception as e:
+                self.failures += 1
+                self.lag = None
+                healthy = False
+                print(f"Replica health check failed, reading from primary: {e}")
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+            return healthy
+        finally:
+            self._lock.release()
+
+    def mark_failed(self, exc):
+        """Replika bağlantısı/sorgusu hata verdi: bir sonraki kontrole kadar ana veritabanı kullanılır"""
+        with self._lock:
+            self.failures += 1
+            self._healthy = False
+            self._checked_at = time.monotonic()
+        print(f"Replica error, reading from primary: {exc}")
+
+    def stats(self):
+        return {
+            'configured': int(self.pool is not None),
+            'healthy': int(self._healthy),
+            'lag_seconds': self.lag if self.lag is not None else -1,
+            'checks': self.checks,
+            'failures': self.failures,
+            'reads': self.reads,
+        }
+
+
+replica = Replica(DATABASE_READ_URL)
+
+
+def copy_to_replica():
+    """SQLite ana veritabanını replika dosyasına kopyalar (yerel deneme); kopyalanan sayfa sayısı"""
+    if replica.pool is None:
+        raise ValueError('DATABASE_READ_URL ayarlanmamış')
+    if pool.dialect != 'sqlite' or replica.pool.dialect != 'sqlite':
+        raise ValueError('PostgreSQL replikasyonu veritabanı sunucusunda kurulur (streaming replication)')
+    source = sqlite3.connect(pool.params['path'], timeout=pool.timeout)
+    target = sqlite3.connect(replica.pool.params['path'], timeout=pool.timeout)
+    try:
+        # Online backup: kopya tutarlı bir snapshot, ana veritabanı kilitlenmez
+        source.backup(target)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+
+def is_postgres():
+    """Ana veritabanı PostgreSQL mi"""
+    return pool.dialect == 'postgres'
+
+
+def get_db_connection():
+    """Havuzdan bir bağlantı alır; işi bitince close() ile iade edilmelidir"""
+    return pool_for().acquire()
+
+
+@contextmanager
+def connection(shard=None):
+    """İstek dışı kullanım için (CLI, başlangıç işleri) havuz bağlantısı; shard verilmezse içinde bulunulan"""
+    conn = pool_for(shard).acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def use_replica(shard=None):
+    """Okumalar replikaya gidebilir mi: replika tanımlı ve sağlıklı, istemci yakın zamanda yazmamış
+
+    Replika sadece varsayılan shard'ın kopyasıdır; diğer shard'lar her zaman kendi veritabanından okur.
+    """
+    if replica.pool is None or (shard or current_shard()) != DEFAULT_SHARD:
+        return False
+    if has_app_context() and g.get('read_primary'):
+        return False
+    return replica.healthy()
+
+
+def note_replica_read():
+    """İstekte replikadan okunduğunu işaretler (sayfa cache'i gecikmiş veriyi saklamasın)"""
+    replica.reads += 1
+    if has_app_context():
+        g.db_replica_read = True
+
+
+def _acquire_read(shard=None, allow_replica=True):
+    if allow_replica and use_replica(shard):
+        try:
+            conn = replica.pool.acquire()
+            note_replica_read()
+            return conn
+        except PoolTimeout:
+            pass
+        except Exception as e:
+            replica.mark_failed(e)
+    return pool_for(shard).acquire()
+
+
+@contextmanager
+def read_connection(shard=None, allow_replica=True):
+    """Sadece okuyan iş için bağlantı: uygunsa replikadan, değilse shard'ın ana veritabanından
+
+    allow_replica=False ana veritabanını zorlar (istek bağlamı dışında önceden verilmiş karar için).
+    """
+    conn = _acquire_read(shard, allow_replica)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_db():
+    """İstek boyunca tekrar kullanılan bağlantıyı döndürür (isteğin grubunun shard'ından)"""
+    if not has_app_context():
+        raise RuntimeError('get_db() sadece uygulama bağlamında kullanılabilir')
+    target = pool_for()
+    conn = g.get('db_conn')
+    if conn is not None and conn.pool is not target:
+        # Bağlam içinde shard değişti (CLI'da shard'lar üzerinde dolaşma): eski bağlantı iade edilir
+        g.pop('db_conn').close()
+        conn = None
+    if conn is None:
+        conn = g.db_conn = target.acquire()
+    return conn
+
+
+def get_read_db():
+    """Sadece okuyan sorgular için istek bağlantısı; replika yoksa ya da uygun değilse get_db()"""
+    if not has_app_context():
+        raise RuntimeError('get_read_db() sadece uygulama bağlamında kullanılabilir')
+    if 'db_read_conn' in g:
+        return g.db_read_conn
+    if not use_replica():
+        return get_db()
+    try:
+        g.db_read_conn = replica.pool.acquire()
+    except PoolTimeout:
+        # Replika havuzu dolu: bu istek ana veritabanından okur, replika sağlıklı sayılmaya devam eder
+        return get_db()
+    except Exception as e:
+        replica.mark_failed(e)
+        return get_db()
+    note_replica_read()
+    return g.db_read_conn
+
+
+def close_db(exc=None):
+    """İstek sonunda bağlantıları havuza iade eder"""
+    for name in ('db_conn', 'db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.close()
+
+
+def _route_reads():
+    # Son yazmasının üzerinden READ_YOUR_WRITES_SECONDS geçmemiş istemci ana veritabanından okur.
+    # İmzasız çerez yeterli: sahte değer en fazla okumaları ana veritabanına yönlendirir
+    try:
+        wrote_at = float(request.cookies.get(WRITE_COOKIE, 0))
+    except ValueError:
+        wrote_at = 0
+    g.read_primary = time.time() - wrote_at < READ_YOUR_WRITES_SECONDS
+
+
+def _remember_write(response):
+    if g.get('db_wrote'):
+        response.set_cookie(WRITE_COOKIE, f'{time.time():.3f}', max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def init_app(app):
+    """Flask uygulamasına teardown ve (replika tanımlıysa) okuma yönlendirme kancalarını bağlar"""
+    app.teardown_appcontext(close_db)
+    if replica.pool is not None:
+        app.before_request(_route_reads)
+        app.after_request(_remember_write)
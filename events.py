@@ -0,0 +1,389 @@
+"""Canlı güncellemeler - process içi pub/sub, worker'lar arası backend ve SSE kodlaması
+
+Her olay bir gruba aittir; aboneler sadece kendi gruplarının olaylarını alır.
+"""
+import asyncio
+import itertools
+import json
+import os
+import select
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import db
+import tenants
+
+EVENTS_BACKEND_URL = os.getenv('EVENTS_BACKEND_URL')
+EVENTS_COALESCE_INTERVAL = float(os.getenv('EVENTS_COALESCE_INTERVAL', '0.25'))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '200'))
+# WSGI'da (gthread) her SSE bağlantısı bir istek thread'ini tutar; thread'lerin yarısı normal isteklere kalır.
+# ASGI'daki (asgi.py) bağlantılar thread tutmaz, onlara sadece EVENTS_MAX_SUBSCRIBERS uygulanır
+EVENTS_MAX_THREAD_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_THREAD_SUBSCRIBERS', str(max(1, db.WEB_THREADS // 2))))
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '0.2'))
+
+NOTIFY_CHANNEL = 'kufur_events'
+NOTIFY_MAX_BYTES = 7900  # PostgreSQL NOTIFY payload sınırı 8000 bayt
+
+# Yavaş istemci kuyruğu taştığında gönderilir: istemci tüm listeyi yeniden çeker
+RESYNC_CHUNK = b'event: resync\ndata: {}\n\n'
+HEARTBEAT_CHUNK = b': ping\n\n'
+
+
+class TooManySubscribers(Exception):
+    """Açık SSE bağlantısı sınırına ulaşıldı"""
+
+
+def encode(message):
+    """Mesajı SSE biçimine çevirir"""
+    data = json.dumps(message['data'], ensure_ascii=False, default=str)
+    return f"event: {message['type']}\ndata: {data}\n\n".encode('utf-8')
+
+
+class Subscriber:
+    """Tek SSE bağlantısının sınırlı kuyruğu"""
+
+    def __init__(self, max_pending=EVENTS_QUEUE_SIZE, tenant_key=tenants.DEFAULT.key, holds_thread=False):
+        self.max_pending = max_pending
+        self.tenant_key = tenant_key
+        self.holds_thread = holds_thread
+        self._chunks = deque()
+        self._cond = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+        self.dropped = 0
+        self.waker = None  # Async akışta event loop'u uyandıran callback
+
+    def push(self, chunk):
+        with self._cond:
+            if self.overflowed:
+                return
+            if len(self._chunks) >= self.max_pending:
+                # Yetişemeyen istemci için biriktirmeye devam etmek yerine
+                # kuyruğu boşalt ve bir kez resync gönder
+                self.dropped += len(self._chunks)
+                self._chunks.clear()
+                self.overflowed = True
+            else:
+                self._chunks.append(chunk)
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+    def next(self, timeout):
+        """Bekleyen tüm parçaları tek yazımda döndürür; zaman aşımında None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._chunks or self.overflowed or self.closed, timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return RESYNC_CHUNK
+            if self._chunks:
+                chunk = b''.join(self._chunks)
+                self._chunks.clear()
+                return chunk
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+
+class LocalBackend:
+    """Sadece bu process içinde yayın - tek worker veya geliştirme için"""
+
+    def send(self, message):
+        pass
+
+    def listen(self, callback):
+        pass
+
+
+class SqliteBackend:
+    """Aynı makinedeki worker'lar için SQLite dosyası üzerinden olay tablosu (LISTEN/NOTIFY yerine)"""
+
+    RETENTION = 60  # saniye
+
+    def __init__(self, path, poll_interval=EVENTS_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._sends = itertools.count()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS olaylar (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def send(self, message):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('INSERT INTO olaylar (payload, created_at) VALUES (?, ?)',
+                     (json.dumps(message, default=str), now))
+        if next(self._sends) % 100 == 0:
+            conn.execute('DELETE FROM olaylar WHERE created_at < ?', (now - self.RETENTION,))
+
+    def listen(self, callback):
+        threading.Thread(target=self._poll, args=(callback,), name='events-poll', daemon=True).start()
+
+    def _poll(self, callback):
+        conn = self._conn()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM olaylar').fetchone()[0]
+        while True:
+            try:
+                rows = conn.execute('SELECT id, payload FROM olaylar WHERE id > ? ORDER BY id',
+                                    (last_id,)).fetchall()
+                for row_id, payload in rows:
+                    last_id = row_id
+                    callback(json.loads(payload))
+            except Exception as e:
+                print(f"Error polling events: {e}")
+            time.sleep(self.poll_interval)
+
+
+class PostgresBackend:
+    """PostgreSQL LISTEN/NOTIFY ile worker'lar ve makineler arası yayın"""
+
+    def __init__(self, database_url, channel=NOTIFY_CHANNEL):
+        self.database_url = database_url
+        self.channel = channel
+        self._send_conn = None
+        self._send_lock = threading.Lock()
+        self._pid = None
+
+    def _connect(self):
+        _, params = db.parse_database_url(self.database_url)
+        conn = db.psycopg2.connect(**params)
+        conn.autocommit = True
+        return conn
+
+    def send(self, message):
+        payload = json.dumps(message, default=str)
+        if len(payload.encode('utf-8')) > NOTIFY_MAX_BYTES:
+            # Sığmayan mesaj yerine dinleyenlere yeniden yükleme söylenir
+            payload = json.dumps({'type': 'resync', 'data': {}, 'key': 'resync',
+                                  'tenant': message.get('tenant'), 'origin': message.get('origin')})
+        with self._send_lock:
+            if self._send_conn is None or self._send_conn.closed or self._pid != os.getpid():
+                self._send_conn = self._connect()
+                self._pid = os.getpid()
+            try:
+                with self._send_conn.cursor() as cursor:
+                    cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+            except Exception:
+                self._send_conn = None
+                raise
+
+    def listen(self, callback):
+        threading.Thread(target=self._listen, args=(callback,), name='events-listen', daemon=True).start()
+
+    def _listen(self, callback):
+        while True:
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        callback(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"Error listening for events: {e}")
+                time.sleep(1)
+
+
+def create_backend(url=None):
+    """URL'e göre backend: boş/memory:// (process içi), sqlite:///dosya.db veya postgres://..."""
+    if not url or url.startswith('memory://'):
+        return LocalBackend()
+    if url.startswith('sqlite:///'):
+        return SqliteBackend(url[len('sqlite:///'):])
+    if url.startswith(('postgres://', 'postgresql://')):
+        if not db.PSYCOPG2_AVAILABLE:
+            raise RuntimeError('psycopg2 paketi yüklü değil')
+        return PostgresBackend(url)
+    raise ValueError(f'Desteklenmeyen EVENTS_BACKEND_URL: {url}')
+
+
+class EventBroker:
+    """Olayları kısa bir pencerede biriktirip birleştirir, bir kez kodlar ve tüm
+    abonelerin kuyruğuna aynı parçayı ekler"""
+
+    def __init__(self, backend=None, coalesce_interval=EVENTS_COALESCE_INTERVAL,
+                 queue_size=EVENTS_QUEUE_SIZE, max_subscribers=EVENTS_MAX_SUBSCRIBERS,
+                 max_thread_subscribers=EVENTS_MAX_THREAD_SUBSCRIBERS):
+        self.backend = backend or LocalBackend()
+        self.coalesce_interval = coalesce_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.max_thread_subscribers = max_thread_subscribers
+        self._pending = OrderedDict()
+        self._subscribers = set()
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._origin = None
+        self._pid = None
+        # Metrikler
+        self.published = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.remote = 0
+        self.errors = 0
+
+    def _start(self):
+        """Dağıtım thread'ini ve backend dinleyicisini process başına bir kez başlatır"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._origin = uuid.uuid4().hex
+        self._pending = OrderedDict()
+        self._subscribers = set()
+        threading.Thread(target=self._run, name='events-dispatch', daemon=True).start()
+        self.backend.listen(self._receive)
+
+    def publish(self, event_type, data, key=None, tenant_key=None):
+        """Olayı grubun (varsayılan: içinde bulunulan grup) abonelerine yayınlar; aynı anahtarlı olaylar
+        pencere içinde en sonuncusuna indirgenir"""
+        with self._cond:
+            self._start()
+            origin = self._origin
+        message = {'type': event_type, 'data': data, 'key': key, 'origin': origin,
+                   'tenant': tenant_key or tenants.current().key}
+        self._enqueue(message)
+        try:
+            self.backend.send(message)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error publishing event: {e}")
+
+    def _receive(self, message):
+        """Backend'den gelen olay; bu process'in kendi olayları zaten kuyrukta"""
+        if message.get('origin') == self._origin:
+            return
+        self.remote += 1
+        self._enqueue(message)
+
+    def _enqueue(self, message):
+        with self._cond:
+            # Grubu olmayan mesajlar (eski sürümden gelen) varsayılan gruba
+            key = (message.get('tenant') or tenants.DEFAULT.key, message.get('key') or ('_', next(self._seq)))
+            if key in self._pending:
+                self.coalesced += 1
+                del self._pending[key]
+            self._pending[key] = message
+            self.published += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            # Patlamaları tek pakette toplamak için kısa bekle
+            time.sleep(self.coalesce_interval)
+            with self._cond:
+                batch, self._pending = self._pending, OrderedDict()
+                subscribers = list(self._subscribers)
+            by_tenant = {}
+            for (tenant_key, _), message in batch.items():
+                by_tenant.setdefault(tenant_key, []).append(message)
+            # Grup başına bir kez kodlanır, grubun tüm abonelerine aynı parça
+            chunks = {}
+            for tenant_key, messages in by_tenant.items():
+                if any(message['type'] == 'resync' for message in messages):
+                    chunks[tenant_key] = RESYNC_CHUNK
+                else:
+                    chunks[tenant_key] = b''.join(encode(message) for message in messages)
+            for subscriber in subscribers:
+                chunk = chunks.get(subscriber.tenant_key)
+                if chunk is not None:
+                    subscriber.push(chunk)
+            self.batches += 1
+
+    def subscribe(self, tenant_key=None, holds_thread=False):
+        """Grubun (varsayılan: içinde bulunulan grup) olaylarına abone olur; holds_thread: stream() ile
+        bir istek thread'inde okunacak (thread tutan aboneler ayrıca sınırlanır)"""
+        with self._cond:
+            self._start()
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            if holds_thread and self._thread_subscribers() >= self.max_thread_subscribers:
+                raise TooManySubscribers()
+            subscriber = Subscriber(self.queue_size, tenant_key or tenants.current().key, holds_thread)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def _thread_subscribers(self):
+        return sum(1 for subscriber in self._subscribers if subscriber.holds_thread)
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._cond:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber, heartbeat=EVENTS_HEARTBEAT):
+        """SSE cevap gövdesi; bağlantı kapanınca abonelik silinir"""
+        try:
+            yield b'retry: 3000\n\n'
+            while not subscriber.closed:
+                yield subscriber.next(heartbeat) or HEARTBEAT_CHUNK
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def astream(self, subscriber, heartbeat=EVENTS_HEARTBEAT):
+        """stream()'in async hali: bağlantı başına thread yerine event loop'ta bekler (asgi.py)"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        subscriber.waker = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            yield b'retry: 3000\n\n'
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(ready.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                yield subscriber.next(0) or HEARTBEAT_CHUNK
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'backend': type(self.backend).__name__,
+                'subscribers': len(self._subscribers),
+                'thread_subscribers': self._thread_subscribers(),
+                'pending': len(self._pending),
+                'published': self.published,
+                'coalesced': self.coalesced,
+                'batches': self.batches,
+                'remote': self.remote,
+                'errors': self.errors,
+                'dropped': sum(subscriber.dropped for subscriber in self._subscribers),
+            }
+
+
+broker = EventBroker(create_backend(EVENTS_BACKEND_URL))
+
+
+def publish(event_type, data, key=None, tenant_key=None):
+    broker.publish(event_type, data, key, tenant_key)
@@ -0,0 +1,266 @@
+"""kufur_gecmisi için write-behind tamponu - olaylar toplu halde yazılır"""
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import db
+import pagecache
+import tenants
+
+# Journal dosyasını diğer worker'lardan korumak için fcntl (sadece Unix)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# PostgreSQL'de toplu insert için execute_values
+try:
+    from psycopg2.extras import execute_values
+    EXECUTE_VALUES_AVAILABLE = True
+except ImportError:
+    EXECUTE_VALUES_AVAILABLE = False
+
+HISTORY_WRITE_MODE = os.getenv('HISTORY_WRITE_MODE', 'sync')  # sync | buffered
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', '100'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '2'))
+HISTORY_JOURNAL_DIR = os.getenv('HISTORY_JOURNAL_DIR')
+
+INSERT_SQL = '''
+    INSERT INTO kufur_gecmisi (grup_id, kullanici_id, tarih, ip_adresi, olay_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+'''
+# Tampondan/journal'dan yazarken: bu arada silinmiş kullanıcının olayı atlanır (foreign key tüm partiyi düşürmesin)
+FLUSH_INSERT_SQL = '''
+    INSERT INTO kufur_gecmisi (grup_id, kullanici_id, tarih, ip_adresi, olay_id)
+    SELECT ?, ?, ?, ?, ?
+    WHERE EXISTS (SELECT 1 FROM kullanicilar WHERE id = ?)
+    ON CONFLICT DO NOTHING
+'''
+
+
+def new_event(grup_id, kullanici_id, ip_adresi):
+    """Geçmişe yazılacak olayı (grup_id, kullanici_id, tarih, ip_adresi, olay_id) oluşturur"""
+    # Sütun varsayılanı CURRENT_TIMESTAMP ile aynı biçim (UTC)
+    tarih = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    return (grup_id, kullanici_id, tarih, ip_adresi, uuid.uuid4().hex)
+
+
+def write_events(conn, events):
+    """Olayları tek transaction'da toplu yazar; olay_id sayesinde tekrar yazım zararsız
+
+    Çakışma hedefi verilmez: bölümlü tabloda benzersiz indeks (olay_id, tarih) üzerindedir.
+    Kullanıcısı artık olmayan olaylar yazılmaz.
+    """
+    if not events:
+        return
+    try:
+        if conn.is_postgres and EXECUTE_VALUES_AVAILABLE:
+            with conn.raw.cursor() as raw_cursor:
+                execute_values(raw_cursor, '''
+                    INSERT INTO kufur_gecmisi (grup_id, kullanici_id, tarih, ip_adresi, olay_id)
+                    SELECT v.grup_id, v.kullanici_id, v.tarih::timestamp, v.ip_adresi, v.olay_id
+                    FROM (VALUES %s) AS v (grup_id, kullanici_id, tarih, ip_adresi, olay_id)
+                    WHERE EXISTS (SELECT 1 FROM kullanicilar k WHERE k.id = v.kullanici_id)
+                    ON CONFLICT DO NOTHING
+                ''', events, page_size=1000)
+        else:
+            conn.cursor().executemany(FLUSH_INSERT_SQL, [(*event, event[1]) for event in events])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def write_by_shard(items):
+    """[(shard, olay), ...] listesini shard başına bir transaction'da yazar; olayların grup anahtarları"""
+    by_shard = {}
+    for shard, event in items:
+        by_shard.setdefault(shard, []).append(event)
+    for shard, events in by_shard.items():
+        with db.connection(shard) as conn:
+            write_events(conn, events)
+    return {tenants.tenant_key(shard, event[0]) for shard, event in items}
+
+
+def _journal_item(item):
+    """Journal satırı -> (shard, olay); grupsuz eski satırlar varsayılan gruba yazılır"""
+    if item and isinstance(item[0], str):
+        return item[0], tuple(item[1])
+    return db.DEFAULT_SHARD, (tenants.DEFAULT_ID, *item)
+
+
+class HistoryBuffer:
+    """Olayları bellekte (ve istenirse journal dosyasında) biriktirip toplu yazar; her olay kendi shard'ına"""
+
+    def __init__(self, flush_size=HISTORY_FLUSH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 journal_dir=HISTORY_JOURNAL_DIR):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.journal_dir = journal_dir
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._journal = None
+        self._pid = None
+        # Metrikler
+        self.flushed = 0
+        self.flushes = 0
+        self.errors = 0
+
+    def _start(self):
+        """Flush thread'ini ve journal'ı process başına bir kez başlatır"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending = []
+        if self.journal_dir:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            path = os.path.join(self.journal_dir, f'{self._pid}.ndjson')
+            while True:
+                self._journal = open(path, 'a+', encoding='utf-8')
+                if not FCNTL_AVAILABLE:
+                    break
+                fcntl.flock(self._journal, fcntl.LOCK_EX)
+                # Kilit beklenirken dosya replay edilip silindiyse yeniden aç
+                if os.fstat(self._journal.fileno()).st_nlink:
+                    break
+                self._journal.close()
+        self._thread = threading.Thread(target=self._run, name='history-flush', daemon=True)
+        self._thread.start()
+
+    def add(self, event, shard=None):
+        """Olayı kuyruğa ekler (varsayılan: içinde bulunulan shard); journal varsa önce dosyaya yazar"""
+        item = (shard or db.current_shard(), event)
+        with self._cond:
+            self._start()
+            if self._journal is not None:
+                self._journal.write(json.dumps(item) + '\n')
+                self._journal.flush()
+            self._pending.append(item)
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.flush_size,
+                                    timeout=self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing history buffer: {e}")
+
+    def flush(self):
+        """Bekleyen olayları veritabanına yazar ve journal'ı kısaltır"""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._pending
+                self._pending = []
+            if not batch:
+                return 0
+            try:
+                # Bir shard yazılamazsa hepsi sıraya döner; olay_id sayesinde tekrar yazılanlar atlanır
+                for key in write_by_shard(batch):
+                    # Saatlik trend ham geçmişten okunuyor; grubun sayfa cache'i yenilensin
+                    pagecache.bump(tenant_key=key)
+            except Exception:
+                # Yazılamayanlar sıraya geri döner, bir sonraki flush'ta denenir
+                with self._cond:
+                    self._pending = batch + self._pending
+                    self.errors += 1
+                raise
+
+            with self._cond:
+                self.flushed += len(batch)
+                self.flushes += 1
+                self._rewrite_journal()
+            return len(batch)
+
+    def _rewrite_journal(self):
+        # Journal'da sadece henüz yazılmamış olaylar kalır; _cond tutulurken çağrılır
+        if self._journal is None:
+            return
+        self._journal.seek(0)
+        self._journal.truncate()
+        for item in self._pending:
+            self._journal.write(json.dumps(item) + '\n')
+        self._journal.flush()
+
+    def discard(self, grup_id, kullanici_id, shard=None):
+        """Silinecek kullanıcının bekleyen olaylarını atar; süren flush'ın bitmesini bekler. Atılan olay sayısı"""
+        shard = shard or db.current_shard()
+        with self._flush_lock:
+            with self._cond:
+                kept = [item for item in self._pending
+                        if not (item[0] == shard and item[1][0] == grup_id and item[1][1] == kullanici_id)]
+                dropped = len(self._pending) - len(kept)
+                if dropped:
+                    self._pending = kept
+                    self._rewrite_journal()
+            return dropped
+
+    def stats(self):
+        with self._cond:
+            return {
+                'mode': HISTORY_WRITE_MODE,
+                'pending': len(self._pending),
+                'flushed': self.flushed,
+                'flushes': self.flushes,
+                'errors': self.errors,
+            }
+
+
+def replay_journals(journal_dir=HISTORY_JOURNAL_DIR):
+    """Çökmüş worker'lardan kalan journal dosyalarını veritabanına yazar"""
+    if not journal_dir or not os.path.isdir(journal_dir):
+        return 0
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(journal_dir, '*.ndjson'))):
+        with open(path, 'r+', encoding='utf-8') as journal:
+            if FCNTL_AVAILABLE:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Dosya çalışan bir worker'a ait
+            elif path.endswith(f'{os.getpid()}.ndjson'):
+                continue
+            items = [_journal_item(json.loads(line)) for line in journal if line.strip()]
+            write_by_shard(items)
+            replayed += len(items)
+        os.remove(path)
+    return replayed
+
+
+buffer = HistoryBuffer()
+
+
+def record(conn, grup_id, kullanici_id, ip_adresi, count=1):
+    """Küfür olaylarını kaydeder: sync modda mevcut transaction'a, buffered modda tampona"""
+    events = [new_event(grup_id, kullanici_id, ip_adresi) for _ in range(count)]
+    if HISTORY_WRITE_MODE == 'buffered':
+        return events
+    conn.cursor().executemany(INSERT_SQL, events)
+    return []
+
+
+def enqueue(events):
+    """Commit sonrası buffered olayları (içinde bulunulan shard'a yazılmak üzere) tampona ekler"""
+    for event in events:
+        buffer.add(event)
+
+
+def _flush_on_exit():
+    try:
+        buffer.flush()
+    except Exception as e:
+        print(f"Error flushing history buffer on exit: {e}")
+
+
+atexit.register(_flush_on_exit)
@@ -0,0 +1,52 @@
+"""Seviye tablosu ve XP -> seviye hesapları"""
+from bisect import bisect_right
+from types import MappingProxyType
+
+# Salt okunur: sonuçlar kullanıcılar arasında paylaşılır (profiles.memo), değiştirilemez
+LEVELS = tuple(MappingProxyType(level_info) for level_info in (
+    {"level": 1, "name": "Masum", "icon": "😇", "min_xp": 0, "max_xp": 100},
+    {"level": 2, "name": "Acemi", "icon": "🌱", "min_xp": 100, "max_xp": 250},
+    {"level": 3, "name": "Orta", "icon": "🎯", "min_xp": 250, "max_xp": 500},
+    {"level": 4, "name": "Usta", "icon": "⚔️", "min_xp": 500, "max_xp": 1000},
+    {"level": 5, "name": "Efsane", "icon": "🔥", "min_xp": 1000, "max_xp": 999999},
+))
+
+
+# Seviye alt sınırları (bisect ile arama için)
+MIN_XPS = tuple(level_info["min_xp"] for level_info in LEVELS)
+MAX_XP = LEVELS[-1]["max_xp"]
+
+
+def level_index(xp):
+    """XP'nin düştüğü seviyenin LEVELS içindeki sırası; tablo dışındaysa -1"""
+    if xp >= MAX_XP:
+        return -1
+    return bisect_right(MIN_XPS, xp) - 1
+
+
+def level_info_at(index, xp):
+    """level_index sonucundan seviye bilgisini (ilerleme yüzdesiyle) üretir; salt okunur"""
+    if index < 0:
+        return LEVELS[-1]  # Max level
+    level_info = LEVELS[index]
+    progress = ((xp - level_info["min_xp"]) / (level_info["max_xp"] - level_info["min_xp"])) * 100
+    return MappingProxyType({**level_info, "progress": min(progress, 100)})
+
+
+def get_level_info(xp):
+    """XP'ye göre seviye bilgilerini döndürür"""
+    return level_info_at(level_index(xp), xp)
+
+
+def level_case_sql(xp_expr):
+    """Verilen XP ifadesinden seviyeyi hesaplayan SQL CASE ifadesi"""
+    whens = ' '.join(f'WHEN {xp_expr} >= {info["min_xp"]} THEN {info["level"]}'
+                     for info in reversed(LEVELS[1:]))
+    return f'CASE {whens} ELSE {LEVELS[0]["level"]} END'
+
+
+def xp_assignments(xp_change):
+    """xp ve level kolonlarını eski değer üzerinden güncelleyen SET parçası (XP sıfırın altına inmez)"""
+    new_xp = f'(xp + {int(xp_change)})'
+    return (f'xp = CASE WHEN {new_xp} < 0 THEN 0 ELSE {new_xp} END, '
+            f'level = {level_case_sql(new_xp)}')
@@ -0,0 +1,274 @@
+"""İstek metrikleri - Server-Timing başlığı, Prometheus /metrics ve opsiyonel profilleme"""
+import cProfile
+import hmac
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, g, request
+
+import admission
+import db
+import events
+import history
+import pagecache
+import profiles
+import retention
+from cache import leaderboards
+
+# HTML profil çıktısı için pyinstrument (opsiyonel) - yoksa cProfile
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '500'))
+PROFILE_ROUTES = {name.strip() for name in os.getenv('PROFILE_ROUTES', '').split(',') if name.strip()}
+PROFILER = os.getenv('PROFILER', 'cprofile')  # cprofile | pyinstrument
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# /metrics için erişim anahtarı; ayarlanmamışsa HTTP üzerinden metrikler kapalı
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class RequestMetrics:
+    """Endpoint bazında istek sayısı, gecikme histogramı ve veritabanı kullanımı (process başına)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}   # (endpoint, method, status) -> sayı
+        self._latency = {}    # endpoint -> [bucket sayıları..., toplam süre, sayı]
+        self._db = {}         # endpoint -> [sorgu, db süresi, checkout, yeni bağlantı]
+
+    def observe(self, endpoint, method, status, duration, stats):
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            latency = self._latency.setdefault(endpoint, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    latency[i] += 1
+            latency[-2] += duration
+            latency[-1] += 1
+
+            if stats is not None:
+                usage = self._db.setdefault(endpoint, [0, 0.0, 0, 0])
+                usage[0] += stats.queries
+                usage[1] += stats.db_time
+                usage[2] += stats.checkouts
+                usage[3] += stats.connects
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP kufur_http_requests_total HTTP istekleri',
+                      '# TYPE kufur_http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'kufur_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            lines += ['# HELP kufur_http_request_duration_seconds İstek süresi',
+                      '# TYPE kufur_http_request_duration_seconds histogram']
+            for endpoint, latency in sorted(self._latency.items()):
+                # Bucket sayıları observe'da zaten kümülatif (duration <= bound)
+                for bound, count in zip(self.buckets, latency):
+                    lines.append(f'kufur_http_request_duration_seconds_bucket'
+                                 f'{_labels(endpoint=endpoint, le=bound)} {count}')
+                lines.append(f'kufur_http_request_duration_seconds_bucket'
+                             f'{_labels(endpoint=endpoint, le="+Inf")} {latency[-1]}')
+                lines.append(f'kufur_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {latency[-2]:.6f}')
+                lines.append(f'kufur_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {latency[-1]}')
+
+            for i, (name, help_text) in enumerate((
+                    ('kufur_db_queries_total', 'İsteklerde çalışan sorgu sayısı'),
+                    ('kufur_db_query_seconds_total', 'İsteklerde veritabanında geçen süre'),
+                    ('kufur_db_checkouts_total', 'İsteklerde havuzdan alınan bağlantı'),
+                    ('kufur_db_connects_total', 'İsteklerde açılan yeni bağlantı'))):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, usage in sorted(self._db.items()):
+                    value = f'{usage[i]:.6f}' if isinstance(usage[i], float) else usage[i]
+                    lines.append(f'{name}{_labels(endpoint=endpoint)} {value}')
+        return lines
+
+
+requests = RequestMetrics()
+
+
+# Havuz metrikleri: (ad, açıklama, tip, stats anahtarı) - her shard'ın havuzu için ayrı satır
+POOL_METRICS = (
+    ('kufur_db_pool_size', 'Açık bağlantı', 'gauge', 'size'),
+    ('kufur_db_pool_in_use', 'Kullanımdaki bağlantı', 'gauge', 'in_use'),
+    ('kufur_db_pool_max_size', 'Havuz sınırı', 'gauge', 'max_size'),
+    ('kufur_db_pool_checkouts_total', 'Havuzdan alınan bağlantı', 'counter', 'checkouts'),
+    ('kufur_db_pool_connects_total', 'Açılan bağlantı', 'counter', 'connects'),
+    ('kufur_db_pool_timeouts_total', 'Bağlantı bekleme zaman aşımı', 'counter', 'timeouts'),
+    ('kufur_db_pool_wait_seconds_total', 'Bağlantı bekleme süresi', 'counter', 'wait_time_total'),
+)
+
+
+def _pool_lines(pid):
+    """Her shard havuzunun metrikleri (shard etiketiyle)"""
+    pools = {shard: pool.stats() for shard, pool in db.shards.items()}
+    lines = []
+    for name, help_text, kind, key in POOL_METRICS:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for shard, stats in sorted(pools.items()):
+            lines.append(f'{name}{_labels(pid=pid, shard=shard)} {stats[key]}')
+    return lines
+
+
+def _gauges():
+    """Cache, tampon ve süreç durumları: (ad, açıklama, tip, değer)"""
+    with db._totals_lock:
+        totals = (db.totals.queries, db.totals.db_time, db.totals.slow)
+    values = [
+        ('kufur_db_process_queries_total', 'Arka plan işleri dahil tüm sorgular', 'counter', totals[0]),
+        ('kufur_db_process_query_seconds_total', 'Arka plan işleri dahil sorgu süresi', 'counter', totals[1]),
+        ('kufur_db_slow_queries_total', 'SLOW_QUERY_MS üstü sorgular', 'counter', totals[2]),
+        ('kufur_db_shards', 'Grupların dağıtıldığı veritabanı', 'gauge', len(db.shards)),
+    ]
+    for prefix, stats in (('leaderboard_cache', leaderboards.stats()),
+                          ('page_cache', pagecache.pages.stats()),
+                          ('profile_memo', profiles.memo.stats()),
+                          ('history_buffer', history.buffer.stats()),
+                          ('events', events.broker.stats()),
+                          ('retention', retention.job.stats()),
+                          ('replica', db.replica.stats()),
+                          ('admission', admission.gate.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append((f'kufur_{prefix}_{key}', f'{prefix} {key}', 'gauge', value))
+    return values
+
+
+def _authorized():
+    auth = request.headers.get('Authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.args.get('token', '')
+    return hmac.compare_digest(token.encode('utf-8'), METRICS_TOKEN.encode('utf-8'))
+
+
+def metrics_view():
+    """Prometheus metin biçiminde metrikler (worker başına; pid etiketi ile ayrışır)"""
+    if not METRICS_TOKEN:
+        return 'Metrikler kapalı (METRICS_TOKEN ayarlanmamış)', 404
+    if not _authorized():
+        return 'Yetkisiz', 401, {'WWW-Authenticate': 'Bearer'}
+    lines = requests.render() + _pool_lines(os.getpid())
+    pid = _labels(pid=os.getpid())
+    for name, help_text, kind, value in _gauges():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name}{pid} {value}']
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _header_text(value, limit=80):
+    """Başlıkta kullanılabilecek (latin-1, tırnaksız) kısa metin"""
+    return value[:limit].replace('"', "'").replace('\\', '/').encode('ascii', 'replace').decode('ascii')
+
+
+def server_timing(stats, total):
+    parts = [f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"',
+             f'conn;desc="{stats.checkouts} checkouts, {stats.connects} new"',
+             f'app;dur={total * 1000:.2f}']
+    if stats.slowest:
+        elapsed, query = stats.slowest[0]
+        parts.append(f'slowest;dur={elapsed * 1000:.2f};desc="{_header_text(query)}"')
+    return ', '.join(parts)
+
+
+_profile_lock = threading.Lock()
+_profile_seq = itertools.count()
+
+
+def _should_profile(endpoint):
+    return bool(PROFILE_ROUTES) and ('*' in PROFILE_ROUTES or endpoint in PROFILE_ROUTES)
+
+
+def _start_profiler():
+    # Aynı anda tek profil: profiler'lar thread'ler arasında çakışmasın
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    if PROFILER == 'pyinstrument' and PYINSTRUMENT_AVAILABLE:
+        profiler = PyinstrumentProfiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, endpoint, save=True):
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            extension = 'prof'
+        else:
+            profiler.stop()
+            extension = 'html'
+        if save:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = f'{endpoint}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(_profile_seq)}.{extension}'
+            path = os.path.join(PROFILE_DIR, name)
+            if extension == 'prof':
+                profiler.dump_stats(path)
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+            return path
+    finally:
+        _profile_lock.release()
+
+
+def init_app(app):
+    """İstek başına sorgu istatistiklerini, Server-Timing'i, /metrics'i ve profillemeyi bağlar"""
+    if PROFILER == 'pyinstrument' and not PYINSTRUMENT_AVAILABLE and PROFILE_ROUTES:
+        print("Warning: pyinstrument not available, profiling with cProfile")
+
+    @app.before_request
+    def _start_request():
+        g.query_stats = db.QueryStats()
+        g.request_started = time.perf_counter()
+        if _should_profile(request.endpoint):
+            g.profiler = _start_profiler()
+
+    @app.after_request
+    def _finish_request(response):
+        stats = g.get('query_stats')
+        started = g.get('request_started')
+        if stats is None or started is None:
+            return response
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile'] = _stop_profiler(profiler, request.endpoint)
+
+        total = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        response.headers['Server-Timing'] = server_timing(stats, total)
+        requests.observe(endpoint, request.method, response.status_code, total, stats)
+        if total * 1000 >= SLOW_REQUEST_MS:
+            slowest = '; '.join(f'{elapsed * 1000:.1f} ms {query[:120]}' for elapsed, query in stats.slowest)
+            print(f"Slow request {request.method} {request.path} ({total * 1000:.1f} ms, "
+                  f"{stats.queries} queries, {stats.connects} new connections): {slowest}")
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc=None):
+        # after_request çalışmadan biten isteklerde profiler açık kalmasın
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            _stop_profiler(profiler, request.endpoint, save=False)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
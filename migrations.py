@@ -0,0 +1,402 @@
+"""Sürümlü şema migration'ları - schema_version tablosu ile bir kez çalışır"""
+import db
+import roster
+
+# PostgreSQL advisory lock anahtarı (aynı anda açılan worker'lar sırayla migrate etsin)
+MIGRATION_LOCK_ID = 4242001
+
+# (sürüm, açıklama, {dialect: [SQL ya da cursor alan fonksiyon, ...]}) - sadece sona ekleme yapılır,
+# mevcutlar değiştirilmez
+MIGRATIONS = [
+    (1, 'ilk şema', {
+        'postgres': [
+            '''
+            CREATE TABLE IF NOT EXISTS kullanicilar (
+                id SERIAL PRIMARY KEY,
+                isim TEXT NOT NULL,
+                kufur_sayisi INTEGER DEFAULT 0,
+                toplam_para REAL DEFAULT 0,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                avatar TEXT DEFAULT '😊',
+                streak INTEGER DEFAULT 0,
+                last_activity DATE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS kufur_gecmisi (
+                id SERIAL PRIMARY KEY,
+                kullanici_id INTEGER REFERENCES kullanicilar(id),
+                tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ip_adresi TEXT
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS challenges (
+                id SERIAL PRIMARY KEY,
+                kullanici_id INTEGER REFERENCES kullanicilar(id),
+                challenge_type TEXT NOT NULL,
+                completed BOOLEAN DEFAULT FALSE,
+                date DATE DEFAULT CURRENT_DATE,
+                reward_xp INTEGER DEFAULT 0
+            )
+            ''',
+        ],
+        'sqlite': [
+            '''
+            CREATE TABLE IF NOT EXISTS kullanicilar (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                isim TEXT NOT NULL,
+                kufur_sayisi INTEGER DEFAULT 0,
+                toplam_para REAL DEFAULT 0,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                avatar TEXT DEFAULT '😊',
+                streak INTEGER DEFAULT 0,
+                last_activity DATE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS kufur_gecmisi (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kullanici_id INTEGER,
+                tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ip_adresi TEXT,
+                FOREIGN KEY (kullanici_id) REFERENCES kullanicilar (id)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS challenges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kullanici_id INTEGER,
+                challenge_type TEXT NOT NULL,
+                completed BOOLEAN DEFAULT FALSE,
+                date DATE DEFAULT CURRENT_DATE,
+                reward_xp INTEGER DEFAULT 0,
+                FOREIGN KEY (kullanici_id) REFERENCES kullanicilar (id)
+            )
+            ''',
+        ],
+    }),
+    (2, 'challenges tekillik indeksi', {
+        'postgres': [
+            '''
+            DELETE FROM challenges WHERE id NOT IN (
+                SELECT MIN(id) FROM challenges GROUP BY kullanici_id, challenge_type, date
+            )
+            ''',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_kullanici_tip_tarih
+            ON challenges (kullanici_id, challenge_type, date)
+            ''',
+        ],
+        'sqlite': [
+            '''
+            DELETE FROM challenges WHERE id NOT IN (
+                SELECT MIN(id) FROM challenges GROUP BY kullanici_id, challenge_type, date
+            )
+            ''',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_kullanici_tip_tarih
+            ON challenges (kullanici_id, challenge_type, date)
+            ''',
+        ],
+    }),
+    (3, 'kufur_gecmisi olay kimliği', {
+        'postgres': [
+            'ALTER TABLE kufur_gecmisi ADD COLUMN olay_id TEXT',
+            'CREATE UNIQUE INDEX IF NOT EXISTS ux_kufur_gecmisi_olay ON kufur_gecmisi (olay_id)',
+        ],
+        'sqlite': [
+            'ALTER TABLE kufur_gecmisi ADD COLUMN olay_id TEXT',
+            'CREATE UNIQUE INDEX IF NOT EXISTS ux_kufur_gecmisi_olay ON kufur_gecmisi (olay_id)',
+        ],
+    }),
+    (4, 'kufur_gunluk özet tablosu', {
+        'postgres': [
+            '''
+            CREATE TABLE IF NOT EXISTS kufur_gunluk (
+                kullanici_id INTEGER NOT NULL,
+                gun DATE NOT NULL,
+                sayi INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kullanici_id, gun)
+            )
+            ''',
+            '''
+            INSERT INTO kufur_gunluk (kullanici_id, gun, sayi)
+            SELECT kullanici_id, DATE(tarih), COUNT(*)
+            FROM kufur_gecmisi
+            WHERE kullanici_id IS NOT NULL
+            GROUP BY kullanici_id, DATE(tarih)
+            ''',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gunluk_gun ON kufur_gunluk (gun)',
+        ],
+        'sqlite': [
+            '''
+            CREATE TABLE IF NOT EXISTS kufur_gunluk (
+                kullanici_id INTEGER NOT NULL,
+                gun DATE NOT NULL,
+                sayi INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kullanici_id, gun)
+            )
+            ''',
+            '''
+            INSERT INTO kufur_gunluk (kullanici_id, gun, sayi)
+            SELECT kullanici_id, DATE(tarih), COUNT(*)
+            FROM kufur_gecmisi
+            WHERE kullanici_id IS NOT NULL
+            GROUP BY kullanici_id, DATE(tarih)
+            ''',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gunluk_gun ON kufur_gunluk (gun)',
+        ],
+    }),
+    (5, 'kufur_gecmisi tarih indeksleri', {
+        'postgres': [
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_tarih ON kufur_gecmisi (tarih)',
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_kullanici_tarih
+            ON kufur_gecmisi (kullanici_id, tarih)
+            ''',
+        ],
+        'sqlite': [
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_tarih ON kufur_gecmisi (tarih)',
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_kullanici_tarih
+            ON kufur_gecmisi (kullanici_id, tarih)
+            ''',
+        ],
+    }),
+    (6, 'kullanicilar keyset sayfalama indeksi', {
+        # ORDER BY xp DESC, kufur_sayisi DESC, id sırasıyla aynı
+        'postgres': [
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kullanicilar_xp_kufur_id
+            ON kullanicilar (xp DESC, kufur_sayisi DESC, id)
+            ''',
+        ],
+        'sqlite': [
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kullanicilar_xp_kufur_id
+            ON kullanicilar (xp DESC, kufur_sayisi DESC, id)
+            ''',
+        ],
+    }),
+    (7, 'kufur_gecmisi saklama durumu', {
+        # sinir: bu günden önceki ham olaylar günlük özete sıkıştırıldı (silinmiş olabilir)
+        'postgres': [
+            '''
+            CREATE TABLE IF NOT EXISTS gecmis_saklama (
+                id INTEGER PRIMARY KEY,
+                sinir DATE,
+                son_calisma TIMESTAMP
+            )
+            ''',
+            'INSERT INTO gecmis_saklama (id) VALUES (1) ON CONFLICT (id) DO NOTHING',
+        ],
+        'sqlite': [
+            '''
+            CREATE TABLE IF NOT EXISTS gecmis_saklama (
+                id INTEGER PRIMARY KEY,
+                sinir DATE,
+                son_calisma TIMESTAMP
+            )
+            ''',
+            'INSERT INTO gecmis_saklama (id) VALUES (1) ON CONFLICT (id) DO NOTHING',
+        ],
+    }),
+    (8, 'streak ve challenge kural motoru', {
+        'postgres': [
+            # Azaltmalar geçmişe yazılmaz; aktif günler kufur_gunluk ile birlikte buradan çıkar
+            '''
+            CREATE TABLE IF NOT EXISTS azaltma_gunluk (
+                kullanici_id INTEGER NOT NULL,
+                gun DATE NOT NULL,
+                sayi INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kullanici_id, gun)
+            )
+            ''',
+            # baslangic: kural motorunun başladığı gün (UTC), kapanan_gun: gün sonu işinin son kapattığı gün
+            '''
+            CREATE TABLE IF NOT EXISTS gun_sonu (
+                id INTEGER PRIMARY KEY,
+                baslangic DATE,
+                kapanan_gun DATE
+            )
+            ''',
+            "INSERT INTO gun_sonu (id, baslangic) VALUES (1, CAST(timezone('UTC', now()) AS DATE)) "
+            "ON CONFLICT (id) DO NOTHING",
+            # Günün ilk küfrü tek kişiye: eşzamanlı iki küfürden biri kazanır
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_ilk_kan ON challenges (date)
+            WHERE challenge_type = 'first_blood' AND completed
+            ''',
+        ],
+        'sqlite': [
+            '''
+            CREATE TABLE IF NOT EXISTS azaltma_gunluk (
+                kullanici_id INTEGER NOT NULL,
+                gun DATE NOT NULL,
+                sayi INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kullanici_id, gun)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS gun_sonu (
+                id INTEGER PRIMARY KEY,
+                baslangic DATE,
+                kapanan_gun DATE
+            )
+            ''',
+            'INSERT INTO gun_sonu (id, baslangic) VALUES (1, CURRENT_DATE) ON CONFLICT (id) DO NOTHING',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_ilk_kan ON challenges (date)
+            WHERE challenge_type = 'first_blood' AND completed
+            ''',
+        ],
+    }),
+    (9, 'gruplar ve grup bazlı indeksler', {
+        # Mevcut satırlar varsayılan gruba (1) düşer. gruplar dizini sadece varsayılan shard'da
+        # kullanılır; şema tüm shard'larda aynı kalsın diye her yerde oluşturulur.
+        # azaltma_gunluk'a grup eklenmez: sadece kullanıcı bazında okunur
+        'postgres': [
+            '''
+            CREATE TABLE IF NOT EXISTS gruplar (
+                id SERIAL PRIMARY KEY,
+                slug TEXT NOT NULL UNIQUE,
+                isim TEXT NOT NULL,
+                shard TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            "INSERT INTO gruplar (id, slug, isim, shard) VALUES (1, 'varsayilan', 'Varsayılan', 'varsayilan') "
+            "ON CONFLICT (id) DO NOTHING",
+            "SELECT setval(pg_get_serial_sequence('gruplar', 'id'), (SELECT MAX(id) FROM gruplar))",
+            'ALTER TABLE kullanicilar ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE kufur_gecmisi ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE kufur_gunluk ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE challenges ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'DROP INDEX IF EXISTS ix_kullanicilar_xp_kufur_id',
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kullanicilar_grup_xp_kufur_id
+            ON kullanicilar (grup_id, xp DESC, kufur_sayisi DESC, id)
+            ''',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_grup_tarih ON kufur_gecmisi (grup_id, tarih)',
+            'DROP INDEX IF EXISTS ix_kufur_gunluk_gun',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gunluk_grup_gun ON kufur_gunluk (grup_id, gun)',
+            'DROP INDEX IF EXISTS ux_challenges_ilk_kan',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_grup_ilk_kan ON challenges (grup_id, date)
+            WHERE challenge_type = 'first_blood' AND completed
+            ''',
+        ],
+        'sqlite': [
+            '''
+            CREATE TABLE IF NOT EXISTS gruplar (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                slug TEXT NOT NULL UNIQUE,
+                isim TEXT NOT NULL,
+                shard TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            "INSERT INTO gruplar (id, slug, isim, shard) VALUES (1, 'varsayilan', 'Varsayılan', 'varsayilan') "
+            "ON CONFLICT (id) DO NOTHING",
+            'ALTER TABLE kullanicilar ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE kufur_gecmisi ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE kufur_gunluk ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'ALTER TABLE challenges ADD COLUMN grup_id INTEGER NOT NULL DEFAULT 1',
+            'DROP INDEX IF EXISTS ix_kullanicilar_xp_kufur_id',
+            '''
+            CREATE INDEX IF NOT EXISTS ix_kullanicilar_grup_xp_kufur_id
+            ON kullanicilar (grup_id, xp DESC, kufur_sayisi DESC, id)
+            ''',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gecmisi_grup_tarih ON kufur_gecmisi (grup_id, tarih)',
+            'DROP INDEX IF EXISTS ix_kufur_gunluk_gun',
+            'CREATE INDEX IF NOT EXISTS ix_kufur_gunluk_grup_gun ON kufur_gunluk (grup_id, gun)',
+            'DROP INDEX IF EXISTS ux_challenges_ilk_kan',
+            '''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_challenges_grup_ilk_kan ON challenges (grup_id, date)
+            WHERE challenge_type = 'first_blood' AND completed
+            ''',
+        ],
+    }),
+    (10, 'isim arama sütunu', {
+        'postgres': [
+            'ALTER TABLE kullanicilar ADD COLUMN isim_arama TEXT',
+            lambda cursor: _fill_search_names(cursor),
+        ],
+        'sqlite': [
+            'ALTER TABLE kullanicilar ADD COLUMN isim_arama TEXT',
+            lambda cursor: _fill_search_names(cursor),
+        ],
+    }),
+]
+
+
+def _fill_search_names(cursor):
+    """Mevcut isimlerin arama biçimi; normalizasyon iki veritabanında aynı olsun diye Python'da"""
+    cursor.execute('SELECT id, isim FROM kullanicilar')
+    rows = cursor.fetchall()
+    cursor.executemany('UPDATE kullanicilar SET isim_arama = ? WHERE id = ?',
+                       [(roster.search_key(isim), kullanici_id) for kullanici_id, isim in rows])
+
+
+def _lock(cursor, dialect):
+    """Diğer worker'lar aynı anda migrate etmesin diye yazma kilidi alır"""
+    if dialect == 'postgres':
+        cursor.execute('SELECT pg_advisory_xact_lock(?)', (MIGRATION_LOCK_ID,))
+    else:
+        cursor.execute('BEGIN IMMEDIATE')
+
+
+def current_version(conn):
+    """Uygulanmış en yüksek şema sürümünü döndürür"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn, target=None):
+    """Bekleyen migration'ları sırayla tek transaction içinde uygular"""
+    cursor = conn.cursor()
+    applied = []
+    try:
+        _lock(cursor, conn.dialect)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        version = current_version(conn)
+        for number, name, statements in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            for statement in statements[conn.dialect]:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                           (number, name))
+            applied.append(number)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def run():
+    """Migration'ları her shard'ın veritabanına uygular; {shard: [uygulanan sürümler]}, boşlar hariç"""
+    applied = {}
+    for shard in db.shard_names():
+        with db.connection(shard) as conn:
+            versions = migrate(conn)
+        if versions:
+            applied[shard] = versions
+    return applied
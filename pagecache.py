@@ -0,0 +1,93 @@
+"""Veri sürümüne bağlı sayfa cache'i - ETag üretimi ve render edilmiş HTML"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import store
+import tenants
+
+DATA_VERSION_KEY = 'data:version'
+PAGE_CACHE_SIZE = int(os.getenv('PAGE_CACHE_SIZE', '64'))
+
+
+def _version_key(tenant_key=None):
+    return f'{DATA_VERSION_KEY}:{tenant_key or tenants.current().key}'
+
+
+def data_version(shared_store=None, tenant_key=None):
+    """Grubun (varsayılan: içinde bulunulan grup) sayfalarındaki veriyi değiştiren her yazmada artan sürüm"""
+    return int((shared_store or store.shared).get(_version_key(tenant_key)) or 0)
+
+
+def bump(shared_store=None, tenant_key=None):
+    """Yazma sonrası çağrılır; tüm worker'larda grubun ETag'leri ve cache'lenmiş sayfaları geçersiz olur"""
+    return (shared_store or store.shared).incr(_version_key(tenant_key))
+
+
+def bump_shard(shard, shared_store=None, conn=None):
+    """Shard genelindeki işlerden (gün sonu, saklama, özet hesabı) sonra shard'daki grupların sürümleri"""
+    for tenant in tenants.in_shard(shard, conn):
+        bump(shared_store, tenant.key)
+
+
+# Grup anahtarı -> bu process'in gördüğü son sürüm ve ilk görüldüğü an (monotonic)
+_seen = {}
+_seen_lock = threading.Lock()
+
+
+def version_age(version, tenant_key=None):
+    """Grubun bu sürümünün process'te ilk görülmesinden beri geçen saniye; gecikmeli replika için yaklaşık yaş"""
+    key = tenant_key or tenants.current().key
+    now = time.monotonic()
+    with _seen_lock:
+        seen_version, seen_at = _seen.get(key, (None, 0.0))
+        if seen_version != version:
+            seen_at = now
+            _seen[key] = (version, seen_at)
+    return now - seen_at
+
+
+def etag(*parts):
+    """Sayfa adı, veri sürümü ve görünümü etkileyen diğer değerlerden güçlü ETag"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """ETag'e göre render edilmiş HTML'i tutan küçük LRU cache (process başına)"""
+
+    def __init__(self, max_size=PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._pages.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._pages[key] = html
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._pages),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+pages = PageCache()
@@ -0,0 +1,181 @@
+"""Kullanıcı kartlarının seviye ve rozet bilgileri - tüm liste için toplu, memo'lu hesap"""
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from badges import BADGE_GROUPS
+from levels import MAX_XP, MIN_XPS, level_info_at
+
+# Sütun bazlı arama için numpy (opsiyonel) - yoksa bisect
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '4096'))
+
+# Roster satırındaki sütunlar (cache.ROSTER_COLUMNS sırası)
+XP, KUFUR_SAYISI, TOPLAM_PARA, STREAK = 4, 2, 3, 7
+
+
+class _LRU:
+    """(xp, kufur_sayisi, toplam_para, streak) -> (level_info, badges) sınırlı memo"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """Bulunanları döndürür, bulunamayanları sayar"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._items.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._items.move_to_end(key)
+                    found[key] = value
+                    self.hits += 1
+        return found
+
+    def set_many(self, items):
+        with self._lock:
+            for key, value in items.items():
+                self._items[key] = value
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._items), 'hits': self.hits, 'misses': self.misses}
+
+
+memo = _LRU(PROFILE_CACHE_SIZE)
+
+
+def _indices(bounds, values):
+    """Her değerin düştüğü aralığın sırası (bounds artan alt sınırlar)"""
+    if NUMPY_AVAILABLE:
+        return (np.searchsorted(np.asarray(bounds, dtype=float), np.asarray(values, dtype=float),
+                                side='right') - 1).tolist()
+    return [bisect_right(bounds, value) - 1 for value in values]
+
+
+# Grup aralık sıralarından (ör. (2, 0, 1, 0)) rozet listesine; en fazla 4*4*3*3 farklı değer
+_badge_sets = {}
+
+
+def _badge_set(indices):
+    badges = _badge_sets.get(indices)
+    if badges is None:
+        badges = tuple(group[index] for (_, _, group), index in zip(BADGE_GROUPS, indices)
+                       if group[index] is not None)
+        _badge_sets[indices] = badges
+    return badges
+
+
+def _compute(keys):
+    """Memo'da olmayan anahtarlar için seviye ve rozetleri sütun sütun hesaplar"""
+    xps, kufurlar, paralar, streakler = zip(*keys)
+    columns = {'kufur_sayisi': kufurlar, 'toplam_para': paralar, 'streak': streakler}
+
+    # Seviye bilgisi farklı XP değeri başına bir kez; MAX_XP ve üstü tablo dışı (-1)
+    unique_xps = list(dict.fromkeys(xps))
+    level_infos = {xp: level_info_at(-1 if xp >= MAX_XP else index, xp)
+                   for xp, index in zip(unique_xps, _indices(MIN_XPS, unique_xps))}
+
+    # Rozetler: her grup için aralık sırası, sonra sıra kombinasyonu başına tek liste
+    group_indices = zip(*(_indices(bounds, columns[column]) for column, bounds, _ in BADGE_GROUPS))
+
+    return {key: (level_infos[key[0]], _badge_set(indices))
+            for key, indices in zip(keys, group_indices)}
+
+
+def profile_key(row):
+    return (row[XP], row[KUFUR_SAYISI], row[TOPLAM_PARA] or 0, row[STREAK] or 0)
+
+
+def details(row):
+    """Tek kullanıcı: {'data', 'level_info', 'badges'} (sonuçlar paylaşılır, salt okunur)"""
+    return roster_details([row])[0]
+
+
+def roster_details(rows):
+    """Tüm liste için tek geçişte seviye ve rozet bilgisi; aynı değerler bir kez hesaplanır"""
+    keys = [profile_key(row) for row in rows]
+    unique = list(dict.fromkeys(keys))
+    found = memo.get_many(unique)
+    missing = [key for key in unique if key not in found]
+    if missing:
+        computed = _compute(missing)
+        memo.set_many(computed)
+        found.update(computed)
+    return [{'data': row, 'level_info': found[key][0], 'badges': found[key][1]}
+            for row, key in zip(rows, keys)]
+
+
+def _synthetic_roster(users, seed=42):
+    """Benchmark için ROSTER_COLUMNS biçiminde rastgele kullanıcılar"""
+    rng = random.Random(seed)
+    rows = []
+    for user_id in range(1, users + 1):
+        kufur = rng.randint(0, 80)
+        rows.append((user_id, f'kullanici{user_id}', kufur, kufur * 10.0,
+                     rng.randint(0, 1500), 1, '😊', rng.randint(0, 10), None))
+    return rows
+
+
+def benchmark(users=10000, repeat=20):
+    """Kullanıcı başına hesap ile toplu/memo'lu hesabı karşılaştırır (istek başına ms)"""
+    from badges import calculate_badges
+    from levels import get_level_info
+
+    rows = _synthetic_roster(users)
+
+    def per_user():
+        return [{'data': row,
+                 'level_info': get_level_info(row[XP]),
+                 'badges': calculate_badges(row[KUFUR_SAYISI], row[TOPLAM_PARA], row[STREAK])}
+                for row in rows]
+
+    def cold():
+        memo.clear()
+        return roster_details(rows)
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    saved = (memo.max_size, dict(memo._items))
+    memo.max_size = max(memo.max_size, users)
+    try:
+        results = {
+            'users': users,
+            'numpy': NUMPY_AVAILABLE,
+            'per_user_ms': timed(per_user),
+            'batch_cold_ms': timed(cold),
+        }
+        roster_details(rows)
+        results['batch_warm_ms'] = timed(lambda: roster_details(rows))
+        results['distinct_profiles'] = len(memo._items)
+    finally:
+        memo.clear()
+        memo.max_size = saved[0]
+        memo.set_many(saved[1])
+    return results
@@ -0,0 +1,314 @@
+"""Küfür geçmişi saklama - eski ham olaylar günlük özete sıkıştırılıp silinir
+
+HISTORY_RETENTION_DAYS günden eski kufur_gecmisi satırları önce kufur_gunluk'a kesinleştirilir
+(gecmis_saklama.sinir ilerler), sonra silinir: PostgreSQL'de tablo aylık bölümlüyse süresi dolan
+bölümler DROP edilir, kalanlar (ve SQLite'ta hepsi) kısa transaction'larda parça parça silinir.
+Zamanlanmış iş sadece web sunucusu worker'larında, ilk istekte başlar (CLI, migration ve import
+başlatmaz); gecmis_saklama.son_calisma kiralaması ile tek worker yapar.
+"""
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import db
+import history
+import pagecache
+import rollup
+
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '0'))  # 0: ham olaylar silinmez
+RETENTION_DELETE_CHUNK = int(os.getenv('RETENTION_DELETE_CHUNK', '5000'))
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', '3600'))
+RETENTION_SCHEDULE = os.getenv('RETENTION_SCHEDULE', '1') == '1'
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '2'))
+
+_PARTITION_NAME = re.compile(r'^kufur_gecmisi_(\d{4})_(\d{2})$')
+
+# Bölümlü tabloda birincil anahtar ve benzersiz indeksler bölüm anahtarını (tarih) içermek zorunda
+PARTITIONED_TABLE_SQL = '''
+    CREATE TABLE kufur_gecmisi (
+        id INTEGER NOT NULL DEFAULT nextval('kufur_gecmisi_id_seq'),
+        kullanici_id INTEGER REFERENCES kullanicilar (id),
+        tarih TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        ip_adresi TEXT,
+        olay_id TEXT,
+        grup_id INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (id, tarih)
+    ) PARTITION BY RANGE (tarih)
+'''
+PARTITIONED_INDEXES = (
+    'CREATE UNIQUE INDEX ux_kufur_gecmisi_olay ON kufur_gecmisi (olay_id, tarih)',
+    'CREATE INDEX ix_kufur_gecmisi_tarih ON kufur_gecmisi (tarih)',
+    'CREATE INDEX ix_kufur_gecmisi_kullanici_tarih ON kufur_gecmisi (kullanici_id, tarih)',
+    'CREATE INDEX ix_kufur_gecmisi_grup_tarih ON kufur_gecmisi (grup_id, tarih)',
+)
+
+
+class RetentionError(RuntimeError):
+    """Bu veritabanında yapılamayan saklama işlemi"""
+
+
+def cutoff_date(days=HISTORY_RETENTION_DAYS):
+    """Bu günden önceki ham olaylar süresi dolmuş sayılır (UTC, özetle aynı gün sınırı)"""
+    return rollup.today() - timedelta(days=days)
+
+
+def _month(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _months_ahead(months=PARTITION_MONTHS_AHEAD):
+    month = _month(rollup.today())
+    for _ in range(months):
+        month = _next_month(month)
+    return month
+
+
+def compact(conn, cutoff):
+    """cutoff'tan önceki günlerin özetini ham olaylardan kesinleştirir; (sınır, yazılan özet satırı)
+
+    Sadece önceki sınırdan bu yana kalan günler hesaplanır; sınırdan önceki özetler bir daha
+    ham olaylardan üretilmez (olaylar silinmiş olabilir).
+    """
+    cursor = conn.cursor()
+    try:
+        # rollup.backfill ile aynı kilit: eşzamanlı yazmalar özet tablosunda bekler
+        if conn.is_postgres:
+            cursor.execute('LOCK TABLE kufur_gunluk IN SHARE ROW EXCLUSIVE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        sinir = rollup.compacted_before(conn)
+        if sinir is not None and sinir >= cutoff:
+            conn.rollback()
+            return sinir, 0
+        params = (cutoff, sinir) if sinir else (cutoff,)
+        cursor.execute(f"DELETE FROM kufur_gunluk WHERE gun < ? {'AND gun >= ?' if sinir else ''}", params)
+        cursor.execute(f'''
+            INSERT INTO kufur_gunluk (grup_id, kullanici_id, gun, sayi)
+            SELECT grup_id, kullanici_id, DATE(tarih), COUNT(*)
+            FROM kufur_gecmisi
+            WHERE kullanici_id IS NOT NULL AND tarih < ? {'AND tarih >= ?' if sinir else ''}
+            GROUP BY grup_id, kullanici_id, DATE(tarih)
+        ''', params)
+        rows = cursor.rowcount
+        cursor.execute('UPDATE gecmis_saklama SET sinir = ? WHERE id = 1', (cutoff,))
+        conn.commit()
+        return cutoff, rows
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def delete_expired(conn, cutoff, chunk_size=RETENTION_DELETE_CHUNK):
+    """tarih < cutoff olan ham olayları chunk_size'lık kısa transaction'larla siler; silinen satır"""
+    deleted = 0
+    while True:
+        # SQLite'ta DELETE ... LIMIT derleme seçeneğine bağlı: alt sorgu iki dialect'te de çalışır
+        cursor = conn.execute('''
+            DELETE FROM kufur_gecmisi WHERE id IN (
+                SELECT id FROM kufur_gecmisi WHERE tarih < ? LIMIT ?
+            )
+        ''', (cutoff, chunk_size))
+        count = cursor.rowcount
+        conn.commit()
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
+def is_partitioned(conn):
+    """kufur_gecmisi PostgreSQL'de bölümlü tablo mu"""
+    if not conn.is_postgres:
+        return False
+    cursor = conn.execute("SELECT COUNT(*) FROM pg_partitioned_table "
+                          "WHERE partrelid = to_regclass('kufur_gecmisi')")
+    return cursor.fetchone()[0] > 0
+
+
+def _create_partitions(cursor, start, end):
+    """[start ayı, end ayı] arasındaki aylık bölümleri oluşturur"""
+    month = _month(start)
+    created = 0
+    while month <= end:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS kufur_gecmisi_{month:%Y_%m} PARTITION OF kufur_gecmisi "
+                       f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')")
+        month = _next_month(month)
+        created += 1
+    return created
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Bu ay ve sonraki months_ahead ay için bölümler hazır olsun (yoksa olaylar varsayılan bölüme düşer)"""
+    try:
+        _create_partitions(conn.cursor(), rollup.today(), _months_ahead(months_ahead))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def drop_expired_partitions(conn, cutoff):
+    """Tamamı cutoff'tan önce kalan aylık bölümleri siler; silinen bölüm adları"""
+    cursor = conn.execute('''
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('kufur_gecmisi')
+    ''')
+    dropped = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match and _next_month(date(int(match[1]), int(match[2]), 1)) <= cutoff:
+            conn.execute(f'DROP TABLE {name}')
+            conn.commit()
+            dropped.append(name)
+    return dropped
+
+
+def partition_history(conn):
+    """kufur_gecmisi'ni aylık RANGE bölümlü tabloya taşır (PostgreSQL); taşınan satır sayısı
+
+    Tek transaction'da çalışır ve tablo taşıma boyunca kilitlidir: bakım penceresinde çalıştırın.
+    """
+    if not conn.is_postgres:
+        raise RetentionError('Bölümleme sadece PostgreSQL için; SQLite parça parça silmeyle çalışır')
+    if is_partitioned(conn):
+        return 0
+    cursor = conn.cursor()
+    try:
+        cursor.execute('LOCK TABLE kufur_gecmisi IN ACCESS EXCLUSIVE MODE')
+        cursor.execute('SELECT MIN(tarih) FROM kufur_gecmisi')
+        first = cursor.fetchone()[0]
+        cursor.execute('ALTER TABLE kufur_gecmisi RENAME TO kufur_gecmisi_eski')
+        for index in ('ux_kufur_gecmisi_olay', 'ix_kufur_gecmisi_tarih', 'ix_kufur_gecmisi_kullanici_tarih',
+                      'ix_kufur_gecmisi_grup_tarih'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        # SERIAL sırası eski tabloyla birlikte silinmesin, yeni tabloya geçsin
+        cursor.execute('ALTER SEQUENCE kufur_gecmisi_id_seq OWNED BY NONE')
+        cursor.execute(PARTITIONED_TABLE_SQL)
+        cursor.execute('CREATE TABLE kufur_gecmisi_varsayilan PARTITION OF kufur_gecmisi DEFAULT')
+        _create_partitions(cursor, first.date() if first else rollup.today(), _months_ahead())
+        cursor.execute('''
+            INSERT INTO kufur_gecmisi (id, kullanici_id, tarih, ip_adresi, olay_id, grup_id)
+            SELECT id, kullanici_id, COALESCE(tarih, CURRENT_TIMESTAMP), ip_adresi, olay_id, grup_id
+            FROM kufur_gecmisi_eski
+        ''')
+        moved = cursor.rowcount
+        cursor.execute('DROP TABLE kufur_gecmisi_eski')
+        cursor.execute('ALTER SEQUENCE kufur_gecmisi_id_seq OWNED BY kufur_gecmisi.id')
+        for statement in PARTITIONED_INDEXES:
+            cursor.execute(statement)
+        conn.commit()
+        return moved
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_shard(conn, days=HISTORY_RETENTION_DAYS, chunk_size=RETENTION_DELETE_CHUNK):
+    """Bir shard'ın veritabanında bölüm bakımı, sıkıştırma ve silme"""
+    result = {'sinir': None, 'rollup_rows': 0, 'dropped_partitions': [], 'deleted': 0}
+    partitioned = is_partitioned(conn)
+    if partitioned:
+        ensure_partitions(conn)
+    if days <= 0:
+        result['sinir'] = rollup.compacted_before(conn)
+        return result
+    cutoff = cutoff_date(days)
+    result['sinir'], result['rollup_rows'] = compact(conn, cutoff)
+    if partitioned:
+        result['dropped_partitions'] = drop_expired_partitions(conn, cutoff)
+    result['deleted'] = delete_expired(conn, cutoff, chunk_size)
+    return result
+
+
+def run(days=HISTORY_RETENTION_DAYS, chunk_size=RETENTION_DELETE_CHUNK):
+    """Saklama işini tüm shard'larda bir kez çalıştırır; sınır varsayılan shard'ınki, sayılar toplam"""
+    result = {'sinir': None, 'rollup_rows': 0, 'dropped_partitions': [], 'deleted': 0}
+    # Tamponda bekleyen olaylar sıkıştırmadan önce tabloya yazılsın
+    history.buffer.flush()
+    for shard in db.shard_names():
+        with db.connection(shard) as conn:
+            shard_result = run_shard(conn, days, chunk_size)
+        if shard_result['rollup_rows'] or shard_result['deleted'] or shard_result['dropped_partitions']:
+            pagecache.bump_shard(shard)
+        if result['sinir'] is None:
+            result['sinir'] = shard_result['sinir']
+        result['rollup_rows'] += shard_result['rollup_rows']
+        result['deleted'] += shard_result['deleted']
+        result['dropped_partitions'] += [name if shard == db.DEFAULT_SHARD else f'{shard}/{name}'
+                                         for name in shard_result['dropped_partitions']]
+    return result
+
+
+def claim(conn, interval=RETENTION_INTERVAL):
+    """Bu dönemin işini bu process'e ayırır; diğer worker'lar ve sunucular interval boyunca atlar"""
+    now = datetime.utcnow()
+    cursor = conn.execute('''
+        UPDATE gecmis_saklama SET son_calisma = ?
+        WHERE id = 1 AND (son_calisma IS NULL OR son_calisma < ?)
+    ''', (now, now - timedelta(seconds=interval)))
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+class RetentionJob:
+    """Saklama işini arka plan thread'inde periyodik çalıştırır (worker başına bir thread)"""
+
+    def __init__(self, interval=RETENTION_INTERVAL):
+        self.interval = interval
+        self._pid = None
+        # Metrikler
+        self.runs = 0
+        self.errors = 0
+        self.deleted = 0
+        self.last_run = None
+
+    def start(self):
+        # Fork sonrası her worker kendi thread'ini başlatır
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name='history-retention', daemon=True).start()
+
+    def _run(self):
+        # Worker'lar aynı anda açıldığında kiralama için yarışmasınlar
+        time.sleep(random.uniform(0, min(self.interval, 60)))
+        while True:
+            try:
+                # Kiralama varsayılan shard'da; kiralayan worker tüm shard'ları işler
+                with db.connection(db.DEFAULT_SHARD) as conn:
+                    claimed = claim(conn, self.interval)
+                if claimed:
+                    result = run()
+                    self.runs += 1
+                    self.deleted += result['deleted']
+                    self.last_run = time.time()
+                    if result['deleted'] or result['dropped_partitions']:
+                        print(f"History retention: {result['deleted']} events deleted, "
+                              f"{len(result['dropped_partitions'])} partitions dropped, "
+                              f"compacted before {result['sinir']}")
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in history retention: {e}")
+            time.sleep(self.interval)
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'errors': self.errors,
+            'deleted': self.deleted,
+        }
+
+
+job = RetentionJob()
+
+
+def schedule():
+    """Web sunucusu worker'ında zamanlanmış işi başlatır; kapalıysa ya da süre 0 ise hiçbir şey yapmaz"""
+    if RETENTION_SCHEDULE and HISTORY_RETENTION_DAYS > 0:
+        job.start()
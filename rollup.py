@@ -0,0 +1,90 @@
+"""kufur_gunluk özet tablosu - kullanıcı başına günlük küfür sayıları (grup bazında okunur)"""
+from datetime import date, datetime, timedelta
+
+UPSERT_SQL = '''
+    INSERT INTO kufur_gunluk (grup_id, kullanici_id, gun, sayi) VALUES (?, ?, ?, ?)
+    ON CONFLICT (kullanici_id, gun) DO UPDATE SET sayi = kufur_gunluk.sayi + excluded.sayi
+'''
+
+
+def today():
+    """Özetin gün sınırı: geçmişteki tarih sütunu gibi UTC"""
+    return datetime.utcnow().date()
+
+
+def as_date(value):
+    """DATE/TIMESTAMP sütun değeri -> date (SQLite metin olarak döner)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def record(conn, grup_id, kullanici_id, count=1, gun=None):
+    """Küfür yazma transaction'ı içinde günlük sayacı artırır"""
+    conn.cursor().execute(UPSERT_SQL, (grup_id, kullanici_id, gun or today(), count))
+
+
+def compacted_before(conn):
+    """Saklama sınırı: bu günden önceki özet kesin, ham olaylar silinmiş olabilir (yoksa None)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT sinir FROM gecmis_saklama WHERE id = 1')
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return as_date(row[0])
+
+
+def backfill(conn):
+    """Shard'ın özetini kufur_gecmisi'nden baştan hesaplar (saklama sınırından önceki günler korunur)"""
+    cursor = conn.cursor()
+    try:
+        # Eşzamanlı yazmalar özet tablosunda beklesin, sayılar iki kez eklenmesin
+        if conn.is_postgres:
+            cursor.execute('LOCK TABLE kufur_gunluk IN SHARE ROW EXCLUSIVE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        sinir = compacted_before(conn)
+        params = (sinir,) if sinir else ()
+        cursor.execute(f"DELETE FROM kufur_gunluk {'WHERE gun >= ?' if sinir else ''}", params)
+        cursor.execute(f'''
+            INSERT INTO kufur_gunluk (grup_id, kullanici_id, gun, sayi)
+            SELECT grup_id, kullanici_id, DATE(tarih), COUNT(*)
+            FROM kufur_gecmisi
+            WHERE kullanici_id IS NOT NULL {'AND tarih >= ?' if sinir else ''}
+            GROUP BY grup_id, kullanici_id, DATE(tarih)
+        ''', params)
+        cursor.execute('SELECT COUNT(*) FROM kufur_gunluk')
+        rows = cursor.fetchone()[0]
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def weekly_counts_query(grup_id, days=7):
+    """weekly_counts sorgusu ve parametreleri (aiodb ile eşzamanlı çalıştırmak için)"""
+    # (grup_id, gun) indeksi: sadece grubun son günleri taranır
+    return '''
+        SELECT kullanici_id, SUM(sayi) as haftalik_kufur
+        FROM kufur_gunluk
+        WHERE grup_id = ? AND gun >= ?
+        GROUP BY kullanici_id
+    ''', (grup_id, today() - timedelta(days=days))
+
+
+def weekly_counts(conn, grup_id, days=7):
+    """Grubun son `days` gündeki kullanıcı başına küfür sayıları: [(kullanici_id, sayi), ...]"""
+    cursor = conn.cursor()
+    cursor.execute(*weekly_counts_query(grup_id, days))
+    return cursor.fetchall()
+
+
+def user_weekly_count(conn, kullanici_id, days=7):
+    """Tek kullanıcının son `days` gündeki küfür sayısı (özet tablosunun birincil anahtarı üzerinden)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(SUM(sayi), 0) FROM kufur_gunluk WHERE kullanici_id = ? AND gun >= ?',
+                   (kullanici_id, today() - timedelta(days=days)))
+    return int(cursor.fetchone()[0])
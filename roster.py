@@ -0,0 +1,110 @@
+"""Sayfalı kullanıcı listesi - (xp, kufur_sayisi, id) üzerinde keyset sayfalama ve isim araması"""
+import os
+import unicodedata
+from collections import namedtuple
+
+from cache import ROSTER_COLUMNS
+
+ROSTER_PAGE_SIZE = int(os.getenv('ROSTER_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = 200
+
+# Sıralama: xp DESC, kufur_sayisi DESC, id ASC (cache.sort_key ile aynı).
+# "grup_id = ?" ve baştaki "xp <= ?" koşulu ix_kullanicilar_grup_xp_kufur_id üzerinde grubun içinde
+# aralık araması sağlar; maliyet shard'daki diğer grupların boyutundan bağımsız.
+_AFTER = '''xp <= ? AND (xp < ? OR (xp = ? AND
+            (kufur_sayisi < ? OR (kufur_sayisi = ? AND id > ?))))'''
+_BEFORE = '''xp >= ? AND (xp > ? OR (xp = ? AND
+             (kufur_sayisi > ? OR (kufur_sayisi = ? AND id < ?))))'''
+_FORWARD = 'xp DESC, kufur_sayisi DESC, id'
+_BACKWARD = 'xp, kufur_sayisi, id DESC'
+
+RosterPage = namedtuple('RosterPage', 'rows next_cursor prev_cursor')
+
+
+class CursorError(ValueError):
+    """Geçersiz sayfa imleci veya sayfa boyutu"""
+
+
+def encode_cursor(row):
+    """Satırın sıralama anahtarından sayfa imleci: 'xp.kufur_sayisi.id'"""
+    return f'{row[4]}.{row[2]}.{row[0]}'
+
+
+def decode_cursor(value):
+    try:
+        xp, kufur_sayisi, kullanici_id = (int(part) for part in value.split('.'))
+    except (AttributeError, ValueError):
+        raise CursorError('Geçersiz sayfa imleci')
+    return xp, kufur_sayisi, kullanici_id
+
+
+def page_size(value):
+    """İstekten gelen sayfa boyutunu doğrular ve sınırlar"""
+    if value in (None, ''):
+        return ROSTER_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise CursorError('limit sayı olmalı')
+    if size < 1:
+        raise CursorError('limit en az 1 olmalı')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def search_key(text):
+    """İsim ve arama metninin ortak biçimi (kullanicilar.isim_arama): büyük/küçük harf ve İ/ı farkı yok
+
+    Veritabanının LOWER'ı kullanılmaz: SQLite sadece ASCII harfleri küçültür, PostgreSQL locale'e bağlıdır.
+    """
+    # 'İ'.casefold() -> 'i' + birleşen nokta (U+0307)
+    return unicodedata.normalize('NFC', text).casefold().replace('\u0307', '').replace('ı', 'i')
+
+
+def _search_pattern(search):
+    """LIKE için joker karakterleri kaçırılmış, search_key biçiminde 'içerir' kalıbı"""
+    escaped = search_key(search).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def page_query(grup_id, after=None, before=None, search=None, limit=ROSTER_PAGE_SIZE):
+    """Grubun bir sayfa kullanıcısı için (sorgu, parametreler); sonuç page_from_rows ile sayfaya çevrilir"""
+    conditions, params = ['grup_id = ?'], [grup_id]
+    cursor_value = before or after
+    if cursor_value:
+        xp, kufur_sayisi, kullanici_id = decode_cursor(cursor_value)
+        conditions.append(_BEFORE if before else _AFTER)
+        params.extend([xp, xp, xp, kufur_sayisi, kufur_sayisi, kullanici_id])
+    if search:
+        conditions.append("isim_arama LIKE ? ESCAPE '\\'")
+        params.append(_search_pattern(search))
+
+    # Bir fazla satır: sonraki (veya önceki) sayfa var mı
+    query = f'''
+        SELECT {ROSTER_COLUMNS} FROM kullanicilar
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {_BACKWARD if before else _FORWARD}
+        LIMIT ?
+    '''
+    return query, (*params, limit + 1)
+
+
+def page_from_rows(rows, after=None, before=None, limit=ROSTER_PAGE_SIZE):
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if before:
+        rows.reverse()
+        next_cursor = encode_cursor(rows[-1]) if rows else None
+        prev_cursor = encode_cursor(rows[0]) if rows and has_more else None
+    else:
+        next_cursor = encode_cursor(rows[-1]) if rows and has_more else None
+        prev_cursor = encode_cursor(rows[0]) if rows and after else None
+    return RosterPage(rows, next_cursor, prev_cursor)
+
+
+def page(conn, grup_id, after=None, before=None, search=None, limit=ROSTER_PAGE_SIZE):
+    """Grubun bir sayfa kullanıcısı; maliyet toplam kullanıcı sayısından değil sayfa boyutundan bağımsız"""
+    cursor = conn.cursor()
+    cursor.execute(*page_query(grup_id, after, before, search, limit))
+    return page_from_rows(cursor.fetchall(), after, before, limit)
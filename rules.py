@@ -0,0 +1,335 @@
+"""Streak ve challenge kural motoru - küfür/azaltma olaylarıyla artımlı, gün sonunda toplu
+
+Her olay, sayaçları yazan transaction içinde kullanıcının streak'ini ve o günün challenge'larını
+sabit sayıda sorguyla günceller. Temiz Gün ancak gün bitince bilinir: close_pending_days biten
+günlerde hiç küfretmeyenleri toplu tamamlar ve aktif olmayanların streak'ini sıfırlar. rebuild aynı
+durumu günlük özetlerden (kufur_gunluk, azaltma_gunluk) ve ham geçmişten baştan hesaplayıp
+artımlı durumla karşılaştırır. Günler özet tablosu gibi UTC. Gün sonu ve rebuild shard genelinde
+çalışır; İlk Kan her grupta ayrı kazanılır.
+"""
+from datetime import timedelta
+
+import pagecache
+import rollup
+from cache import leaderboards
+from levels import xp_assignments
+
+STREAK_DAYS = 3  # Streak challenge'ı için üst üste aktif gün
+
+DAILY_CHALLENGES = (
+    {"id": "clean_day", "name": "Temiz Gün", "desc": "Bugün hiç küfür etme", "xp": 50, "icon": "🌸"},
+    {"id": "first_blood", "name": "İlk Kan", "desc": "Günün ilk küfrünü et", "xp": 10, "icon": "⚡"},
+    {"id": "social", "name": "Sosyal", "desc": "3 farklı kişiye küfür ekle", "xp": 30, "icon": "👥"},
+    {"id": "streak", "name": "Streak", "desc": f"{STREAK_DAYS} gün üst üste aktif ol", "xp": 40, "icon": "🔥"},
+)
+CHALLENGES = {challenge["id"]: challenge for challenge in DAILY_CHALLENGES}
+# 'social' değerlendirilmez: küfrü kimin eklediği bilinmiyor (oturum/kimlik yok), sadece hedef kullanıcı
+
+# Sayaç UPDATE'ine eklenen SET parçası: aynı gün tekrar -> aynı, dün aktifse +1, değilse 1
+ACTIVITY_SQL = '''
+    streak = CASE WHEN last_activity = ? THEN streak
+                  WHEN last_activity = ? THEN streak + 1
+                  ELSE 1 END,
+    last_activity = ?
+'''
+
+AZALTMA_UPSERT_SQL = '''
+    INSERT INTO azaltma_gunluk (kullanici_id, gun, sayi) VALUES (?, ?, ?)
+    ON CONFLICT (kullanici_id, gun) DO UPDATE SET sayi = azaltma_gunluk.sayi + excluded.sayi
+'''
+
+# Satır yoksa (gün içinde henüz oluşturulmadıysa) kullanıcının grubuyla tamamlanmış olarak eklenir;
+# zaten tamamlanmışsa satır dönmez
+COMPLETE_SQL = '''
+    INSERT INTO challenges (grup_id, kullanici_id, challenge_type, date, reward_xp, completed)
+    SELECT grup_id, id, ?, ?, ?, TRUE FROM kullanicilar WHERE id = ?
+    ON CONFLICT (kullanici_id, challenge_type, date)
+    DO UPDATE SET completed = TRUE WHERE challenges.completed IS NOT TRUE
+    RETURNING reward_xp
+'''
+
+
+def activity_params(gun):
+    """ACTIVITY_SQL parametreleri"""
+    return (gun, gun - timedelta(days=1), gun)
+
+
+def record_uncurse(conn, kullanici_id, count=1, gun=None):
+    """Azaltmayı günlük sayaca yazar (aktif gün olarak sayılır, geçmişe yazılmaz)"""
+    conn.cursor().execute(AZALTMA_UPSERT_SQL, (kullanici_id, gun or rollup.today(), count))
+
+
+def complete(conn, kullanici_id, challenge_type, gun):
+    """Challenge'ı tamamlar; ilk kez tamamlandıysa ödül XP'si, zaten tamamlanmışsa None"""
+    cursor = conn.cursor()
+    cursor.execute(COMPLETE_SQL, (challenge_type, gun, CHALLENGES[challenge_type]["xp"], kullanici_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _complete_first_blood(conn, kullanici_id, gun):
+    cursor = conn.cursor()
+    # Kullanıcının grubunda bugün kazanan var mı (ux_challenges_grup_ilk_kan)
+    cursor.execute('''
+        SELECT 1 FROM challenges
+        WHERE grup_id = (SELECT grup_id FROM kullanicilar WHERE id = ?)
+          AND challenge_type = 'first_blood' AND date = ? AND completed
+    ''', (kullanici_id, gun))
+    if cursor.fetchone():
+        return None
+    if not conn.is_postgres:
+        # SQLite yazmaları sıralı, iki küfür aynı anda buraya gelemez
+        return complete(conn, kullanici_id, 'first_blood', gun)
+    # Eşzamanlı ilk küfürlerde benzersiz indeks birini reddeder; küfrün kendisi geri alınmasın
+    cursor.execute('SAVEPOINT ilk_kan')
+    try:
+        reward = complete(conn, kullanici_id, 'first_blood', gun)
+    except Exception:
+        cursor.execute('ROLLBACK TO SAVEPOINT ilk_kan')
+        return None
+    cursor.execute('RELEASE SAVEPOINT ilk_kan')
+    return reward
+
+
+def evaluate(conn, kullanici_id, streak, gun, curse):
+    """Olay sonrası (aynı transaction'da) yeni tamamlanan challenge'lar: [(challenge_type, xp), ...]"""
+    completed = []
+    if curse:
+        reward = _complete_first_blood(conn, kullanici_id, gun)
+        if reward is not None:
+            completed.append(('first_blood', reward))
+    if streak >= STREAK_DAYS:
+        reward = complete(conn, kullanici_id, 'streak', gun)
+        if reward is not None:
+            completed.append(('streak', reward))
+    return completed
+
+
+def award(conn, awards):
+    """[(kullanici_id, xp), ...] ödüllerini XP ve seviyeye yansıtır (eksi değer geri alır)"""
+    totals = {}
+    for kullanici_id, xp in awards:
+        totals[kullanici_id] = totals.get(kullanici_id, 0) + xp
+    by_xp = {}
+    for kullanici_id, xp in totals.items():
+        if xp:
+            by_xp.setdefault(xp, []).append((kullanici_id,))
+    for xp, ids in by_xp.items():
+        conn.cursor().executemany(f'UPDATE kullanicilar SET {xp_assignments(xp)} WHERE id = ?', ids)
+    return sum(len(ids) for ids in by_xp.values())
+
+
+def close_day(conn, gun):
+    """Biten günün toplu işi (commit çağırana): Temiz Gün ödülleri ve kırılan streak'ler; ödül alan sayısı"""
+    cursor = conn.cursor()
+    # O gün başlamadan var olan ve o gün hiç küfretmeyen kullanıcılar
+    cursor.execute('''
+        INSERT INTO challenges (grup_id, kullanici_id, challenge_type, date, reward_xp, completed)
+        SELECT k.grup_id, k.id, 'clean_day', ?, ?, TRUE
+        FROM kullanicilar k
+        WHERE DATE(k.created_at) < ?
+          AND NOT EXISTS (SELECT 1 FROM kufur_gunluk g WHERE g.kullanici_id = k.id AND g.gun = ? AND g.sayi > 0)
+        ON CONFLICT (kullanici_id, challenge_type, date)
+        DO UPDATE SET completed = TRUE WHERE challenges.completed IS NOT TRUE
+        RETURNING kullanici_id, reward_xp
+    ''', (gun, CHALLENGES['clean_day']["xp"], gun, gun))
+    awards = cursor.fetchall()
+    award(conn, awards)
+    cursor.execute('UPDATE kullanicilar SET streak = 0 '
+                   'WHERE streak <> 0 AND (last_activity IS NULL OR last_activity < ?)', (gun,))
+    return len(awards)
+
+
+def closed_days(conn):
+    """(motorun başladığı gün, en son kapatılan gün veya None)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT baslangic, kapanan_gun FROM gun_sonu WHERE id = 1')
+    baslangic, kapanan = cursor.fetchone()
+    return rollup.as_date(baslangic), rollup.as_date(kapanan)
+
+
+def close_pending_days(conn, today=None):
+    """Kapatılmamış biten günleri sırayla kapatır; (kapatılan gün, ödül alan kullanıcı)
+
+    gun_sonu satırı kilitlenerek ilerletilir: birden çok worker aynı günü iki kez kapatmaz.
+    """
+    yesterday = (today or rollup.today()) - timedelta(days=1)
+    cursor = conn.cursor()
+    try:
+        if conn.is_postgres:
+            cursor.execute('SELECT baslangic, kapanan_gun FROM gun_sonu WHERE id = 1 FOR UPDATE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT baslangic, kapanan_gun FROM gun_sonu WHERE id = 1')
+        baslangic, kapanan = (rollup.as_date(value) for value in cursor.fetchone())
+        gun = kapanan + timedelta(days=1) if kapanan else baslangic
+        if gun > yesterday:
+            conn.rollback()
+            return 0, 0
+        days = awarded = 0
+        while gun <= yesterday:
+            awarded += close_day(conn, gun)
+            gun += timedelta(days=1)
+            days += 1
+        cursor.execute('UPDATE gun_sonu SET kapanan_gun = ? WHERE id = 1', (yesterday,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # Leaderboard satırları streak'i de taşır
+    _invalidate(conn)
+    return days, awarded
+
+
+def _invalidate(conn):
+    """Shard'daki tüm grupların leaderboard cache'i ve sayfa sürümü; grup dizini aynı bağlantıdan okunur"""
+    leaderboards.invalidate_shard(conn.pool.name, conn)
+    pagecache.bump_shard(conn.pool.name, conn=conn)
+
+
+def _runs(days):
+    """Sıralı aktif günler için (gün, o güne kadar üst üste aktif gün sayısı)"""
+    run, previous = 0, None
+    for gun in days:
+        run = run + 1 if previous is not None and gun - previous == timedelta(days=1) else 1
+        previous = gun
+        yield gun, run
+
+
+def _active_days(conn):
+    """Kullanıcı başına sıralı aktif günler (küfür veya azaltma yapılan)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT kullanici_id, gun FROM kufur_gunluk WHERE sayi > 0
+        UNION
+        SELECT kullanici_id, gun FROM azaltma_gunluk WHERE sayi > 0
+        ORDER BY 1, 2
+    ''')
+    active = {}
+    for kullanici_id, gun in cursor.fetchall():
+        active.setdefault(kullanici_id, []).append(rollup.as_date(gun))
+    return active
+
+
+def _first_blood_candidates(conn, since):
+    """(grup, gün) -> grupta günün ilk küfrünü edenler (aynı saniyede birden çok olabilir), olay sırasıyla"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT h.tarih, h.grup_id, h.kullanici_id
+        FROM kufur_gecmisi h
+        JOIN (SELECT grup_id, MIN(tarih) AS ilk FROM kufur_gecmisi WHERE tarih >= ?
+              GROUP BY grup_id, DATE(tarih)) f
+          ON h.grup_id = f.grup_id AND h.tarih = f.ilk
+        WHERE h.kullanici_id IS NOT NULL
+        ORDER BY h.id
+    ''', (since,))
+    candidates = {}
+    for tarih, grup_id, kullanici_id in cursor.fetchall():
+        candidates.setdefault((grup_id, rollup.as_date(tarih)), []).append(kullanici_id)
+    return candidates
+
+
+def _completed(conn, challenge_type, since, until=None):
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT kullanici_id, date FROM challenges
+        WHERE challenge_type = ? AND completed AND date >= ? {'AND date <= ?' if until else ''}
+    ''', (challenge_type, since, until) if until else (challenge_type, since))
+    return {(kullanici_id, challenge_type, rollup.as_date(gun)) for kullanici_id, gun in cursor.fetchall()}
+
+
+def _verify(conn, today):
+    baslangic, kapanan = closed_days(conn)
+    cursor = conn.cursor()
+    active = _active_days(conn)
+
+    # Streak ve son aktif gün: gün sonu işi kapattığı bir günden önce kalan streak'i sıfırlar
+    user_mismatches, expected = [], set()
+    cursor.execute('SELECT id, streak, last_activity, grup_id FROM kullanicilar ORDER BY id')
+    users = cursor.fetchall()
+    for kullanici_id, streak, last_activity, _ in users:
+        run, last = 0, None
+        for gun, run in _runs(active.get(kullanici_id, ())):
+            last = gun
+            if run >= STREAK_DAYS and gun >= baslangic:
+                expected.add((kullanici_id, 'streak', gun))
+        if last is not None and kapanan is not None and last < kapanan:
+            run = 0
+        if (streak or 0, rollup.as_date(last_activity)) != (run, last):
+            user_mismatches.append((kullanici_id, (streak, rollup.as_date(last_activity)), (run, last)))
+    user_groups = {row[0]: row[3] for row in users}
+    actual = _completed(conn, 'streak', baslangic)
+
+    # Temiz Gün: kapatılmış her gün için o gün başlamadan var olup hiç küfretmeyenler
+    gun = baslangic
+    while kapanan is not None and gun <= kapanan:
+        cursor.execute('''
+            SELECT k.id FROM kullanicilar k
+            WHERE DATE(k.created_at) < ?
+              AND NOT EXISTS (SELECT 1 FROM kufur_gunluk g WHERE g.kullanici_id = k.id AND g.gun = ? AND g.sayi > 0)
+        ''', (gun, gun))
+        expected.update((kullanici_id, 'clean_day', gun) for (kullanici_id,) in cursor.fetchall())
+        gun += timedelta(days=1)
+    if kapanan is not None:
+        actual |= _completed(conn, 'clean_day', baslangic, kapanan)
+
+    # İlk Kan: sadece ham geçmişi saklanan günler (retention sınırından önceki kazananlar kontrol edilmez)
+    since = max(baslangic, rollup.compacted_before(conn) or baslangic)
+    candidates = _first_blood_candidates(conn, since)
+    first_blood = _completed(conn, 'first_blood', since, today)
+    winners = {(user_groups.get(kullanici_id), gun): kullanici_id for kullanici_id, _, gun in first_blood}
+    for (grup_id, gun), users_of_day in candidates.items():
+        winner = winners.get((grup_id, gun))
+        if winner in users_of_day:
+            expected.add((winner, 'first_blood', gun))
+        elif users_of_day[0] in user_groups:
+            expected.add((users_of_day[0], 'first_blood', gun))
+    actual |= first_blood
+
+    return {
+        'users': len(users),
+        'user_mismatches': user_mismatches,
+        'missing': sorted(expected - actual, key=lambda item: (item[2], item[0], item[1])),
+        'extra': sorted(actual - expected, key=lambda item: (item[2], item[0], item[1])),
+    }
+
+
+def rebuild(conn, apply=False, today=None):
+    """Streak, son aktif gün ve challenge tamamlanmalarını baştan hesaplayıp artımlı durumla karşılaştırır.
+
+    apply=True ise farklar (verilen/geri alınan XP dahil) tek transaction'da düzeltilir; bu sırada
+    sayaç yazmaları bekler. Sadece kontrolde eşzamanlı olaylar geçici farklar gösterebilir.
+    """
+    today = today or rollup.today()
+    if not apply:
+        return _verify(conn, today)
+    cursor = conn.cursor()
+    try:
+        if conn.is_postgres:
+            cursor.execute('LOCK TABLE kullanicilar, challenges IN SHARE ROW EXCLUSIVE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        report = _verify(conn, today)
+        cursor.executemany('UPDATE kullanicilar SET streak = ?, last_activity = ? WHERE id = ?',
+                           [(streak, last, kullanici_id)
+                            for kullanici_id, _, (streak, last) in report['user_mismatches']])
+        awards = []
+        # Önce fazlalar: İlk Kan'ın günlük tekilliği yeni kazananı engellemesin
+        for kullanici_id, challenge_type, gun in report['extra']:
+            cursor.execute('''
+                UPDATE challenges SET completed = FALSE
+                WHERE kullanici_id = ? AND challenge_type = ? AND date = ?
+                RETURNING reward_xp
+            ''', (kullanici_id, challenge_type, gun))
+            awards += [(kullanici_id, -(row[0] or 0)) for row in cursor.fetchall()]
+        for kullanici_id, challenge_type, gun in report['missing']:
+            reward = complete(conn, kullanici_id, challenge_type, gun)
+            if reward:
+                awards.append((kullanici_id, reward))
+        report['xp_changed_users'] = award(conn, awards)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    _invalidate(conn)
+    return report
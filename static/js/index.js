@@ -0,0 +1,164 @@
+// Grup adres öneki (/g/<grup>); varsayılan grupta boş
+const BASE = document.body.dataset.base || '';
+
+// Avatar selector toggle
+function toggleAvatarSelector(userId) {
+    const selector = document.getElementById(`avatar-${userId}`);
+    const allSelectors = document.querySelectorAll('.avatar-selector');
+
+    // Diğerlerini kapat
+    allSelectors.forEach(s => {
+        if (s !== selector) s.style.display = 'none';
+    });
+
+    // Bu selector'ı aç/kapat
+    selector.style.display = selector.style.display === 'grid' ? 'none' : 'grid';
+}
+
+// Flash mesajı göster ve birkaç saniye sonra kaldır
+function showFlash(message, category) {
+    const container = document.getElementById('flash-messages');
+    const flash = document.createElement('div');
+    flash.className = `flash ${category}`;
+    flash.textContent = message;
+    container.hidden = false;
+    container.appendChild(flash);
+    setTimeout(() => {
+        flash.style.opacity = '0';
+        setTimeout(() => flash.remove(), 300);
+    }, 4000);
+}
+
+// API cevabına göre kullanıcı kartını ve toplamları yerinde güncelle
+function applyUpdate(data, userId) {
+    showFlash(data.message, data.ok ? 'success' : 'error');
+    if (data.toplam_para !== undefined) {
+        document.getElementById('toplam-para').textContent = data.toplam_para;
+        document.getElementById('kullanici-sayisi').textContent = data.kullanici_sayisi;
+    }
+    const card = document.getElementById(`user-${userId}`);
+    if (data.deleted && card) {
+        card.remove();
+    } else if (data.html && card) {
+        card.outerHTML = data.html;
+    }
+}
+
+// JSON API'ye istek at; hata olursa normal sayfa isteğine düş
+async function callApi(url, method, body, fallbackUrl, userId) {
+    try {
+        const response = await fetch(url, {
+            method: method,
+            headers: {'Accept': 'application/json', 'Content-Type': 'application/json'},
+            body: body ? JSON.stringify(body) : undefined
+        });
+        applyUpdate(await response.json(), userId);
+    } catch (err) {
+        window.location.href = fallbackUrl;
+    }
+}
+
+// Avatar değiştir
+function changeAvatar(userId, avatar) {
+    callApi(`${BASE}/api/kullanicilar/${userId}/avatar`, 'POST', {avatar: avatar},
+            `${BASE}/change_avatar/${userId}/${avatar}`, userId);
+}
+
+// Küfür ekle/azalt ve silme butonları sayfayı yenilemeden çalışsın
+document.addEventListener('click', function(e) {
+    const link = e.target.closest('a[data-api]');
+    if (!link || e.defaultPrevented) return;
+    e.preventDefault();
+    const card = link.closest('.user-card');
+    callApi(link.dataset.api, link.dataset.method || 'POST', null, link.href, card.dataset.userId);
+});
+
+// Başka pencerelerden gelen değişiklikler: kartın alanlarını yerinde güncelle
+function patchCard(card, user) {
+    const set = (field, value) => {
+        const el = card.querySelector(`[data-field="${field}"]`);
+        if (el) el.textContent = value;
+    };
+    set('avatar', user.avatar);
+    set('kufur_sayisi', user.kufur_sayisi);
+    set('toplam_para', user.toplam_para);
+    set('xp', user.xp);
+    set('streak', user.streak);
+    const info = user.level_info;
+    set('level', `${info.icon} Level ${info.level} - ${info.name}`);
+    card.querySelector('[data-field="progress"]').style.width = `${info.progress}%`;
+    const badges = card.querySelector('.badges');
+    badges.replaceChildren(...user.badges.map(badge => {
+        const el = document.createElement('div');
+        el.className = 'badge';
+        el.style.backgroundColor = badge.color;
+        el.textContent = `${badge.icon} ${badge.name}`;
+        return el;
+    }));
+    badges.hidden = user.badges.length === 0;
+}
+
+// Listede olmayan (yeni eklenmiş) kullanıcının kartını bir kez çek;
+// sadece son sayfada ve arama yokken (diğer sayfalarda kart bu sayfaya ait değil)
+async function insertCard(userId) {
+    const section = document.getElementById('users-section');
+    if (section.dataset.liveInsert !== 'true') return;
+    const response = await fetch(`${BASE}/fragment/kullanici/${userId}`);
+    if (!response.ok || document.getElementById(`user-${userId}`)) return;
+    const empty = document.querySelector('.no-users');
+    if (empty) empty.remove();
+    const pagination = document.getElementById('pagination');
+    if (pagination) pagination.insertAdjacentHTML('beforebegin', await response.text());
+    else section.insertAdjacentHTML('beforeend', await response.text());
+}
+
+// Sayaç değişikliklerini canlı dinle (sayfayı yenilemeye gerek kalmasın)
+if (window.EventSource) {
+    const source = new EventSource(`${BASE}/events`);
+    source.addEventListener('kullanici', e => {
+        const user = JSON.parse(e.data).user;
+        const card = document.getElementById(`user-${user.id}`);
+        if (card) patchCard(card, user);
+        else insertCard(user.id);
+    });
+    source.addEventListener('kullanici_silindi', e => {
+        const card = document.getElementById(`user-${JSON.parse(e.data).id}`);
+        if (card) card.remove();
+    });
+    source.addEventListener('toplam', e => {
+        const data = JSON.parse(e.data);
+        document.getElementById('toplam-para').textContent = data.toplam_para;
+        document.getElementById('kullanici-sayisi').textContent = data.kullanici_sayisi;
+    });
+    source.addEventListener('level_up', e => {
+        const data = JSON.parse(e.data);
+        showFlash(`🎉 ${data.isim} Seviye ${data.level}!`, 'success');
+    });
+    // Bağlantı yetişemedi ve olaylar atlandı: güncel hali baştan al
+    source.addEventListener('resync', () => window.location.reload());
+}
+
+// Dışarı tıklandığında avatar selector'ları kapat
+document.addEventListener('click', function(e) {
+    if (!e.target.closest('.user-avatar')) {
+        document.querySelectorAll('.avatar-selector').forEach(s => {
+            s.style.display = 'none';
+        });
+    }
+});
+
+// Flash mesajlarını otomatik kaldır
+setTimeout(() => {
+    const flashMessages = document.querySelectorAll('.flash');
+    flashMessages.forEach(msg => {
+        msg.style.opacity = '0';
+        setTimeout(() => msg.remove(), 300);
+    });
+}, 4000);
+
+// Form submission feedback
+document.querySelector('.add-user-form').addEventListener('submit', function() {
+    const btn = this.querySelector('button');
+    btn.textContent = '⏳ Ekleniyor...';
+    btn.disabled = true;
+});
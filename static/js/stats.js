@@ -0,0 +1,101 @@
+// Haftalık trend grafiği - veri canvas'ın data-* özniteliklerinde, çizim üçüncü parti kütüphanesiz
+const canvas = document.getElementById('trendChart');
+const ctx = canvas.getContext('2d');
+const trendData = JSON.parse(canvas.dataset.trend);
+const trendBucket = canvas.dataset.bucket;
+
+const labels = trendData.map(item => {
+    const date = new Date(item[0]);
+    if (trendBucket === 'hour') {
+        return date.toLocaleString('tr-TR', {
+            day: 'numeric',
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+    }
+    return date.toLocaleDateString('tr-TR', {
+        weekday: 'short',
+        month: 'short',
+        day: 'numeric'
+    });
+});
+
+const data = trendData.map(item => item[1]);
+
+const LINE_COLOR = '#667eea';
+const FILL_COLOR = 'rgba(102, 126, 234, 0.1)';
+const GRID_COLOR = '#e9ecef';
+const TEXT_COLOR = '#6c757d';
+const PADDING = { top: 12, right: 16, bottom: 36, left: 40 };
+
+// Y ekseni 0'dan başlar, adımlar tam sayı (en fazla ~5 çizgi)
+function yScale(max) {
+    const step = Math.max(1, Math.ceil(max / 5));
+    return { step, top: Math.max(step, Math.ceil(max / step) * step) };
+}
+
+function draw() {
+    const width = canvas.parentElement.clientWidth;
+    const height = canvas.parentElement.clientHeight;
+    const ratio = window.devicePixelRatio || 1;
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+    canvas.style.width = `${width}px`;
+    canvas.style.height = `${height}px`;
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.clearRect(0, 0, width, height);
+
+    const plotWidth = width - PADDING.left - PADDING.right;
+    const plotHeight = height - PADDING.top - PADDING.bottom;
+    const { step, top } = yScale(Math.max(...data));
+    const x = i => PADDING.left + (data.length > 1 ? i * plotWidth / (data.length - 1) : plotWidth / 2);
+    const y = value => PADDING.top + plotHeight - value / top * plotHeight;
+
+    // Izgara ve y ekseni değerleri
+    ctx.font = '12px sans-serif';
+    ctx.fillStyle = TEXT_COLOR;
+    ctx.strokeStyle = GRID_COLOR;
+    ctx.lineWidth = 1;
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    for (let value = 0; value <= top; value += step) {
+        ctx.beginPath();
+        ctx.moveTo(PADDING.left, y(value));
+        ctx.lineTo(width - PADDING.right, y(value));
+        ctx.stroke();
+        ctx.fillText(String(value), PADDING.left - 8, y(value));
+    }
+
+    // X ekseni etiketleri: sığdığı kadar, eşit aralıklı
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'top';
+    const every = Math.max(1, Math.ceil(data.length * 80 / plotWidth));
+    labels.forEach((label, i) => {
+        if (i % every === 0) {
+            ctx.fillText(label, x(i), PADDING.top + plotHeight + 10);
+        }
+    });
+
+    // Alan ve çizgi
+    ctx.beginPath();
+    data.forEach((value, i) => (i ? ctx.lineTo(x(i), y(value)) : ctx.moveTo(x(i), y(value))));
+    ctx.strokeStyle = LINE_COLOR;
+    ctx.lineWidth = 3;
+    ctx.lineJoin = 'round';
+    ctx.stroke();
+    ctx.lineTo(x(data.length - 1), y(0));
+    ctx.lineTo(x(0), y(0));
+    ctx.closePath();
+    ctx.fillStyle = FILL_COLOR;
+    ctx.fill();
+
+    ctx.fillStyle = LINE_COLOR;
+    data.forEach((value, i) => {
+        ctx.beginPath();
+        ctx.arc(x(i), y(value), 3, 0, 2 * Math.PI);
+        ctx.fill();
+    });
+}
+
+draw();
+window.addEventListener('resize', draw);
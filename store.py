@@ -0,0 +1,211 @@
+"""Worker'lar arası paylaşılan küçük anahtar-değer deposu (sürüm sayaçları, token bucket'lar vb.)"""
+import os
+import sqlite3
+import threading
+import time
+
+# Redis bağlantısı için redis import (opsiyonel)
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def refill(state, now, rate, burst, cost):
+    """Token bucket adımı: (izin, yeni token sayısı); state (token, son güncelleme) veya None"""
+    tokens, updated = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost
+    return False, tokens
+
+
+class MemoryStore:
+    """Tek process içinde geçerli depo - varsayılan"""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = value
+            if ttl:
+                self._expires[key] = time.time() + ttl
+            else:
+                self._expires.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._data.get(key, 0) if self._alive(key) else 0) + amount
+            self._data[key] = value
+            return value
+
+    def take(self, key, rate, burst, cost=1):
+        """Token bucket'tan cost kadar token alır; (izin, kalan token)"""
+        with self._lock:
+            now = time.time()
+            allowed, tokens = refill(self._data.get(key) if self._alive(key) else None, now, rate, burst, cost)
+            self._data[key] = (tokens, now)
+            # Kova dolduktan sonra kayıt gereksiz
+            self._expires[key] = now + burst / rate
+            return allowed, tokens
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+
+class FileStore:
+    """Redis yerine yerel SQLite dosyası kullanan depo - aynı makinedeki worker'lar için"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires_at REAL
+            )
+        ''')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute(
+            'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+            (key, str(value), expires_at))
+
+    def incr(self, key, amount=1):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())).fetchone()
+            value = int(row[0]) + amount if row else amount
+            conn.execute(
+                'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, NULL) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = NULL',
+                (key, str(value)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def take(self, key, rate, burst, cost=1):
+        """Token bucket'tan cost kadar token alır; (izin, kalan token). Değer 'token:zaman' metni"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, now)).fetchone()
+            state = tuple(float(part) for part in row[0].split(':')) if row else None
+            allowed, tokens = refill(state, now, rate, burst, cost)
+            conn.execute(
+                'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+                (key, f'{tokens}:{now}', now + burst / rate))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+
+class RedisStore:
+    """Redis üzerinde çalışan depo - birden fazla makine/worker için"""
+
+    # refill() ile aynı hesap, sunucuda atomik; saat Redis'in (worker saatleri farklı olabilir)
+    TAKE_SCRIPT = """
+        local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local allowed = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError('redis paketi yüklü değil')
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(key, amount)
+
+    def take(self, key, rate, burst, cost=1):
+        """Token bucket'tan cost kadar token alır; (izin, kalan token)"""
+        allowed, tokens = self._take(keys=[key], args=[rate, burst, cost])
+        return bool(allowed), float(tokens)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+def create_store(url=None):
+    """URL'e göre depo oluşturur: memory://, sqlite:///dosya.db veya redis://..."""
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith('sqlite:///'):
+        return FileStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f'Desteklenmeyen SHARED_STORE_URL: {url}')
+
+
+shared = create_store(os.getenv('SHARED_STORE_URL'))
@@ -0,0 +1,253 @@
+"""Gruplar (tenant'lar) - gruba göre istek bağlamı, grup dizini ve shard yönlendirme
+
+Her grubun kullanıcıları, geçmişi, özetleri ve challenge'ları grup_id ile ayrılır ve grubun
+shard'ındaki veritabanında tutulur; sorgular (grup_id, ...) ile başlayan indeksleri kullanır, maliyet
+grubun boyutuna bağlıdır. Grup dizini (gruplar tablosu) varsayılan shard'dadır, yeni grubun shard'ını
+SHARD_ROUTER seçer. Varsayılan grup önek olmadan (eski adresler), diğerleri /g/<slug>/ önekiyle çalışır.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import abort, current_app, g
+
+import db
+
+SHARD_ROUTER = os.getenv('SHARD_ROUTER', 'directory')  # directory | hash
+# Bulunamayan slug'lar bu kadar saniye (process içinde) tekrar sorgulanmaz
+TENANT_MISS_TTL = float(os.getenv('TENANT_MISS_TTL', '5'))
+TENANT_MISS_MAX = 10000
+
+DEFAULT_ID = 1
+DEFAULT_SLUG = 'varsayilan'
+URL_PREFIX = '/g/<grup>'
+SLUG_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{1,39}$')
+# Önekle kopyalanmayan route'lar: gruptan bağımsız dosyalar ve process metrikleri
+GLOBAL_ENDPOINTS = {'static', 'asset', 'metrics'}
+
+
+class TenantError(ValueError):
+    """Geçersiz ya da zaten var olan grup"""
+
+
+def tenant_key(shard, grup_id):
+    """Cache ve yayın anahtarlarında grubu ayıran önek: 'shard:grup_id'"""
+    return f'{shard}:{grup_id}'
+
+
+class Tenant(namedtuple('Tenant', 'id slug isim shard')):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return tenant_key(self.shard, self.id)
+
+    @property
+    def prefix(self):
+        """Grubun adres öneki; varsayılan grup için boş"""
+        return '' if self.slug == DEFAULT_SLUG else f'/g/{self.slug}'
+
+
+DEFAULT = Tenant(DEFAULT_ID, DEFAULT_SLUG, 'Varsayılan', db.DEFAULT_SHARD)
+
+_current = contextvars.ContextVar('tenant', default=DEFAULT)
+
+
+def current():
+    """İçinde bulunulan isteğin (veya işin) grubu; bağlam dışında varsayılan grup"""
+    return _current.get()
+
+
+def _activate(tenant):
+    db.pool_for(tenant.shard)
+    return _current.set(tenant), db._shard.set(tenant.shard)
+
+
+def _deactivate(tokens):
+    tenant_token, shard_token = tokens
+    db._shard.reset(shard_token)
+    _current.reset(tenant_token)
+
+
+@contextmanager
+def use(tenant):
+    """Bu bağlamdaki sorgular ve cache'ler verilen gruba (ve shard'ına) gider"""
+    tokens = _activate(tenant)
+    try:
+        yield tenant
+    finally:
+        _deactivate(tokens)
+
+
+class DirectoryRouter:
+    """Yeni grubu en az grup barındıran shard'a yerleştirir; yer dizinde tutulur, shard eklemek taşıma gerektirmez"""
+
+    def assign(self, conn, slug):
+        cursor = conn.cursor()
+        cursor.execute('SELECT shard, COUNT(*) FROM gruplar GROUP BY shard')
+        counts = dict(cursor.fetchall())
+        names = db.shard_names()
+        return min(names, key=lambda name: (counts.get(name, 0), names.index(name)))
+
+
+class HashRouter:
+    """crc32(slug) % shard sayısı - dizin olmadan da bulunabilen yerleşim; shard sayısı değişmemeli"""
+
+    def assign(self, conn, slug):
+        names = db.shard_names()
+        return names[zlib.crc32(slug.encode('utf-8')) % len(names)]
+
+
+ROUTERS = {'directory': DirectoryRouter, 'hash': HashRouter}
+
+
+def create_router(name=SHARD_ROUTER):
+    try:
+        return ROUTERS[name]()
+    except KeyError:
+        raise ValueError(f'Desteklenmeyen SHARD_ROUTER: {name}')
+
+
+router = create_router()
+
+# slug -> Tenant; gruplar silinmez ve shard değiştirmez, bu yüzden process ömrü boyunca tutulur
+_directory = {DEFAULT_SLUG: DEFAULT}
+_directory_lock = threading.Lock()
+# slug -> bu zamana kadar (monotonic) bulunamadı sayılır; bilinmeyen adresler her istekte sorgu çalıştırmasın
+_misses = {}
+
+_COLUMNS = 'id, slug, isim, shard'
+
+
+def lookup(slug):
+    """Slug'ın grubu, yoksa None; sonuç process içinde cache'lenir (bulunamayanlar TENANT_MISS_TTL kadar)
+
+    Başka bir process'te oluşturulan grup, bu process'te en geç TENANT_MISS_TTL sonra bulunur.
+    """
+    tenant = _directory.get(slug)
+    if tenant is not None:
+        return tenant
+    if not SLUG_PATTERN.match(slug or ''):
+        return None
+    expires = _misses.get(slug)
+    if expires is not None and time.monotonic() < expires:
+        return None
+    with db.connection(db.DEFAULT_SHARD) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {_COLUMNS} FROM gruplar WHERE slug = ?', (slug,))
+        row = cursor.fetchone()
+    if row is None:
+        with _directory_lock:
+            # Rastgele adreslerle büyümesin: sınırı aşınca baştan başlar
+            if len(_misses) >= TENANT_MISS_MAX:
+                _misses.clear()
+            _misses[slug] = time.monotonic() + TENANT_MISS_TTL
+        return None
+    tenant = Tenant(*row)
+    with _directory_lock:
+        _directory[slug] = tenant
+    return tenant
+
+
+def all_tenants():
+    """Dizindeki tüm gruplar, id sırasıyla"""
+    with db.connection(db.DEFAULT_SHARD) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {_COLUMNS} FROM gruplar ORDER BY id')
+        return [Tenant(*row) for row in cursor.fetchall()]
+
+
+def in_shard(shard, conn=None):
+    """Shard'daki gruplar (shard genelindeki işlerden sonra grup cache'lerini geçersiz kılmak için)
+
+    conn varsayılan shard'ın bağlantısıysa (istekte tutulan) o kullanılır, havuzdan ikinci bağlantı alınmaz.
+    """
+    if conn is None or conn.pool.name != db.DEFAULT_SHARD:
+        with db.connection(db.DEFAULT_SHARD) as own:
+            return in_shard(shard, own)
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {_COLUMNS} FROM gruplar WHERE shard = ? ORDER BY id', (shard,))
+    return [Tenant(*row) for row in cursor.fetchall()]
+
+
+def create(slug, isim=None, shard=None):
+    """Yeni grup oluşturur; shard verilmezse SHARD_ROUTER seçer"""
+    slug = (slug or '').strip().lower()
+    if not SLUG_PATTERN.match(slug):
+        raise TenantError('Grup adı 2-40 karakter olmalı; küçük harf, rakam ve tire içerebilir')
+    if shard is not None:
+        db.pool_for(shard)
+    with db.connection(db.DEFAULT_SHARD) as conn:
+        cursor = conn.cursor()
+        try:
+            if conn.is_postgres:
+                # Aynı anda oluşturulan gruplar aynı yük sayımıyla aynı shard'a yığılmasın
+                cursor.execute('LOCK TABLE gruplar IN SHARE ROW EXCLUSIVE MODE')
+            else:
+                cursor.execute('BEGIN IMMEDIATE')
+            shard = shard or router.assign(conn, slug)
+            cursor.execute(f'''
+                INSERT INTO gruplar (slug, isim, shard) VALUES (?, ?, ?)
+                ON CONFLICT (slug) DO NOTHING
+                RETURNING {_COLUMNS}
+            ''', (slug, (isim or '').strip() or slug, shard))
+            row = cursor.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    with _directory_lock:
+        _misses.pop(slug, None)
+    if row is None:
+        raise TenantError(f'"{slug}" grubu zaten var')
+    return Tenant(*row)
+
+
+def split_path(path):
+    """'/g/<slug>/adres' -> (slug, '/adres'); önek yoksa (None, path)"""
+    if not path.startswith('/g/'):
+        return None, path
+    slug, sep, rest = path[len('/g/'):].partition('/')
+    return slug, sep + rest
+
+
+def _enter(endpoint, values):
+    slug = values.pop('grup', None) if values else None
+    tenant = DEFAULT if slug is None else lookup(slug)
+    if tenant is None:
+        abort(404)
+    g.tenant_tokens = _activate(tenant)
+
+
+def _add_group(endpoint, values):
+    tenant = current()
+    if (tenant.slug != DEFAULT_SLUG and 'grup' not in values
+            and current_app.url_map.is_endpoint_expecting(endpoint, 'grup')):
+        values['grup'] = tenant.slug
+
+
+def _leave(exc=None):
+    tokens = g.pop('tenant_tokens', None)
+    if tokens is not None:
+        _deactivate(tokens)
+
+
+def init_app(app):
+    """Tüm route'ları /g/<grup> önekiyle de bağlar; istekte grubu ve shard'ını seçer, url_for'a grubu ekler
+
+    Route'lardan sonra çağrılmalı. url_for önekli kuralı sadece grup değeri varken seçer.
+    """
+    for rule in list(app.url_map.iter_rules()):
+        if rule.endpoint in GLOBAL_ENDPOINTS:
+            continue
+        app.add_url_rule(URL_PREFIX + rule.rule, rule.endpoint, methods=rule.methods,
+                         provide_automatic_options=getattr(rule, 'provide_automatic_options', None))
+    app.url_value_preprocessor(_enter)
+    app.url_defaults(_add_group)
+    app.teardown_request(_leave)
+    app.context_processor(lambda: {'tenant': current()})
@@ -0,0 +1,56 @@
+"""Testler için ortak kurulum - modüller import edilmeden önce geçici SQLite veritabanı seçilir"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix='kufur-test-')
+os.environ['SQLITE_PATH'] = os.path.join(_TMP_DIR, 'test.db')
+for _name in ('DATABASE_URL', 'DATABASE_READ_URL', 'SHARED_STORE_URL', 'HISTORY_JOURNAL_DIR'):
+    os.environ.pop(_name, None)
+os.environ['HISTORY_WRITE_MODE'] = 'sync'
+os.environ['ASSETS_AUTO_BUILD'] = '0'
+
+import pytest
+
+import db
+import migrations
+import roster
+from cache import leaderboards
+
+# Testler arasında boşaltılan tablolar (bağlı satırlar önce)
+TABLES = ('challenges', 'kufur_gecmisi', 'kufur_gunluk', 'azaltma_gunluk', 'kullanicilar')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def schema():
+    migrations.run()
+
+
+def empty_tables(conn):
+    for table in TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    conn.commit()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    yield
+    for shard in db.shard_names():
+        leaderboards.invalidate_shard(shard)
+        with db.connection(shard) as conn:
+            empty_tables(conn)
+
+
+@pytest.fixture
+def conn():
+    with db.connection() as conn:
+        yield conn
+
+
+def add_user(conn, isim, grup_id=1):
+    """Test kullanıcısı ekler; id"""
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO kullanicilar (grup_id, isim, isim_arama) VALUES (?, ?, ?) RETURNING id',
+                   (grup_id, isim, roster.search_key(isim)))
+    kullanici_id = cursor.fetchone()[0]
+    conn.commit()
+    return kullanici_id
@@ -0,0 +1,118 @@
+"""Sayaç yazmalarının kabul kontrolü: token bucket'lar ve tıklama birleştirme"""
+import threading
+import time
+
+import pytest
+
+import admission
+import app as web
+import store
+import tenants
+from tests.conftest import add_user
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    gate = admission.Admission(shared_store=store.MemoryStore(), window=0.2)
+    monkeypatch.setattr(admission, 'gate', gate)
+    monkeypatch.setattr(admission, 'ADMISSION_IP_RATE', 1)
+    monkeypatch.setattr(admission, 'ADMISSION_IP_BURST', 3)
+    monkeypatch.setattr(admission, 'ADMISSION_USER_RATE', 1)
+    monkeypatch.setattr(admission, 'ADMISSION_USER_BURST', 2)
+    return gate
+
+
+def test_ip_bucket_rejects_after_burst(gate):
+    for kullanici_id in (1, 2, 3):
+        gate.admit('10.0.0.1', kullanici_id)
+    with pytest.raises(admission.Rejected) as rejected:
+        gate.admit('10.0.0.1', 4)
+    assert 0 < rejected.value.retry_after <= 1
+    # Başka IP'nin kovası ayrı
+    gate.admit('10.0.0.2', 4)
+    assert gate.stats()['rejected_ip'] == 1
+
+
+def test_user_bucket_is_per_tenant(gate):
+    gate.admit('10.0.0.1', 7)
+    gate.admit('10.0.0.2', 7)
+    with pytest.raises(admission.Rejected):
+        gate.admit('10.0.0.3', 7)
+    # Başka grupta aynı id başka kullanıcıdır
+    with tenants.use(tenants.Tenant(99, 'baska', 'Başka', tenants.DEFAULT.shard)):
+        gate.admit('10.0.0.3', 7)
+    assert gate.stats()['rejected_user'] == 1
+
+
+def test_disabled_limits_admit_everything(gate, monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_IP_RATE', 0)
+    monkeypatch.setattr(admission, 'ADMISSION_USER_RATE', 0)
+    for _ in range(10):
+        gate.admit('10.0.0.1', 1)
+    assert gate.stats()['admitted'] == 10
+
+
+def test_coalesce_merges_clicks_in_window(gate):
+    applied = []
+    results = []
+
+    def click():
+        results.append(gate.coalesce('user:1', lambda count: applied.append(count) or count))
+
+    threads = [threading.Thread(target=click) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert applied == [5]
+    assert results == [(5, 5)] * 5
+    assert gate.stats()['batches'] == 1
+    assert gate.stats()['pending'] == 0
+
+
+def test_coalesce_without_window_applies_each_click():
+    gate = admission.Admission(shared_store=store.MemoryStore(), window=0)
+    assert gate.coalesce('user:1', lambda count: count) == (1, 1)
+    assert gate.stats()['batches'] == 0
+
+
+def test_api_returns_429_with_retry_after(conn, gate, monkeypatch):
+    monkeypatch.setattr(gate, 'window', 0)
+    monkeypatch.setattr(web, 'is_office_hours', lambda: True)
+    kullanici_id = add_user(conn, 'Ayşe')
+    client = web.app.test_client()
+    statuses = [client.post(f'/api/kullanicilar/{kullanici_id}/kufur_ekle').status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.post(f'/api/kullanicilar/{kullanici_id}/kufur_ekle')
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_prefetch_is_refused(conn, gate):
+    kullanici_id = add_user(conn, 'Ayşe')
+    response = web.app.test_client().get(f'/kufur_ekle/{kullanici_id}', headers={'Sec-Purpose': 'prefetch'})
+    assert response.status_code == 503
+    assert gate.stats()['prefetch_refused'] == 1
+
+
+def test_messages_follow_counter_constants(conn, gate, monkeypatch):
+    monkeypatch.setattr(gate, 'window', 0)
+    monkeypatch.setattr(web, 'is_office_hours', lambda: True)
+    monkeypatch.setattr(admission, 'ADMISSION_USER_BURST', 10)
+    kullanici_id = add_user(conn, 'Ayşe')
+    client = web.app.test_client()
+    eklendi = client.post(f'/api/kullanicilar/{kullanici_id}/kufur_ekle').get_json()['message']
+    azaltildi = client.post(f'/api/kullanicilar/{kullanici_id}/kufur_azalt').get_json()['message']
+    assert eklendi.startswith('🤬 Küfür eklendi! +10 TL, -5 XP')
+    assert azaltildi.startswith('😇 Küfür azaltıldı! -10 TL, +10 XP')
+
+
+def test_coalesced_message_scales_constants(conn, monkeypatch):
+    monkeypatch.setattr(web, 'is_office_hours', lambda: True)
+    monkeypatch.setattr(admission.gate, 'coalesce', lambda key, apply: (apply(3), 3))
+    monkeypatch.setattr(admission.gate, 'admit', lambda ip_adresi, kullanici_id: None)
+    kullanici_id = add_user(conn, 'Ayşe')
+    with web.app.test_request_context('/'):
+        _, message, _ = web.add_curse(kullanici_id)
+    assert message.startswith('🤬 3 küfür eklendi! +30 TL, -15 XP')
@@ -0,0 +1,26 @@
+"""ASGI scope'undan WSGI environ'a başlık aktarımı"""
+import asgi
+
+
+def _scope(headers):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': '/',
+        'query_string': b'',
+        'http_version': '1.1',
+        'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+def test_split_cookie_headers_are_joined_as_one_cookie_header():
+    environ = asgi.wsgi_environ(_scope([('cookie', 'session=abc'), ('cookie', 'rw=1')]), b'')
+    assert environ['HTTP_COOKIE'] == 'session=abc; rw=1'
+
+
+def test_other_repeated_headers_are_comma_joined():
+    environ = asgi.wsgi_environ(_scope([('accept', 'text/html'), ('accept', 'application/json'),
+                                        ('content-type', 'application/json')]), b'{}')
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    assert environ['CONTENT_TYPE'] == 'application/json'
+    assert environ['CONTENT_LENGTH'] == '2'
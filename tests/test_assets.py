@@ -0,0 +1,40 @@
+"""Statik dosya hattı ve istatistik sayfasının sadece birinci parti script yüklemesi"""
+import re
+
+import pytest
+
+import assets
+import counters
+from app import app
+from tests.conftest import add_user
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'stats.js').write_bytes(b'// grafik\n' * 200)
+    monkeypatch.setattr(assets, 'STATIC_DIR', str(tmp_path))
+    monkeypatch.setattr(assets, 'DIST_DIR', str(tmp_path / 'dist'))
+    monkeypatch.setattr(assets, 'MANIFEST_PATH', str(tmp_path / 'dist' / 'manifest.json'))
+    monkeypatch.setattr(assets, 'SOURCES', ('js/stats.js', 'js/eksik.js'))
+    yield tmp_path
+    assets.load()
+
+
+def test_build_fingerprints_and_compresses(static_dir):
+    entries = assets.build()
+    assert list(entries) == ['js/stats.js']
+    entry = entries['js/stats.js']
+    assert re.fullmatch(r'js/stats\.[0-9a-f]{12}\.js', entry['path'])
+    assert 'gzip' in entry['encodings']
+    assert (static_dir / 'dist' / (entry['path'] + '.gz')).exists()
+    assert assets.version
+
+
+def test_stats_page_loads_only_local_scripts(conn):
+    kullanici_id = add_user(conn, 'Ayşe')
+    counters.apply_curse(conn, kullanici_id)
+    html = app.test_client().get('/stats').get_data(as_text=True)
+    scripts = re.findall(r'<script[^>]*src="([^"]+)"', html)
+    assert scripts and all(src.startswith('/') for src in scripts)
+    assert any('stats' in src for src in scripts)
@@ -0,0 +1,59 @@
+"""Sayaç yazma yolu: eşzamanlı artırmalarda kayıp olmamalı"""
+import threading
+
+import counters
+import db
+from tests.conftest import add_user
+
+THREADS = 8
+CLICKS = 25
+
+
+def test_concurrent_curses_lose_no_increments(conn):
+    kullanici_id = add_user(conn, 'Hedef')
+    errors = []
+
+    def hammer():
+        try:
+            with db.connection() as own:
+                for _ in range(CLICKS):
+                    counters.apply_curse(own, kullanici_id, ip_adresi='127.0.0.1')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    cursor = conn.cursor()
+    cursor.execute('SELECT kufur_sayisi, toplam_para FROM kullanicilar WHERE id = ?', (kullanici_id,))
+    kufur_sayisi, toplam_para = cursor.fetchone()
+    assert kufur_sayisi == THREADS * CLICKS
+    assert toplam_para == counters.KUFUR_PARA * THREADS * CLICKS
+    cursor.execute('SELECT COUNT(*) FROM kufur_gecmisi WHERE kullanici_id = ?', (kullanici_id,))
+    assert cursor.fetchone()[0] == THREADS * CLICKS
+    cursor.execute('SELECT SUM(sayi) FROM kufur_gunluk WHERE kullanici_id = ?', (kullanici_id,))
+    assert cursor.fetchone()[0] == THREADS * CLICKS
+
+
+def test_coalesced_count_is_applied_once(conn):
+    kullanici_id = add_user(conn, 'Toplu')
+    result = counters.apply_curse(conn, kullanici_id, count=3)
+    assert result['row'][2] == 3
+    assert result['row'][3] == 3 * counters.KUFUR_PARA
+
+
+def test_uncurse_does_not_go_below_zero(conn):
+    kullanici_id = add_user(conn, 'Temiz')
+    counters.apply_curse(conn, kullanici_id)
+    result = counters.apply_uncurse(conn, kullanici_id, count=5)
+    assert result['row'][2] == 0
+    assert result['row'][3] == 0
+
+
+def test_unknown_user_returns_none(conn):
+    assert counters.apply_curse(conn, 999999) is None
+    assert counters.apply_uncurse(conn, 999999) is None
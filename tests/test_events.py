@@ -0,0 +1,42 @@
+"""Canlı güncellemeler: grup ayrımı ve thread tutan SSE bağlantılarının sınırı"""
+import pytest
+
+import events
+
+
+@pytest.fixture
+def broker():
+    return events.EventBroker(coalesce_interval=0, max_subscribers=10, max_thread_subscribers=2)
+
+
+def test_thread_subscribers_are_capped_separately(broker):
+    first = broker.subscribe('varsayilan:1', holds_thread=True)
+    broker.subscribe('varsayilan:1', holds_thread=True)
+    with pytest.raises(events.TooManySubscribers):
+        broker.subscribe('varsayilan:1', holds_thread=True)
+    # Event loop'ta bekleyen (ASGI) aboneler thread tutmaz
+    broker.subscribe('varsayilan:1')
+    assert broker.stats()['thread_subscribers'] == 2
+
+    broker.unsubscribe(first)
+    broker.subscribe('varsayilan:1', holds_thread=True)
+
+
+def test_total_subscriber_cap(broker):
+    for _ in range(10):
+        broker.subscribe('varsayilan:1')
+    with pytest.raises(events.TooManySubscribers):
+        broker.subscribe('varsayilan:1')
+
+
+def test_events_reach_only_their_group(broker):
+    own = broker.subscribe('varsayilan:1')
+    other = broker.subscribe('varsayilan:2')
+    broker.publish('kullanici', {'id': 1}, key='kullanici:1', tenant_key='varsayilan:1')
+    chunk = own.next(2)
+    assert chunk.startswith(b'event: kullanici\n')
+    assert other.next(0.3) is None
+
+
+def test_default_thread_cap_leaves_threads_for_requests():
+    assert 1 <= events.EVENTS_MAX_THREAD_SUBSCRIBERS < events.db.WEB_THREADS
@@ -0,0 +1,86 @@
+"""Geçmiş tamponu: toplu yazma, journal replay ve silinen kullanıcıların olayları"""
+import json
+import os
+
+import db
+import history
+from tests.conftest import add_user
+
+
+def history_count(conn, kullanici_id=None):
+    cursor = conn.cursor()
+    if kullanici_id is None:
+        cursor.execute('SELECT COUNT(*) FROM kufur_gecmisi')
+    else:
+        cursor.execute('SELECT COUNT(*) FROM kufur_gecmisi WHERE kullanici_id = ?', (kullanici_id,))
+    return cursor.fetchone()[0]
+
+
+def delete_user_row(conn, kullanici_id):
+    conn.execute('DELETE FROM kullanicilar WHERE id = ?', (kullanici_id,))
+    conn.commit()
+
+
+def test_flush_writes_pending_events(conn, tmp_path):
+    kullanici_id = add_user(conn, 'Ali')
+    buffer = history.HistoryBuffer(flush_size=1000, flush_interval=60, journal_dir=str(tmp_path))
+    for _ in range(3):
+        buffer.add(history.new_event(1, kullanici_id, '127.0.0.1'))
+    assert buffer.flush() == 3
+    assert history_count(conn, kullanici_id) == 3
+    assert buffer.stats()['pending'] == 0
+    # Yazılan olaylar journal'dan çıkar; tekrar flush bir şey yazmaz
+    assert os.path.getsize(tmp_path / f'{os.getpid()}.ndjson') == 0
+    assert buffer.flush() == 0
+
+
+def test_flush_skips_deleted_user_instead_of_failing(conn):
+    kalan = add_user(conn, 'Kalan')
+    silinen = add_user(conn, 'Silinen')
+    buffer = history.HistoryBuffer(flush_size=1000, flush_interval=60, journal_dir=None)
+    buffer.add(history.new_event(1, kalan, None))
+    buffer.add(history.new_event(1, silinen, None))
+    delete_user_row(conn, silinen)
+
+    assert buffer.flush() == 2
+    assert history_count(conn, kalan) == 1
+    assert history_count(conn, silinen) == 0
+    assert buffer.stats()['errors'] == 0
+    assert buffer.stats()['pending'] == 0
+
+
+def test_discard_drops_only_that_users_events(conn, tmp_path):
+    kalan = add_user(conn, 'Kalan')
+    silinen = add_user(conn, 'Silinen')
+    buffer = history.HistoryBuffer(flush_size=1000, flush_interval=60, journal_dir=str(tmp_path))
+    buffer.add(history.new_event(1, silinen, None))
+    buffer.add(history.new_event(1, kalan, None))
+    buffer.add(history.new_event(1, silinen, None))
+    # Başka gruptaki aynı kimlik etkilenmez
+    buffer.add(history.new_event(2, silinen, None))
+
+    assert buffer.discard(1, silinen) == 2
+    assert buffer.stats()['pending'] == 2
+    with open(tmp_path / f'{os.getpid()}.ndjson', encoding='utf-8') as journal:
+        kept = [json.loads(line)[1] for line in journal]
+    assert [(event[0], event[1]) for event in kept] == [(1, kalan), (2, silinen)]
+
+
+def test_replay_writes_journal_and_skips_deleted_users(conn, tmp_path):
+    kalan = add_user(conn, 'Kalan')
+    silinen = add_user(conn, 'Silinen')
+    events = [history.new_event(1, kalan, None), history.new_event(1, silinen, None)]
+    with open(tmp_path / '999999.ndjson', 'w', encoding='utf-8') as journal:
+        for event in events:
+            journal.write(json.dumps([db.DEFAULT_SHARD, event]) + '\n')
+        # Grupsuz eski biçim varsayılan gruba yazılır
+        journal.write(json.dumps(list(history.new_event(1, kalan, None)[1:])) + '\n')
+    delete_user_row(conn, silinen)
+
+    assert history.replay_journals(str(tmp_path)) == 3
+    assert history_count(conn, kalan) == 2
+    assert history_count(conn) == 2
+    assert not os.listdir(tmp_path)
+    # Aynı olaylar tekrar yazılırsa olay_id sayesinde çoğalmaz
+    history.write_by_shard([(db.DEFAULT_SHARD, events[0])])
+    assert history_count(conn, kalan) == 2
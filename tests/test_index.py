@@ -0,0 +1,19 @@
+"""Ana sayfa gthread modunda isteğin tek bağlantısıyla render edilmeli"""
+import re
+
+import aiodb
+from app import app
+from tests.conftest import add_user
+
+
+def test_index_renders_on_one_connection(conn):
+    add_user(conn, 'Ayşe')
+    add_user(conn, 'Mehmet')
+    assert not aiodb.native()
+
+    # Arama parametresi sayfa cache'ini atlatır: sorgular gerçekten çalışır
+    response = app.test_client().get('/?q=ay')
+    assert response.status_code == 200
+    assert 'Ayşe' in response.get_data(as_text=True)
+    checkouts = re.search(r'(\d+) checkouts', response.headers['Server-Timing'])
+    assert checkouts.group(1) == '1'
@@ -0,0 +1,34 @@
+"""/metrics erişim anahtarı ve shard başına havuz metrikleri"""
+import pytest
+
+import db
+import metrics
+from app import app
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'gizli')
+    return 'gizli'
+
+
+def test_metrics_closed_without_token(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', None)
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_requires_token(token):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer yanlis'}).status_code == 401
+
+
+def test_metrics_report_every_shard_pool(token, tmp_path, monkeypatch):
+    monkeypatch.setitem(db.shards, 'ikinci', db.ConnectionPool(f'sqlite:///{tmp_path / "ikinci.db"}',
+                                                               name='ikinci', max_size=3))
+    response = app.test_client().get('/metrics', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    max_sizes = [line for line in lines if line.startswith('kufur_db_pool_max_size{')]
+    assert any('shard="varsayilan"' in line for line in max_sizes)
+    assert any('shard="ikinci"' in line and line.endswith(' 3') for line in max_sizes)
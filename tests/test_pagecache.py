@@ -0,0 +1,26 @@
+"""Sayfa sürümleri ve sürüm yaşı grup başına tutulur"""
+import time
+
+import pagecache
+import store
+
+
+def test_versions_are_per_tenant():
+    shared = store.MemoryStore()
+    pagecache.bump(shared, 'varsayilan:1')
+    pagecache.bump(shared, 'varsayilan:1')
+    pagecache.bump(shared, 'ikinci:2')
+    assert pagecache.data_version(shared, 'varsayilan:1') == 2
+    assert pagecache.data_version(shared, 'ikinci:2') == 1
+    assert pagecache.data_version(shared, 'varsayilan:3') == 0
+
+
+def test_version_age_is_tracked_per_tenant():
+    assert pagecache.version_age(5, 'test:a') < 0.05
+    time.sleep(0.1)
+    # Başka grubun isteği a'nın yaşını sıfırlamaz
+    pagecache.version_age(1, 'test:b')
+    assert pagecache.version_age(5, 'test:a') >= 0.1
+    assert pagecache.version_age(2, 'test:b') < 0.05
+    # Yeni sürüm yaşı sıfırlar
+    assert pagecache.version_age(6, 'test:a') < 0.05
@@ -0,0 +1,49 @@
+"""Seviye ve rozet tabloları paylaşılır: sonuçlar değiştirilememeli, memo bozulmamalı"""
+import pytest
+
+import profiles
+from badges import calculate_badges
+from levels import LEVELS, get_level_info
+
+
+def test_level_table_is_read_only():
+    with pytest.raises(TypeError):
+        LEVELS[-1]['name'] = 'Bozuk'
+    with pytest.raises(TypeError):
+        get_level_info(10**7)['name'] = 'Bozuk'
+    assert get_level_info(10**7)['name'] == 'Efsane'
+
+
+def test_level_progress():
+    info = get_level_info(175)
+    assert info['level'] == 2
+    assert info['progress'] == 50.0
+    with pytest.raises(TypeError):
+        info['progress'] = 0
+
+
+def test_badges_are_read_only():
+    badges = calculate_badges(60, 600, 8)
+    assert [badge['name'] for badge in badges] == ['Küfür Kralı', 'Borç Kralı', 'Haftalık Streak']
+    with pytest.raises(TypeError):
+        badges[0]['name'] = 'Bozuk'
+
+
+def test_memoized_details_cannot_be_changed_by_callers():
+    row = (1, 'Ali', 0, 0.0, 120, 2, '😊', 0, None)
+    first = profiles.details(row)
+    with pytest.raises(TypeError):
+        first['level_info']['progress'] = 0
+    with pytest.raises((TypeError, AttributeError)):
+        first['badges'].append({'name': 'Sahte'})
+    second = profiles.details(row)
+    assert second['level_info']['progress'] == first['level_info']['progress']
+    assert [badge['name'] for badge in second['badges']] == ['Temiz Dil']
+
+
+def test_batch_matches_per_user():
+    rows = profiles._synthetic_roster(300)
+    for details in profiles.roster_details(rows):
+        row = details['data']
+        assert details['level_info'] == get_level_info(row[4])
+        assert list(details['badges']) == calculate_badges(row[2], row[3], row[7])
@@ -0,0 +1,37 @@
+"""Saklama işi sadece süre tanımlıyken ve istek alan süreçte başlamalı"""
+import threading
+
+import pytest
+
+import retention
+from app import app
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(retention.job, 'start', lambda: calls.append(True))
+    return calls
+
+
+def test_import_does_not_start_job():
+    assert 'history-retention' not in [thread.name for thread in threading.enumerate()]
+
+
+def test_request_skips_job_without_retention_days(started, monkeypatch):
+    monkeypatch.setattr(retention, 'HISTORY_RETENTION_DAYS', 0)
+    app.test_client().get('/api/kullanicilar')
+    assert started == []
+
+
+def test_request_starts_job_with_retention_days(started, monkeypatch):
+    monkeypatch.setattr(retention, 'HISTORY_RETENTION_DAYS', 30)
+    app.test_client().get('/api/kullanicilar')
+    assert started == [True]
+
+
+def test_schedule_can_be_disabled(started, monkeypatch):
+    monkeypatch.setattr(retention, 'HISTORY_RETENTION_DAYS', 30)
+    monkeypatch.setattr(retention, 'RETENTION_SCHEDULE', False)
+    retention.schedule()
+    assert started == []
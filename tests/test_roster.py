@@ -0,0 +1,84 @@
+"""Kullanıcı listesi: keyset sayfalama ve Türkçe harflerle isim araması"""
+import pytest
+
+import roster
+from tests.conftest import add_user
+
+
+def set_scores(conn, kullanici_id, xp, kufur_sayisi):
+    conn.execute('UPDATE kullanicilar SET xp = ?, kufur_sayisi = ? WHERE id = ?', (xp, kufur_sayisi, kullanici_id))
+    conn.commit()
+
+
+@pytest.fixture
+def users(conn):
+    # (xp, kufur_sayisi) eşitlikleri id ile ayrılır
+    scores = [(50, 1), (50, 3), (40, 0), (40, 0), (30, 9), (20, 2), (10, 0)]
+    ids = []
+    for i, (xp, kufur_sayisi) in enumerate(scores):
+        kullanici_id = add_user(conn, f'Kullanıcı {i}')
+        set_scores(conn, kullanici_id, xp, kufur_sayisi)
+        ids.append(kullanici_id)
+    # Başka grubun kullanıcısı listede görünmez
+    add_user(conn, 'Yabancı', grup_id=2)
+    return ids
+
+
+def names(page):
+    return [row[1] for row in page.rows]
+
+
+def test_pages_forward_and_back_without_gaps(conn, users):
+    expected = ['Kullanıcı 1', 'Kullanıcı 0', 'Kullanıcı 2', 'Kullanıcı 3', 'Kullanıcı 4', 'Kullanıcı 5',
+                'Kullanıcı 6']
+    seen, cursor, pages = [], None, []
+    while True:
+        page = roster.page(conn, 1, after=cursor, limit=3)
+        pages.append(page)
+        seen.extend(names(page))
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+    assert seen == expected
+    assert [len(page.rows) for page in pages] == [3, 3, 1]
+    assert pages[0].prev_cursor is None
+
+    back = roster.page(conn, 1, before=pages[2].prev_cursor, limit=3)
+    assert names(back) == names(pages[1])
+    assert back.next_cursor == pages[1].next_cursor
+
+
+def test_invalid_cursor_and_limit():
+    with pytest.raises(roster.CursorError):
+        roster.decode_cursor('abc')
+    with pytest.raises(roster.CursorError):
+        roster.page_size('0')
+    assert roster.page_size('1000') == roster.MAX_PAGE_SIZE
+    assert roster.page_size(None) == roster.ROSTER_PAGE_SIZE
+
+
+@pytest.mark.parametrize('isim, arama', [
+    ('ŞEYMA', 'şeyma'),
+    ('şeyma', 'ŞEY'),
+    ('Çağrı ÖZÜDOĞRU', 'özüdoğru'),
+    ('İPEK', 'ipek'),
+    ('ipek', 'İPEK'),
+    ('IŞIK', 'ışık'),
+    ('Işıl', 'işil'),
+    ('Ali', 'ALİ'),
+])
+def test_search_ignores_turkish_case(conn, isim, arama):
+    add_user(conn, isim)
+    add_user(conn, 'Başka')
+    assert names(roster.page(conn, 1, search=arama)) == [isim]
+
+
+def test_search_escapes_like_wildcards(conn):
+    add_user(conn, '100%_doğru')
+    add_user(conn, '100 kere')
+    assert names(roster.page(conn, 1, search='0%_')) == ['100%_doğru']
+
+
+def test_search_is_scoped_to_group(conn, users):
+    assert names(roster.page(conn, 1, search='yabancı')) == []
+    assert names(roster.page(conn, 2, search='yabancı')) == ['Yabancı']
@@ -0,0 +1,35 @@
+"""Gün sonu işleri istekte tutulan bağlantıdan başka havuz bağlantısı almamalı"""
+from datetime import timedelta
+
+import pytest
+
+import db
+import rollup
+import rules
+from tests.conftest import add_user
+
+
+@pytest.fixture
+def gun_sonu(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT baslangic, kapanan_gun FROM gun_sonu WHERE id = 1')
+    saved = cursor.fetchone()
+    yield
+    conn.execute('UPDATE gun_sonu SET baslangic = ?, kapanan_gun = ? WHERE id = 1', saved)
+    conn.commit()
+
+
+def test_close_pending_days_uses_one_connection(conn, gun_sonu, monkeypatch):
+    add_user(conn, 'Temiz')
+    today = rollup.today()
+    conn.execute('UPDATE gun_sonu SET baslangic = ?, kapanan_gun = NULL WHERE id = 1',
+                 (today - timedelta(days=2),))
+    conn.commit()
+
+    # Tek bağlantılık havuz: iç içe ikinci bir bağlantı istenirse PoolTimeout
+    single = db.ConnectionPool(f'sqlite:///{db.SQLITE_PATH}', max_size=1, timeout=0.2)
+    monkeypatch.setitem(db.shards, db.DEFAULT_SHARD, single)
+    with db.connection() as held:
+        days, _ = rules.close_pending_days(held, today)
+    assert days == 2
+    assert single.stats()['size'] == 1
@@ -0,0 +1,89 @@
+"""Token bucket depoları - bellek, SQLite dosyası ve (TEST_REDIS_URL verilirse) Redis aynı sonucu vermeli"""
+import os
+import time
+import uuid
+
+import pytest
+
+import store
+
+# Örn. redis://localhost:6379/15; anahtarlar rastgele adlı, kısa ömürlü
+TEST_REDIS_URL = os.getenv('TEST_REDIS_URL')
+
+
+@pytest.fixture(params=['memory', 'file', 'redis'])
+def bucket_store(request, tmp_path):
+    if request.param == 'memory':
+        return store.MemoryStore()
+    if request.param == 'file':
+        return store.FileStore(str(tmp_path / 'store.db'))
+    if not TEST_REDIS_URL or not store.REDIS_AVAILABLE:
+        pytest.skip('Redis testi için TEST_REDIS_URL ve redis paketi gerekli')
+    # Lua betiği (RedisStore.TAKE_SCRIPT) gerçek sunucuda çalışır
+    return store.create_store(TEST_REDIS_URL)
+
+
+def _key():
+    return f'test:bucket:{uuid.uuid4().hex}'
+
+
+def test_refill_starts_full_and_consumes():
+    assert store.refill(None, 100.0, rate=1, burst=3, cost=1) == (True, 2)
+
+
+def test_refill_adds_elapsed_tokens_up_to_burst():
+    assert store.refill((0.5, 100.0), 100.25, rate=2, burst=3, cost=1) == (True, 0.0)
+    assert store.refill((0.0, 100.0), 200.0, rate=2, burst=3, cost=1) == (True, 2)
+
+
+def test_refill_rejects_without_consuming():
+    assert store.refill((0.5, 100.0), 100.0, rate=1, burst=3, cost=1) == (False, 0.5)
+
+
+def test_refill_ignores_clock_going_back():
+    assert store.refill((0.5, 100.0), 99.0, rate=1, burst=3, cost=1) == (False, 0.5)
+
+
+def test_bucket_allows_burst_then_rejects(bucket_store):
+    key = _key()
+    results = [bucket_store.take(key, 0.001, 3) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[2][1] == pytest.approx(0, abs=0.01)
+    bucket_store.delete(key)
+
+
+def test_bucket_refills_over_time(bucket_store):
+    key = _key()
+    assert bucket_store.take(key, 20, 1)[0]
+    assert not bucket_store.take(key, 20, 1)[0]
+    time.sleep(0.1)
+    assert bucket_store.take(key, 20, 1)[0]
+    bucket_store.delete(key)
+
+
+def test_buckets_are_separate(bucket_store):
+    first, second = _key(), _key()
+    assert bucket_store.take(first, 0.001, 1)[0]
+    assert not bucket_store.take(first, 0.001, 1)[0]
+    assert bucket_store.take(second, 0.001, 1)[0]
+
+
+class FakeScript:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        return self.result
+
+
+def test_redis_take_passes_script_arguments_and_parses_result():
+    # Sunucu olmadan: betiğe giden anahtar/argüman sırası ve dönen [izin, "token"] çevrimi
+    redis_store = object.__new__(store.RedisStore)
+    redis_store._take = FakeScript([1, '2.5'])
+    assert redis_store.take('admission:ip:1', 5, 20, cost=2) == (True, 2.5)
+    assert redis_store._take.calls == [(['admission:ip:1'], [5, 20, 2])]
+    redis_store._take.result = [0, '0.25']
+    assert redis_store.take('admission:ip:1', 5, 20) == (False, 0.25)
+
@@ -0,0 +1,76 @@
+"""Grup (tenant) kapsamı ve grup dizini cache'i"""
+import uuid
+
+import pytest
+
+import db
+import tenants
+from app import app
+from tests.conftest import add_user
+
+
+def _slug():
+    return f'test-{uuid.uuid4().hex[:12]}'
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Grup dizinine giden sorgu sayısı"""
+    calls = []
+    connection = db.connection
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return connection(*args, **kwargs)
+
+    monkeypatch.setattr(tenants.db, 'connection', counting)
+    return calls
+
+
+@pytest.fixture
+def group():
+    return tenants.create(_slug(), 'Test Grubu')
+
+
+def test_unknown_slug_is_cached_until_created(lookups):
+    slug = _slug()
+    assert tenants.lookup(slug) is None
+    assert tenants.lookup(slug) is None
+    assert len(lookups) == 1
+
+    created = tenants.create(slug)
+    assert tenants.lookup(slug) == created
+
+
+def test_unknown_slug_expires(lookups, monkeypatch):
+    monkeypatch.setattr(tenants, 'TENANT_MISS_TTL', 0)
+    slug = _slug()
+    assert tenants.lookup(slug) is None
+    assert tenants.lookup(slug) is None
+    assert len(lookups) == 2
+
+
+def test_invalid_slug_skips_query(lookups):
+    assert tenants.lookup('Geçersiz Ad') is None
+    assert lookups == []
+
+
+def test_unknown_group_route_is_404():
+    assert app.test_client().get(f'/g/{_slug()}/api/kullanicilar').status_code == 404
+
+
+def test_group_routes_are_scoped(conn, group):
+    varsayilan = add_user(conn, 'Ayşe')
+    client = app.test_client()
+    response = client.post(f'/g/{group.slug}/api/kullanicilar', json={'isim': 'Zeynep'})
+    assert response.status_code == 200
+
+    names = [user['isim'] for user in client.get(f'/g/{group.slug}/api/kullanicilar').get_json()['users']]
+    assert names == ['Zeynep']
+    names = [user['isim'] for user in client.get('/api/kullanicilar').get_json()['users']]
+    assert names == ['Ayşe']
+
+    # Başka grubun kullanıcısı bu grubun adresinden görülemez ve silinemez
+    assert client.get(f'/g/{group.slug}/api/kullanicilar/{varsayilan}').status_code == 404
+    client.delete(f'/g/{group.slug}/api/kullanicilar/{varsayilan}')
+    assert client.get(f'/api/kullanicilar/{varsayilan}').status_code == 200
@@ -0,0 +1,56 @@
+"""Akışlı dışa aktarım istek bağlamındaki grup ve okuma kararını korumalı"""
+import json
+import sqlite3
+
+import pytest
+from flask import g
+
+import db
+import transfer
+from app import app
+from tests.conftest import add_user
+
+
+@pytest.fixture
+def stale_replica(tmp_path, monkeypatch):
+    # Şeması olan ama yeni yazmaları görmemiş bir kopya: replikadan okunursa satır eksik kalır
+    path = tmp_path / 'replica.db'
+    source = sqlite3.connect(db.SQLITE_PATH)
+    target = sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    replica = db.Replica(f'sqlite:///{path}')
+    monkeypatch.setattr(db, 'replica', replica)
+    assert replica.healthy()
+    return replica
+
+
+def _names(chunks):
+    return [json.loads(line)['isim'] for line in b''.join(chunks).decode('utf-8').splitlines()]
+
+
+def test_export_streams_tenant_rows(conn):
+    add_user(conn, 'Ayşe')
+    add_user(conn, 'Başka', grup_id=2)
+    with app.test_request_context('/'):
+        chunks = transfer.export('kullanicilar', 'ndjson', chunk_size=1)
+    assert _names(chunks) == ['Ayşe']
+
+
+def test_export_keeps_read_your_writes_after_context(conn, stale_replica):
+    with app.test_request_context('/'):
+        g.read_primary = True
+        add_user(conn, 'Yeni')
+        chunks = transfer.export('kullanicilar', 'ndjson')
+    # Gövde istek bağlamı kapandıktan sonra okunur
+    assert _names(chunks) == ['Yeni']
+    assert stale_replica.reads == 0
+
+
+def test_export_uses_replica_when_allowed(conn, stale_replica):
+    add_user(conn, 'Yeni')
+    with app.test_request_context('/'):
+        chunks = transfer.export('kullanicilar', 'ndjson')
+    assert _names(chunks) == []
+    assert stale_replica.reads == 1
@@ -0,0 +1,262 @@
+"""Toplu dışa/içe aktarım - kullanicilar ve kufur_gecmisi için akışlı CSV/NDJSON
+
+Dışa ve içe aktarım içinde bulunulan grubun satırlarıyla sınırlıdır (CLI'da --grup).
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import uuid
+from datetime import datetime
+
+import db
+import pagecache
+import rollup
+import roster
+import tenants
+from cache import leaderboard as leaderboard_cache
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '5000'))
+
+COLUMNS = {
+    'kullanicilar': ('id', 'isim', 'kufur_sayisi', 'toplam_para', 'xp', 'level', 'avatar', 'streak',
+                     'last_activity', 'created_at'),
+    'kufur_gecmisi': ('id', 'kullanici_id', 'tarih', 'ip_adresi', 'olay_id'),
+}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# İçe aktarımda eksik sütunların değerleri (şemadaki varsayılanlar)
+USER_DEFAULTS = {'kufur_sayisi': 0, 'toplam_para': 0, 'xp': 0, 'level': 1, 'avatar': '😊', 'streak': 0,
+                 'last_activity': None}
+USER_COLUMNS = ('isim', 'kufur_sayisi', 'toplam_para', 'xp', 'level', 'avatar', 'streak', 'last_activity',
+                'created_at')
+HISTORY_COLUMNS = ('kullanici_id', 'tarih', 'ip_adresi', 'olay_id')
+
+
+class TransferError(ValueError):
+    """Geçersiz tablo, biçim veya içe aktarılan satır"""
+
+
+def _check(table, fmt):
+    if table not in COLUMNS:
+        raise TransferError(f'Bilinmeyen tablo: {table}')
+    if fmt not in FORMATS:
+        raise TransferError(f'Bilinmeyen biçim: {fmt}')
+
+
+def iter_chunks(table, tenant, chunk_size=EXPORT_CHUNK_SIZE, allow_replica=True):
+    """Grubun satırları id sırasıyla, chunk_size'lık listeler halinde; bellek parça boyutuyla sınırlı"""
+    columns = ', '.join(COLUMNS[table])
+    # Sadece okuma: replika tanımlı ve sağlıklıysa ana veritabanı yorulmaz
+    with db.read_connection(tenant.shard, allow_replica) as conn:
+        if conn.is_postgres:
+            # Named (sunucu tarafı) cursor: tek snapshot, satırlar sunucuda kalır ve parça parça çekilir
+            cursor = db.Cursor(conn.raw.cursor(name=f'export_{table}_{uuid.uuid4().hex[:8]}'), conn.dialect)
+            cursor.execute(f'SELECT {columns} FROM {table} WHERE grup_id = ? ORDER BY id', (tenant.id,))
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                cursor.close()
+        else:
+            # SQLite'ta uzun bir okuma yazmaları kilitler: her parça id üzerinden ayrı, kısa bir sorgu
+            last_id = 0
+            while True:
+                cursor = conn.execute(f'SELECT {columns} FROM {table} WHERE grup_id = ? AND id > ? '
+                                      f'ORDER BY id LIMIT ?', (tenant.id, last_id, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    return
+                yield rows
+                last_id = rows[-1][0]
+
+
+def _csv_bytes(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_bytes(columns, rows):
+    return ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + '\n'
+                   for row in rows).encode('utf-8')
+
+
+def export(table, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Grubun tablosunu bayt parçaları halinde üreten generator (akışlı cevap gövdesi veya dosya)"""
+    _check(table, fmt)
+    columns = COLUMNS[table]
+    # Grup ve replika kararı şimdi alınır: akışlı cevap gövdesi istek bağlamı kapandıktan sonra
+    # okunur, o zaman g.read_primary (yeni yazan istemci ana veritabanından okur) görünmez
+    tenant = tenants.current()
+    allow_replica = db.use_replica(tenant.shard)
+
+    def generate():
+        if fmt == 'csv':
+            yield _csv_bytes([columns])
+        for rows in iter_chunks(table, tenant, chunk_size, allow_replica):
+            yield _csv_bytes(rows) if fmt == 'csv' else _ndjson_bytes(columns, rows)
+
+    return generate()
+
+
+def read_records(f, fmt):
+    """Dosyadan sütun adı -> değer sözlükleri (CSV'de boş hücre None)"""
+    if fmt == 'csv':
+        for record in csv.DictReader(f):
+            yield {key: (value if value != '' else None) for key, value in record.items()}
+        return
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise TransferError(f'{number}. satır geçerli JSON değil')
+        if not isinstance(record, dict):
+            raise TransferError(f'{number}. satır bir JSON nesnesi değil')
+        yield record
+
+
+def _now():
+    # Sütun varsayılanı CURRENT_TIMESTAMP ile aynı biçim (UTC)
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _user_row(record):
+    """(id veya None, USER_COLUMNS sırasıyla değerler)"""
+    isim = (record.get('isim') or '').strip()
+    if not isim:
+        raise TransferError(f'isim boş olamaz: {record}')
+    values = [isim]
+    for column in USER_COLUMNS[1:]:
+        value = record.get(column)
+        if value is None:
+            value = _now() if column == 'created_at' else USER_DEFAULTS[column]
+        values.append(value)
+    user_id = record.get('id')
+    return (int(user_id) if user_id is not None else None), tuple(values)
+
+
+def _history_row(record):
+    kullanici_id = record.get('kullanici_id')
+    if kullanici_id is None:
+        raise TransferError(f'kullanici_id boş olamaz: {record}')
+    # olay_id tekrar içe aktarımı zararsız kılar; yoksa yeni olay sayılır
+    return (int(kullanici_id), record.get('tarih') or _now(), record.get('ip_adresi'),
+            record.get('olay_id') or uuid.uuid4().hex)
+
+
+def _insert(conn, table, columns, rows, on_conflict=''):
+    """Satırları ekler (PostgreSQL'de COPY ile); eklenen satır sayısı, çakışanlar atlanır"""
+    if not rows:
+        return 0
+    column_list = ', '.join(columns)
+    if conn.is_postgres:
+        # COPY çakışma atlayamaz: önce geçici tabloya, oradan INSERT ... SELECT
+        staging = f'{table}_import'
+        with conn.raw.cursor() as cursor:
+            cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {staging} '
+                           f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS')
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} {on_conflict}')
+            return cursor.rowcount
+    placeholders = ', '.join('?' * len(columns))
+    cursor = conn.cursor()
+    cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders}) {on_conflict}', rows)
+    return cursor.rowcount
+
+
+def _check_users(conn, grup_id, rows):
+    """Geçmiş satırlarının kullanıcıları bu grupta mı (parça başına tek sorgu)"""
+    user_ids = sorted({row[0] for row in rows})
+    placeholders = ', '.join('?' * len(user_ids))
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT id FROM kullanicilar WHERE grup_id = ? AND id IN ({placeholders})',
+                   (grup_id, *user_ids))
+    missing = set(user_ids) - {row[0] for row in cursor.fetchall()}
+    if missing:
+        raise TransferError(f'Bu grupta olmayan kullanıcılar: {", ".join(map(str, sorted(missing)[:10]))}')
+
+
+def _import_chunk(conn, table, records, grup_id):
+    if table == 'kullanicilar':
+        with_id, without_id = [], []
+        for record in records:
+            user_id, values = _user_row(record)
+            values = (*values, roster.search_key(values[0]))
+            if user_id is None:
+                without_id.append((grup_id, *values))
+            else:
+                with_id.append((user_id, grup_id, *values))
+        # Kimliği olan kullanıcılar korunur (taşıma), var olan kimlikler (başka grupta olsa da) atlanır
+        columns = (*USER_COLUMNS, 'isim_arama')
+        return (_insert(conn, table, ('id', 'grup_id', *columns), with_id, 'ON CONFLICT (id) DO NOTHING') +
+                _insert(conn, table, ('grup_id', *columns), without_id)), bool(with_id)
+    rows = [_history_row(record) for record in records]
+    if rows:
+        _check_users(conn, grup_id, rows)
+    # Hedefsiz: bölümlü kufur_gecmisi'nde benzersiz indeks (olay_id, tarih) üzerinde
+    return _insert(conn, table, ('grup_id', *HISTORY_COLUMNS), [(grup_id, *row) for row in rows],
+                   'ON CONFLICT DO NOTHING'), False
+
+
+def import_records(table, records, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Kayıtları gruba chunk_size'lık transaction'larla yazar; hata olursa önceki parçalar kalır.
+
+    kufur_gecmisi aktarımı kullanıcı sayaçlarını değiştirmez, shard'ın günlük özeti baştan hesaplanır;
+    saklama sınırından (retention) önceki günlerin özeti sıkıştırılmış haliyle kalır.
+    """
+    if table not in COLUMNS:
+        raise TransferError(f'Bilinmeyen tablo: {table}')
+    result = {'read': 0, 'inserted': 0, 'chunks': 0}
+    explicit_ids = False
+    records = iter(records)
+    tenant = tenants.current()
+    with db.connection(tenant.shard) as conn:
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            try:
+                inserted, with_ids = _import_chunk(conn, table, chunk, tenant.id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            explicit_ids = explicit_ids or with_ids
+            result['read'] += len(chunk)
+            result['inserted'] += inserted
+            result['chunks'] += 1
+            if progress:
+                progress(result)
+
+        if explicit_ids and conn.is_postgres:
+            # Elle verilen kimliklerden sonra SERIAL sırası geride kalmasın
+            conn.execute("SELECT setval(pg_get_serial_sequence('kullanicilar', 'id'), "
+                         "(SELECT MAX(id) FROM kullanicilar))")
+            conn.commit()
+        if table == 'kufur_gecmisi' and result['inserted']:
+            result['rollup_rows'] = rollup.backfill(conn)
+
+    result['skipped'] = result['read'] - result['inserted']
+    if result['inserted']:
+        leaderboard_cache.invalidate()
+        pagecache.bump()
+    return result
+
+
+def import_file(table, path, fmt=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """CSV veya NDJSON dosyasını içe aktarır; biçim verilmezse uzantıdan anlaşılır"""
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    _check(table, fmt)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return import_records(table, read_records(f, fmt), chunk_size, progress)
@@ -0,0 +1,113 @@
+"""Zaman aralığına göre küfür trendi - gün/hafta özet tablosundan, saat geçmişten"""
+from datetime import datetime, timedelta
+
+BUCKETS = ('hour', 'day', 'week')
+DEFAULT_DAYS = 7
+MAX_BUCKETS = 1000
+
+# Dialect'e göre zaman kovası ifadeleri
+BUCKET_SQL = {
+    'postgres': {
+        'day': 'gun',
+        'week': "CAST(date_trunc('week', gun) AS DATE)",
+        'hour': "date_trunc('hour', tarih)",
+    },
+    'sqlite': {
+        'day': 'gun',
+        # Pazartesi başlangıçlı hafta (PostgreSQL date_trunc('week') gibi; bkz. tests/test_trends.py)
+        'week': "date(gun, '-' || ((CAST(strftime('%w', gun) AS INTEGER) + 6) % 7) || ' days')",
+        'hour': "strftime('%Y-%m-%d %H:00:00', tarih)",
+    },
+}
+
+STEP = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+
+class TrendRangeError(ValueError):
+    """Geçersiz tarih aralığı veya kova"""
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise TrendRangeError(f'{name} YYYY-MM-DD biçiminde olmalı')
+
+
+def parse_range(start=None, end=None, bucket=None, today=None):
+    """Sorgu parametrelerinden (başlangıç, bitiş, kova) üretir; bitiş günü dahildir"""
+    bucket = bucket or 'day'
+    if bucket not in BUCKETS:
+        raise TrendRangeError(f'bucket {", ".join(BUCKETS)} değerlerinden biri olmalı')
+
+    today = today or datetime.utcnow().date()
+    end = _parse_date(end, 'to') if end else today
+    start = _parse_date(start, 'from') if start else end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise TrendRangeError('from, to tarihinden sonra olamaz')
+
+    span = datetime.combine(end + timedelta(days=1), datetime.min.time()) - \
+        datetime.combine(start, datetime.min.time())
+    if span / STEP[bucket] > MAX_BUCKETS:
+        raise TrendRangeError(f'Aralık en fazla {MAX_BUCKETS} kova içerebilir')
+    return start, end, bucket
+
+
+def _bucket_start(value, bucket):
+    """Veritabanından gelen kova değerini datetime'a çevirir"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def _first_bucket(start, bucket):
+    first = datetime.combine(start, datetime.min.time())
+    if bucket == 'week':
+        first -= timedelta(days=first.weekday())
+    return first
+
+
+def _label(moment, bucket):
+    # Saat kovaları UTC; tarayıcı yerel saate çevirebilsin diye 'Z' eklenir
+    return moment.isoformat(timespec='minutes') + 'Z' if bucket == 'hour' else moment.date().isoformat()
+
+
+def trend(conn, grup_id, start, end, bucket='day'):
+    """Grubun trendi: [(kova etiketi, küfür sayısı), ...] - boş kovalar 0 ile doldurulur"""
+    expr = BUCKET_SQL[conn.dialect][bucket]
+    cursor = conn.cursor()
+    if bucket == 'hour':
+        # Ham geçmiş, (grup_id, tarih) indeksi üzerinden aralık taraması
+        lower = datetime.combine(start, datetime.min.time())
+        upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        if not conn.is_postgres:
+            # SQLite'ta tarih metin olarak tutuluyor; aynı biçimde karşılaştır
+            lower, upper = (lower.strftime('%Y-%m-%d %H:%M:%S'), upper.strftime('%Y-%m-%d %H:%M:%S'))
+        cursor.execute(f'''
+            SELECT {expr} AS kova, COUNT(*)
+            FROM kufur_gecmisi
+            WHERE grup_id = ? AND tarih >= ? AND tarih < ?
+            GROUP BY kova
+        ''', (grup_id, lower, upper))
+    else:
+        cursor.execute(f'''
+            SELECT {expr} AS kova, SUM(sayi)
+            FROM kufur_gunluk
+            WHERE grup_id = ? AND gun >= ? AND gun <= ?
+            GROUP BY kova
+        ''', (grup_id, start, end))
+    counts = {_bucket_start(kova, bucket): int(sayi) for kova, sayi in cursor.fetchall()}
+
+    result = []
+    moment = _first_bucket(start, bucket)
+    last = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    while moment < last:
+        result.append((_label(moment, bucket), counts.get(moment, 0)))
+        moment += STEP[bucket]
+    return result